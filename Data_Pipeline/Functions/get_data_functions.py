@@ -1,64 +1,111 @@
+import os
+import threading
+
 import rpy2.robjects.packages as rpackages
 import rpy2.robjects as robjects
+from rpy2.robjects import vectors
+import rpy2.rinterface as rinterface
+import numpy as np
 import pandas as pd
 
+# R stores NA for integer, logical and factor vectors as INT_MIN
+R_NA_INTEGER = np.iinfo(np.int32).min
+
+
+# Set once the R packages are loaded, so later calls in this process are free
+_initialised = False
+_initialise_lock = threading.Lock()
+
 
 def func_initialise():
-    # Set the package path
-    package_path = "C:/Users/Lachlan/AppData/Local/R/win-library/4.3"
+    global _initialised
+    with _initialise_lock:
+        if _initialised:
+            return
 
-    # Activate the package in the R environment
-    rpackages.importr("fitzRoy", lib_loc=package_path)
+        # R library to load the packages from (default: R's own library paths)
+        package_path = os.environ.get('FITZROY_LIB_LOC')
 
-    print('Fitzroy Package imported')
+        # Activate the packages in the R environment
+        rpackages.importr("fitzRoy", lib_loc=package_path)
 
-    rpackages.importr("fitzRoy", lib_loc=package_path)
+        print('Fitzroy Package imported')
 
-    print('tidyverse package imported')
+        rpackages.importr("dplyr", lib_loc=package_path)
 
-    rpackages.importr("dplyr", lib_loc=package_path)
+        print('dplyr package imported')
 
-    print('dplyr package imported')
+        _initialised = True
 
 
-def fetch_fixture(season=None, round_number=None, source=None, comp=None):
-    # Construct the R code for calling fetch_fixture
-    r_code = 'fetch_fixture('
+def _r_column_to_pandas(column):
+    """Convert a single R vector into a numpy array or pandas extension array.
 
-    if season is not None:
-        if isinstance(season, list):
-            season_str = ', '.join(str(s) for s in season)
-            r_code += f'season = c({season_str}), '
-        else:
-            r_code += f'season = {season}, '
+    Numeric vectors are wrapped around R's own memory through the buffer
+    protocol rather than being copied element by element.
+    """
+    rclass = tuple(column.rclass)
 
-    if round_number is not None:
-        r_code += f'round_number = {round_number}, '
+    # Dates and times may be stored as integers as well as doubles
+    if 'Date' in rclass or 'POSIXct' in rclass:
+        values = np.asarray(column.memoryview()).astype('float64')
+        if isinstance(column, vectors.IntVector):
+            values[np.asarray(column.memoryview()) == R_NA_INTEGER] = np.nan
+        if 'Date' in rclass:
+            return pd.to_datetime(values, unit='D')
+        return pd.to_datetime(values, unit='s', utc=True)
 
-    if source is not None:
-        r_code += f'source = "{source}", '
+    if isinstance(column, vectors.FactorVector):
+        codes = np.asarray(column.memoryview())
+        codes = np.where(codes == R_NA_INTEGER, -1, codes - 1)
+        return pd.Categorical.from_codes(
+            codes,
+            categories=list(column.levels),
+            ordered='ordered' in rclass
+        )
 
-    if comp is not None:
-        r_code += f'comp = "{comp}", '
+    if isinstance(column, vectors.BoolVector):
+        values = np.asarray(column.memoryview())
+        return pd.arrays.BooleanArray(
+            values.astype(bool), values == R_NA_INTEGER)
 
-    r_code = r_code.rstrip(', ')  # Remove trailing comma and space
-    r_code += ')'
+    if isinstance(column, vectors.IntVector):
+        values = np.asarray(column.memoryview())
+        mask = values == R_NA_INTEGER
+        if mask.any():
+            return pd.arrays.IntegerArray(values, mask)
+        return values
 
-    # Call fetch_fixture function
-    fixture_data = robjects.r(r_code)
-    # Extract each column from the R data frame
-    columns = list(fixture_data.colnames)
-    data = {col: fixture_data.rx2(col) for col in columns}
-    # Convert to Pandas DataFrame
-    pandas_df = pd.DataFrame(data)
+    if isinstance(column, vectors.FloatVector):
+        # NA_real_ is a NaN payload, so it already reads as NaN here
+        return np.asarray(column.memoryview())
 
-    # Print the dataframe
-    return pandas_df
+    if isinstance(column, vectors.StrVector):
+        return np.array(
+            [None if value is rinterface.NA_Character else value
+             for value in column],
+            dtype=object
+        )
 
+    # Fall back to element-wise conversion for anything else (e.g. lists)
+    return list(column)
+
+
+def r_dataframe_to_pandas(r_dataframe):
+    """Convert an R data.frame (or tibble) into a pandas DataFrame.
+
+    Factors become categoricals and R NA values become proper nulls.
+    """
+    data = {
+        name: _r_column_to_pandas(column)
+        for name, column in zip(r_dataframe.colnames, r_dataframe)
+    }
+    return pd.DataFrame(data, copy=False)
 
-def fetch_player_stats(season=None, round_number=None, source=None, comp=None):
-    # Construct the R code for calling fetch_player_stats
-    r_code = 'fetch_player_stats('
+
+def _fetch_call(function, season=None, round_number=None, source=None, comp=None):
+    # Construct the R code for calling a fitzRoy fetch function
+    r_code = f'{function}('
 
     if season is not None:
         if isinstance(season, list):
@@ -78,49 +125,59 @@ def fetch_player_stats(season=None, round_number=None, source=None, comp=None):
 
     r_code = r_code.rstrip(', ')  # Remove trailing comma and space
     r_code += ')'
+    return r_code
 
-    # Call fetch_player_stats function
-    player_stats_data = robjects.r(r_code)
-    # Extract each column from the R data frame
-    columns = list(player_stats_data.colnames)
-    data = {col: player_stats_data.rx2(col) for col in columns}
-    # Convert to Pandas DataFrame
-    pandas_df = pd.DataFrame(data)
+
+def fetch_fixture(season=None, round_number=None, source=None, comp=None):
+    # Call fetch_fixture function
+    fixture_data = robjects.r(_fetch_call('fetch_fixture', season, round_number, source, comp))
+    # Convert the R data frame column by column into a Pandas DataFrame
+    pandas_df = r_dataframe_to_pandas(fixture_data)
 
     # Print the dataframe
     return pandas_df
 
 
-def fetch_results(season=None, round_number=None, source=None, comp=None):
-    # Construct the R code for calling fetch_player_stats
-    r_code = 'fetch_results('
-
-    if season is not None:
-        if isinstance(season, list):
-            season_str = ', '.join(str(s) for s in season)
-            r_code += f'season = c({season_str}), '
-        else:
-            r_code += f'season = {season}, '
-
-    if round_number is not None:
-        r_code += f'round_number = {round_number}, '
-
-    if source is not None:
-        r_code += f'source = "{source}", '
+def fetch_player_stats(season=None, round_number=None, source=None, comp=None):
+    # Call fetch_player_stats function
+    player_stats_data = robjects.r(_fetch_call('fetch_player_stats', season, round_number, source, comp))
+    # Convert the R data frame column by column into a Pandas DataFrame
+    pandas_df = r_dataframe_to_pandas(player_stats_data)
 
-    if comp is not None:
-        r_code += f'comp = "{comp}", '
+    # Print the dataframe
+    return pandas_df
 
-    r_code = r_code.rstrip(', ')  # Remove trailing comma and space
-    r_code += ')'
 
-    # Call fetch_player_stats function
-    player_stats_data = robjects.r(r_code)
-    # Extract each column from the R data frame
-    columns = list(player_stats_data.colnames)
-    data = {col: player_stats_data.rx2(col) for col in columns}
-    # Convert to Pandas DataFrame
-    pandas_df = pd.DataFrame(data)
+def fetch_results(season=None, round_number=None, source=None, comp=None):
+    # Call fetch_results function
+    results_data = robjects.r(_fetch_call('fetch_results', season, round_number, source, comp))
+    # Convert the R data frame column by column into a Pandas DataFrame
+    pandas_df = r_dataframe_to_pandas(results_data)
 
     # Print the dataframe
     return pandas_df
+
+
+def fetch_season_bundle(season=None, round_number=None, sources=None, comp=None):
+    """Fetch player stats, fixture and results in a single R evaluation.
+
+    The three fitzRoy calls are wrapped in one R list, so there is one round
+    trip into R instead of three, and each data.frame is converted
+    column by column.
+
+    sources maps each dataset name to its fitzRoy source; datasets that are
+    not listed use fitzRoy's default source.
+
+    Returns a dict of dataset name -> pandas DataFrame.
+    """
+    sources = sources or {}
+    calls = ', '.join(
+        f'{dataset} = ' + _fetch_call(
+            f'fetch_{dataset}', season, round_number, sources.get(dataset), comp)
+        for dataset in ('player_stats', 'fixture', 'results')
+    )
+    bundle = robjects.r(f'list({calls})')
+    return {
+        name: r_dataframe_to_pandas(r_dataframe)
+        for name, r_dataframe in zip(bundle.names, bundle)
+    }
@@ -1,9 +1,30 @@
 """
 AFL Data Pipeline - A package for processing AFL data from source to BigQuery.
+
+The classes below are imported on first access, so `import afl_pipeline` does
+not pull in the Google Cloud client libraries or rpy2.
 """
 
-from .pipeline import AFLDataPipeline
-from .storage import StorageManager
-from .bigquery import BigQueryManager
+import importlib
+
+__all__ = ['AFLDataPipeline', 'AsyncAFLDataPipeline', 'StorageManager', 'BigQueryManager']
+
+# Public name -> module that defines it
+_LAZY_IMPORTS = {
+    'AFLDataPipeline': '.pipeline',
+    'AsyncAFLDataPipeline': '.async_pipeline',
+    'StorageManager': '.storage',
+    'BigQueryManager': '.bigquery',
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = ['AFLDataPipeline', 'StorageManager', 'BigQueryManager']
+def __dir__():
+    return sorted(list(globals()) + __all__)
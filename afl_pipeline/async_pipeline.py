@@ -0,0 +1,388 @@
+"""
+Asyncio pipeline module for AFL Data Pipeline.
+Drives the uploads and BigQuery jobs of many years from one event loop.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+
+from google.cloud.exceptions import NotFound
+
+from .pipeline import AFLDataPipeline
+from .bigquery import schema_from_dataframe
+from .limiter import is_retryable
+from .metrics import RUN_SPAN
+from . import settings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.async_pipeline')
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the rate of requests made to one service.
+
+    Callers wait in turn, so requests are spread out evenly instead of being
+    sent in bursts that the service answers with rate-limit errors.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=asyncio.sleep):
+        """
+        Initialize the Rate Limiter.
+
+        Args:
+            rate: Requests allowed per second (None or 0: unlimited)
+            burst: Requests that may be made at once after an idle period
+            clock: Function returning the current time in seconds
+            sleep: Coroutine function used to wait
+        """
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self._tokens = burst
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request may be made."""
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = self.clock()
+                if self._updated is not None:
+                    self._tokens = min(
+                        self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.waits += 1
+                self.waited_seconds += delay
+                await self.sleep(delay)
+
+    def stats(self):
+        """
+        Get the wait counters.
+
+        Returns:
+            dict: Number of waits and the seconds spent waiting
+        """
+        return {'waits': self.waits, 'waited_seconds': self.waited_seconds}
+
+
+async def wait_for_job(job, poll_interval=None, max_interval=None, timeout=None,
+                       limiter=None, adaptive_limiter=None, clock=time.monotonic,
+                       sleep=asyncio.sleep):
+    """
+    Wait for a BigQuery job without blocking the event loop.
+
+    The job is polled with done(), backing off from poll_interval up to
+    max_interval between polls. The client calls run on the loop's default
+    executor only for the length of each call, so no thread is tied up for
+    the lifetime of the job.
+
+    Args:
+        job: A submitted BigQuery job
+        poll_interval: First wait between polls (default: settings.JOB_POLL_INTERVAL_SECONDS)
+        max_interval: Longest wait between polls (default: settings.JOB_POLL_MAX_INTERVAL_SECONDS)
+        timeout: Seconds to wait before giving up (default: settings.JOB_TIMEOUT_SECONDS)
+        limiter: Optional RateLimiter each poll waits on
+        adaptive_limiter: Optional AdaptiveLimiter each poll is made through, so
+            throttled polls are retried
+        clock: Function returning the current time in seconds
+        sleep: Coroutine function used to wait between polls
+
+    Returns:
+        int: Number of polls made
+
+    Raises:
+        TimeoutError: If the job is still running after the timeout
+        Exception: The job's error, if it failed
+    """
+    interval = poll_interval or settings.JOB_POLL_INTERVAL_SECONDS
+    max_interval = max_interval or settings.JOB_POLL_MAX_INTERVAL_SECONDS
+    timeout = timeout or settings.JOB_TIMEOUT_SECONDS
+    deadline = clock() + timeout
+    polls = 0
+    while True:
+        if limiter is not None:
+            await limiter.acquire()
+        polls += 1
+        if adaptive_limiter is not None:
+            done = await asyncio.to_thread(adaptive_limiter.call, job.done)
+        else:
+            done = await asyncio.to_thread(job.done)
+        if done:
+            break
+        if clock() >= deadline:
+            raise TimeoutError(f"Job {job.job_id} did not finish within {timeout}s")
+        await sleep(interval)
+        interval = min(interval * 2, max_interval)
+
+    # Raises the job's error, if any
+    await asyncio.to_thread(job.result)
+    return polls
+
+
+class _RunSlots:
+    """Semaphores bounding the work of one asyncio run."""
+
+    def __init__(self):
+        # Years fetched and held in memory until uploaded
+        self.years = asyncio.Semaphore(settings.MAX_YEARS_IN_FLIGHT)
+        self.fetch = asyncio.Semaphore(settings.FETCH_CONCURRENCY)
+        self.upload = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+        # BigQuery jobs submitted and not yet finished
+        self.jobs = asyncio.Semaphore(settings.ASYNC_JOB_CONCURRENCY)
+
+
+class AsyncAFLDataPipeline(AFLDataPipeline):
+    """
+    AFL data pipeline that processes years concurrently on an asyncio event loop.
+
+    Fetches and uploads run on worker threads, bounded by semaphores, while
+    BigQuery load jobs are submitted and then polled from the loop. A year's
+    frame is released once it is uploaded, so up to
+    settings.ASYNC_JOB_CONCURRENCY load jobs can be in flight while only
+    settings.MAX_YEARS_IN_FLIGHT frames are held in memory. With derived stats
+    enabled the frame is kept until they are published after the load, so
+    then at most settings.MAX_YEARS_IN_FLIGHT years are loaded at once.
+    Requests to each service are spread out by a RateLimiter.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the Async AFL Data Pipeline.
+
+        Takes the same arguments as AFLDataPipeline.
+        """
+        super().__init__(*args, **kwargs)
+        self._reset_async_state()
+
+    def _reset_async_state(self):
+        """Create the rate limiters and semaphores for a new event loop."""
+        self.gcs_limiter = RateLimiter(settings.GCS_REQUESTS_PER_SECOND)
+        self.bigquery_limiter = RateLimiter(settings.BIGQUERY_REQUESTS_PER_SECOND)
+        self.job_polls = 0
+        self._slots = _RunSlots()
+
+    async def _run_job_async(self, submit, key):
+        """
+        Submit a table-replacing BigQuery job and poll it until it is done.
+
+        A job that fails with a rate-limit or transient error is submitted again
+        after the limiter's backoff, up to its max_attempts tries, as in
+        BigQueryManager._wait_for_job. A job still running at the timeout is
+        cancelled.
+
+        Args:
+            submit: Function submitting the job; it must be safe to run again
+            key: Name of the job's target, for log messages
+
+        Raises:
+            TimeoutError: If a try is still running after the timeout
+            Exception: The error of the last try
+        """
+        limiter = self.bigquery.limiter
+        attempt = 1
+        while True:
+            await self.bigquery_limiter.acquire()
+            job = await asyncio.to_thread(submit)
+            try:
+                polls = await wait_for_job(
+                    job, limiter=self.bigquery_limiter, adaptive_limiter=limiter)
+                self.job_polls += polls
+                return
+            except TimeoutError:
+                logger.error(f"Job for {key} did not finish in time, cancelling it")
+                try:
+                    await asyncio.to_thread(job.cancel)
+                except Exception as e:
+                    logger.warning(f"Error cancelling job for {key}: {str(e)}")
+                raise
+            except Exception as e:
+                if not is_retryable(e) or attempt >= limiter.max_attempts:
+                    raise
+                delay = limiter.backoff(attempt)
+                limiter.record_retry(e, delay)
+                logger.warning(f"Job for {key} failed ({str(e)}), submitting it again in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _load_year_async(self, year, gcs_path, rows=None, schema=None):
+        """
+        Load a year's GCS file into its BigQuery table and poll the job.
+
+        Unchanged years are skipped as in _load_year. The load replaces the
+        table, so it is submitted again when it fails with a retryable error
+        (see _run_job_async).
+
+        Args:
+            year: Year being loaded
+            gcs_path: Path of the file within the bucket
+            rows: Rows in the uploaded frame (None if it was not uploaded in this run)
+            schema: Explicit schema for CSV loads
+
+        Returns:
+            bool: Success status
+        """
+        gcs_uri = self.storage.source_uri(gcs_path)
+        table_id = settings.BIGQUERY_PLAYER_STATS_TABLE_TEMPLATE.format(
+            year=year)
+
+        data_hash = self._content_hashes.get(gcs_path) if rows is not None else None
+        if await asyncio.to_thread(
+                self._load_unchanged, year, gcs_path, table_id, data_hash):
+            await asyncio.to_thread(self._checkpoint, year, 'loaded', data_hash=data_hash,
+                                    gcs_path=gcs_path, table=table_id)
+            return True
+
+        stats = self.storage.upload_stats.get(gcs_path) or {}
+        async with self._slots.jobs:
+            with self.metrics.span('bigquery_load', year=year) as span:
+                span.rows = rows if rows is not None else stats.get('rows')
+                span.bytes = stats.get('bytes')
+                try:
+                    await self._run_job_async(
+                        lambda: self.bigquery.start_load_job(
+                            gcs_uri, table_id, settings.PLAYER_STATS_DATASET_ID, schema=schema),
+                        table_id)
+                except Exception as e:
+                    if isinstance(e, NotFound):
+                        # The dataset may have been deleted; check it again next time
+                        self.bigquery.dataset_cache.invalidate(settings.PLAYER_STATS_DATASET_ID)
+                    span.status = 'error'
+                    span.error = str(e)
+                    logger.error(
+                        f"Failed to upload data to BigQuery for year {year}: {str(e)}")
+                    return False
+
+        self._record_load(gcs_path, data_hash, table_id)
+        await asyncio.to_thread(self._checkpoint, year, 'loaded', data_hash=data_hash,
+                                gcs_path=gcs_path, table=table_id)
+        return True
+
+    async def process_year_async(self, year, use_sample_data=False, skip_gcs=False,
+                                 dataframe=None, load_to_bigquery=True):
+        """
+        Process a single year of data on the event loop.
+
+        Args:
+            year: Year to process
+            use_sample_data: Whether to use sample data instead of fetching real data
+            skip_gcs: Whether to skip the fetch and GCS upload steps
+            dataframe: Already-fetched player stats to use instead of fetching
+            load_to_bigquery: Whether to load the year into its own BigQuery table
+
+        Returns:
+            bool: Success status
+        """
+        slots = self._slots
+
+        logger.info(f"Processing year {year}")
+        try:
+            gcs_path = settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(
+                year=year)
+            df = rows = schema = None
+
+            async with contextlib.AsyncExitStack() as held:
+                if not skip_gcs:
+                    await held.enter_async_context(slots.years)
+                    async with slots.fetch:
+                        df = await asyncio.to_thread(
+                            self._prepare_year, year, use_sample_data, dataframe)
+                    async with slots.upload:
+                        await self.gcs_limiter.acquire()
+                        if not await asyncio.to_thread(self._upload_year, year, df):
+                            return False
+                    rows = len(df)
+                    schema = schema_from_dataframe(df)
+                    if self.derived_stats is None:
+                        # Only what the load needs is kept once the frame is uploaded
+                        df = None
+                        await held.aclose()
+
+                if load_to_bigquery and not await self._load_year_async(year, gcs_path, rows, schema):
+                    return False
+
+                # Derived tables of the whole season, built from the frame kept
+                # (with its year slot) until the load is done
+                if df is not None and not await asyncio.to_thread(
+                        self.publish_derived_stats, year, df):
+                    return False
+
+            logger.info(f"Successfully processed year {year}")
+            return True
+        except Exception as e:
+            logger.error(f"Error processing year {year}: {str(e)}")
+            return False
+
+    async def run_pipeline_async(self, years, use_sample_data=False, skip_gcs=False,
+                                 create_combined=True, bulk_load=False, resume=False):
+        """
+        Run the complete data pipeline for multiple years concurrently.
+
+        The combined table (or bulk load) is built once every year is done, as
+        in run_pipeline.
+
+        Args:
+            years: List of years to process
+            use_sample_data: Whether to use sample data
+            skip_gcs: Whether to skip the GCS upload step
+            create_combined: Whether to create a combined table
+            bulk_load: Whether to skip the per-year tables and load every year's
+                file straight into the combined table with one load job (ignored
+                with create_combined=False)
+            resume: Whether to continue the last run if it was interrupted,
+                skipping the years its run manifest records as done
+
+        Returns:
+            list: List of successfully processed years, in the order given
+        """
+        bulk_load = self._bulk_load_option(bulk_load, create_combined)
+        self._start_run(years, resume)
+        self._reset_async_state()
+        with self.metrics.span(RUN_SPAN):
+            remaining = self._resume_years(years, bulk_load)
+            logger.info(f"Running asyncio pipeline for years: {remaining}")
+            results = await asyncio.gather(*(
+                self.process_year_async(year, use_sample_data, skip_gcs,
+                                        load_to_bigquery=not bulk_load)
+                for year in remaining))
+            successful_years = self._with_resumed_years(
+                years, [year for year, success in zip(remaining, results) if success])
+
+            successful_years = await asyncio.to_thread(
+                self.combine_years, successful_years, create_combined, bulk_load)
+
+        self.metrics.set_info('job_polls', self.job_polls)
+        self.metrics.set_info('rate_limits', {
+            'gcs': self.gcs_limiter.stats(),
+            'bigquery': self.bigquery_limiter.stats(),
+        })
+        self._finish_run(successful_years)
+        return successful_years
+
+    def run(self, years, **kwargs):
+        """
+        Run run_pipeline_async on a new event loop.
+
+        Args:
+            years: List of years to process
+            **kwargs: Options for run_pipeline_async
+
+        Returns:
+            list: List of successfully processed years
+        """
+        return asyncio.run(self.run_pipeline_async(years, **kwargs))
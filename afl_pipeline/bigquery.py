@@ -3,9 +3,17 @@ BigQuery module for AFL Data Pipeline.
 Handles all Google BigQuery operations.
 """
 
+import concurrent.futures
 import logging
-from google.cloud.exceptions import NotFound
-from google.cloud import bigquery
+import time
+import uuid
+import pandas as pd
+from google.cloud.exceptions import Conflict, NotFound
+
+from . import settings
+from .limiter import AdaptiveLimiter, is_retryable
+from .metadata_cache import MetadataCache
+from .data_processor import bigquery_column_name
 
 # Configure logging
 logging.basicConfig(
@@ -14,99 +22,648 @@ logging.basicConfig(
 )
 logger = logging.getLogger('afl_pipeline.bigquery')
 
+# Write dispositions (the values of bigquery.WriteDisposition), so callers can
+# pick one without importing the BigQuery client library
+WRITE_TRUNCATE = 'WRITE_TRUNCATE'
+WRITE_APPEND = 'WRITE_APPEND'
+
+# Prefix of the IDs given to submitted jobs
+JOB_ID_PREFIX = 'afl_pipeline_'
+
+
+def schema_from_dataframe(dataframe):
+    """
+    Build an explicit BigQuery schema from a DataFrame's dtypes.
+
+    Args:
+        dataframe: pandas DataFrame that will be loaded
+
+    Returns:
+        list: bigquery.SchemaField objects, one per column, in column order
+    """
+    from google.cloud import bigquery
+
+    schema = []
+    for name, dtype in dataframe.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype):
+            field_type = 'BOOLEAN'
+        elif pd.api.types.is_integer_dtype(dtype):
+            field_type = 'INTEGER'
+        elif pd.api.types.is_float_dtype(dtype):
+            field_type = 'FLOAT'
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            field_type = 'TIMESTAMP'
+        else:
+            field_type = 'STRING'
+        schema.append(bigquery.SchemaField(
+            bigquery_column_name(name), field_type, mode='NULLABLE'))
+    return schema
+
+
+def build_combined_table_query(destination_table_ref, source_tables, partition_field=None,
+                               partition_range=None, cluster_fields=None):
+    """
+    Build the query that creates a combined table from several source tables.
+
+    Args:
+        destination_table_ref: Fully qualified destination table
+        source_tables: List of fully qualified source tables
+        partition_field: Optional integer column to range partition on
+        partition_range: (start, end) of the partition range, end exclusive
+        cluster_fields: Optional list of columns to cluster on
+
+    Returns:
+        str: The CREATE OR REPLACE TABLE query
+    """
+    # Construct query to combine tables
+    union_clauses = ""
+    if len(source_tables) > 1:
+        union_clauses = " UNION ALL ".join(
+            [f"SELECT * FROM `{table}`" for table in source_tables[1:]])
+
+    table_options = ""
+    if partition_field:
+        start, end = partition_range
+        table_options += f"PARTITION BY RANGE_BUCKET({partition_field}, GENERATE_ARRAY({start}, {end}, 1))\n"
+    if cluster_fields:
+        table_options += f"CLUSTER BY {', '.join(cluster_fields)}\n"
+
+    return f"""
+    CREATE OR REPLACE TABLE `{destination_table_ref}`
+    {table_options}AS
+    SELECT * FROM `{source_tables[0]}`
+    {f" UNION ALL {union_clauses}" if union_clauses else ""}
+    """
+
+
+def range_partitioning(field, partition_range):
+    """
+    Build an integer-range partitioning spec with one partition per value.
+
+    Args:
+        field: Integer column to partition on
+        partition_range: (start, end) of the range, end exclusive
+
+    Returns:
+        bigquery.RangePartitioning: The partitioning spec
+    """
+    from google.cloud import bigquery
+
+    start, end = partition_range
+    return bigquery.RangePartitioning(
+        field=field,
+        range_=bigquery.PartitionRange(start=start, end=end, interval=1)
+    )
+
+
+def job_statistics(job):
+    """
+    Collect the statistics of a finished load job.
+
+    Args:
+        job: A BigQuery load job
+
+    Returns:
+        dict: Job ID, rows loaded, bytes read and written, slot time and wall time
+            (None where the job does not report a value)
+    """
+    seconds = None
+    if job.started is not None and job.ended is not None:
+        seconds = job.ended - job.started
+        seconds = seconds.total_seconds() if hasattr(seconds, 'total_seconds') else seconds
+    # Load jobs only report slot time in their raw statistics
+    slot_millis = getattr(job, 'slot_millis', None)
+    if slot_millis is None and isinstance(getattr(job, '_properties', None), dict):
+        slot_millis = job._properties.get('statistics', {}).get('totalSlotMs')
+    return {
+        'job_id': job.job_id,
+        'rows': job.output_rows,
+        'input_bytes': job.input_file_bytes,
+        'output_bytes': job.output_bytes,
+        'slot_millis': int(slot_millis) if slot_millis is not None else None,
+        'seconds': seconds,
+    }
+
 
 class BigQueryManager:
     """Manages interactions with Google BigQuery."""
 
-    def __init__(self, client):
+    def __init__(self, client, limiter=None):
         """
         Initialize the BigQuery Manager.
 
         Args:
             client: Google BigQuery client
+            limiter: AdaptiveLimiter every request goes through
+                (default: one allowing settings.BIGQUERY_MAX_CONCURRENCY requests at once)
         """
         self.client = client
+        # Adaptive limit on requests in flight, shared by every thread using the manager.
+        # Jobs are submitted through it but not resubmitted if they fail once running.
+        self.limiter = limiter or AdaptiveLimiter('bigquery', settings.BIGQUERY_MAX_CONCURRENCY)
+        # Datasets known to exist, so they are not looked up before every load
+        self.dataset_cache = MetadataCache(ttl_seconds=settings.DATASET_CACHE_TTL_SECONDS)
         logger.info("BigQueryManager initialized")
 
     def ensure_dataset_exists(self, dataset_id):
         """
         Check if a dataset exists, create it if it doesn't.
 
+        Datasets found or created are remembered for
+        settings.DATASET_CACHE_TTL_SECONDS, so later calls make no API request.
+
         Args:
             dataset_id: ID of the dataset to check/create
 
         Returns:
             bool: Success status
         """
+        if self.dataset_cache.get(dataset_id):
+            return True
         try:
             dataset_ref = f"{self.client.project}.{dataset_id}"
             try:
-                self.client.get_dataset(dataset_id)
+                self.limiter.call(self.client.get_dataset, dataset_id)
                 logger.info(f"Dataset {dataset_id} already exists")
             except NotFound:
+                from google.cloud import bigquery
                 dataset = bigquery.Dataset(dataset_ref)
                 dataset.location = "US"  # Change if needed
-                self.client.create_dataset(dataset)
-                logger.info(f"Created dataset {dataset_id}")
+                try:
+                    self.limiter.call(self.client.create_dataset, dataset)
+                    logger.info(f"Created dataset {dataset_id}")
+                except Conflict:
+                    # Created by a concurrent load in the meantime
+                    logger.info(f"Dataset {dataset_id} already exists")
+            self.dataset_cache.put(dataset_id, True)
             return True
         except Exception as e:
             logger.error(f"Error ensuring dataset exists: {str(e)}")
             return False
 
-    def upload_from_gcs(self, gcs_uri, table_id, dataset_id='afl_player_data'):
+    def build_load_job_config(self, source_format=None, write_disposition=None, schema=None,
+                              partitioning=None, clustering_fields=None):
         """
-        Load data from GCS to BigQuery.
+        Build the job configuration for loading pipeline files.
+
+        Parquet files carry their own schema. CSV files use the explicit schema
+        when one is given and fall back to autodetection otherwise.
 
         Args:
-            gcs_uri: URI of the GCS file to load
-            table_id: ID of the target table
-            dataset_id: ID of the dataset to use (default: afl_player_data)
+            source_format: 'parquet' or 'csv' (default: settings.UPLOAD_FORMAT)
+            write_disposition: BigQuery write disposition (default: WRITE_TRUNCATE)
+            schema: Optional list of bigquery.SchemaField for CSV loads
+            partitioning: Optional bigquery.RangePartitioning for a new table
+            clustering_fields: Optional list of columns to cluster a new table on
 
         Returns:
-            bool: Success status
+            bigquery.LoadJobConfig: The load job configuration
         """
-        try:
-            # Ensure dataset exists
-            self.ensure_dataset_exists(dataset_id)
+        from google.cloud import bigquery
 
-            # Construct the full table reference
-            full_table_id = f"{self.client.project}.{dataset_id}.{table_id}"
+        source_format = source_format or settings.UPLOAD_FORMAT
+        # Overwrite if exists unless told otherwise
+        write_disposition = write_disposition or WRITE_TRUNCATE
 
-            # Configure the load job
+        if source_format == 'parquet':
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                write_disposition=write_disposition
+            )
+        elif schema:
+            job_config = bigquery.LoadJobConfig(
+                schema=schema,
+                skip_leading_rows=1,
+                source_format=bigquery.SourceFormat.CSV,
+                field_delimiter=',',
+                write_disposition=write_disposition
+            )
+        else:
             job_config = bigquery.LoadJobConfig(
                 autodetect=True,  # Let BigQuery autodetect schema
                 skip_leading_rows=1,
                 source_format=bigquery.SourceFormat.CSV,
                 field_delimiter=',',
-                write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE  # Overwrite if exists
+                write_disposition=write_disposition
             )
 
-            # Start the load job
-            logger.info(
-                f"Starting load job for {full_table_id} from {gcs_uri}...")
-            load_job = self.client.load_table_from_uri(
-                gcs_uri,
-                full_table_id,
-                job_config=job_config
-            )
+        if partitioning is not None:
+            job_config.range_partitioning = partitioning
+        if clustering_fields:
+            job_config.clustering_fields = clustering_fields
+        return job_config
 
-            # Wait for job to complete
-            load_job.result()
+    def upload_from_gcs(self, gcs_uri, table_id, dataset_id='afl_player_data',
+                        write_disposition=None, source_format=None, schema=None,
+                        partitioning=None, clustering_fields=None):
+        """
+        Load data from GCS to BigQuery.
+
+        Args:
+            gcs_uri: URI of the GCS file to load; may contain one * wildcard
+                (e.g. "gs://bucket/path/part-*" for the shards of
+                StorageManager.upload_dataframe_sharded) or be a list of URIs,
+                which are all loaded by the one job
+            table_id: ID of the target table
+            dataset_id: ID of the dataset to use (default: afl_player_data)
+            write_disposition: BigQuery write disposition (default: WRITE_TRUNCATE,
+                use WRITE_APPEND to add rows to an existing table)
+            source_format: 'parquet' or 'csv' (default: settings.UPLOAD_FORMAT)
+            schema: Optional explicit schema for CSV loads (see schema_from_dataframe)
+            partitioning: Optional bigquery.RangePartitioning for a new table
+            clustering_fields: Optional list of columns to cluster a new table on
+
+        Returns:
+            bool: Success status
+        """
+        def submit():
+            return self.start_load_job(
+                gcs_uri, table_id, dataset_id, write_disposition, source_format, schema,
+                partitioning=partitioning, clustering_fields=clustering_fields)
+
+        try:
+            jobs = {table_id: submit()}
+
+            # Wait for job to complete; a failed replace can safely run again
+            self._wait_for_job(
+                jobs, table_id, resubmit=submit if write_disposition in (None, WRITE_TRUNCATE) else None)
             logger.info(
-                f"Table {full_table_id} successfully created and data loaded.")
+                f"Table {self.client.project}.{dataset_id}.{table_id} successfully created and data loaded.")
             return True
+        except NotFound as e:
+            # The dataset may have been deleted; check it again next time
+            self.dataset_cache.invalidate(dataset_id)
+            logger.error(f"Error uploading to BigQuery: {str(e)}")
+            return False
         except Exception as e:
             logger.error(f"Error uploading to BigQuery: {str(e)}")
             return False
 
+    def start_load_job(self, gcs_uri, table_id, dataset_id='afl_player_data',
+                       write_disposition=None, source_format=None, schema=None,
+                       partitioning=None, clustering_fields=None):
+        """
+        Submit a load job from GCS to BigQuery without waiting for it.
+
+        Takes the same arguments as upload_from_gcs. Errors submitting the job
+        are raised; errors of the job itself surface from its result(). The
+        job is submitted with one job ID for every try (see _submit_job).
+
+        Returns:
+            bigquery.LoadJob: The running load job
+        """
+        # BigQuery accepts one * wildcard per URI, e.g. the shards of a sharded upload
+        uris = [gcs_uri] if isinstance(gcs_uri, str) else gcs_uri
+        if any(uri.count('*') > 1 for uri in uris):
+            raise ValueError(f"Source URIs may contain at most one * wildcard: {gcs_uri}")
+
+        # Ensure dataset exists
+        self.ensure_dataset_exists(dataset_id)
+
+        # Construct the full table reference
+        full_table_id = f"{self.client.project}.{dataset_id}.{table_id}"
+
+        # Configure the load job
+        job_config = self.build_load_job_config(
+            source_format, write_disposition, schema,
+            partitioning=partitioning, clustering_fields=clustering_fields)
+
+        # Start the load job
+        logger.info(
+            f"Starting load job for {full_table_id} from {gcs_uri}...")
+        return self._submit_job(
+            self.client.load_table_from_uri,
+            gcs_uri,
+            full_table_id,
+            job_config=job_config
+        )
+
+    def _submit_job(self, submit, *args, **kwargs):
+        """
+        Submit a job through the limiter with the same job ID on every try.
+
+        When a try reached BigQuery but its response was lost (e.g. a 503), the
+        retry fails with Conflict because the job already exists. That job is
+        then fetched instead of starting the work a second time, which matters
+        for WRITE_APPEND loads.
+
+        Args:
+            submit: Client method submitting the job (load_table_from_uri, copy_table or query)
+            *args: Positional arguments for submit
+            **kwargs: Keyword arguments for submit
+
+        Returns:
+            The submitted job
+        """
+        job_id = f"{JOB_ID_PREFIX}{uuid.uuid4().hex}"
+        try:
+            return self.limiter.call(submit, *args, job_id=job_id, **kwargs)
+        except Conflict:
+            logger.info(f"Job {job_id} was already submitted, waiting for it")
+            return self.limiter.call(self.client.get_job, job_id)
+
+    def _wait_for_job(self, jobs, key, resubmit=None, deadline=None):
+        """
+        Wait for jobs[key], submitting it again while it fails with a retryable error.
+
+        A job that failed with a rate-limit (rateLimitExceeded) or transient
+        error wrote nothing, so resubmit starts a new job doing the same work,
+        after the limiter's backoff and up to its max_attempts tries.
+        jobs[key] is replaced with each new job. Only idempotent jobs (WRITE_TRUNCATE
+        loads and copies, CREATE OR REPLACE queries) are resubmitted, so a job
+        that did finish cannot be applied twice.
+
+        Args:
+            jobs: Dict holding the job
+            key: Key of the job in jobs
+            resubmit: Function submitting the job again, or None to never resubmit
+            deadline: time.monotonic() by which the job must be done (default: none)
+
+        Raises:
+            Exception: The error of the last try, or a timeout
+        """
+        attempt = 1
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                jobs[key].result(timeout=timeout)
+                return
+            except Exception as e:
+                if resubmit is None or not is_retryable(e) or attempt >= self.limiter.max_attempts:
+                    raise
+                delay = self.limiter.backoff(attempt)
+                self.limiter.record_retry(e, delay)
+                logger.warning(f"Job for {key} failed ({str(e)}), submitting it again in {delay:.2f}s")
+                self.limiter.sleep(delay)
+                attempt += 1
+                jobs[key] = resubmit()
+
+    def load_many(self, loads, dataset_id='afl_player_data', write_disposition=None,
+                  source_format=None, schemas=None, timeout=None):
+        """
+        Load many GCS files into their own tables, waiting on all the jobs together.
+
+        Every load job is submitted before any is waited on, so the batch takes
+        about as long as its slowest job rather than the sum of them. Jobs still
+        running when the timeout for the whole batch runs out are cancelled.
+        Table replaces that fail with a retryable error are submitted again
+        (see _wait_for_job).
+
+        Args:
+            loads: List of (gcs_uri, table_id) pairs
+            dataset_id: ID of the dataset to use (default: afl_player_data)
+            write_disposition: BigQuery write disposition (default: WRITE_TRUNCATE)
+            source_format: 'parquet' or 'csv' (default: settings.UPLOAD_FORMAT)
+            schemas: Optional dict of table_id -> explicit schema for CSV loads
+            timeout: Seconds to wait for the whole batch (default: settings.JOB_TIMEOUT_SECONDS)
+
+        Returns:
+            dict: table_id -> status ('ok', 'error' or 'timeout'), error and the
+                job statistics (see job_statistics), in the order given
+        """
+        schemas = schemas or {}
+        results = {}
+        jobs = {}
+        idempotent = write_disposition in (None, WRITE_TRUNCATE)
+
+        def submitter(gcs_uri, table_id):
+            return lambda: self.start_load_job(
+                gcs_uri, table_id, dataset_id, write_disposition, source_format,
+                schemas.get(table_id))
+
+        submitters = {table_id: submitter(gcs_uri, table_id) for gcs_uri, table_id in loads}
+        for table_id, submit in submitters.items():
+            try:
+                jobs[table_id] = submit()
+            except Exception as e:
+                logger.error(f"Error submitting load job for {table_id}: {str(e)}")
+                results[table_id] = {'status': 'error', 'error': str(e)}
+        logger.info(f"Submitted {len(jobs)} load jobs into {dataset_id}")
+
+        deadline = time.monotonic() + (timeout or settings.JOB_TIMEOUT_SECONDS)
+        for table_id in list(jobs):
+            try:
+                self._wait_for_job(
+                    jobs, table_id, resubmit=submitters[table_id] if idempotent else None,
+                    deadline=deadline)
+                results[table_id] = {'status': 'ok', 'error': None}
+            except (TimeoutError, concurrent.futures.TimeoutError):
+                logger.error(f"Load job for {table_id} did not finish in time, cancelling it")
+                try:
+                    jobs[table_id].cancel()
+                except Exception as e:
+                    logger.warning(f"Error cancelling load job for {table_id}: {str(e)}")
+                results[table_id] = {'status': 'timeout', 'error': 'timed out'}
+                continue
+            except Exception as e:
+                if isinstance(e, NotFound):
+                    self.dataset_cache.invalidate(dataset_id)
+                logger.error(f"Error loading {table_id}: {str(e)}")
+                results[table_id] = {'status': 'error', 'error': str(e)}
+            results[table_id].update(job_statistics(jobs[table_id]))
+
+        loaded = sum(result['status'] == 'ok' for result in results.values())
+        logger.info(f"Loaded {loaded} of {len(loads)} tables into {dataset_id}")
+        return {table_id: results[table_id] for _, table_id in loads}
+
+    def bulk_load_from_gcs(self, gcs_uris, table_id, dataset_id='afl_data',
+                           source_format=None, schema=None, partitioned=False,
+                           partition_field='year', partition_range=None, cluster_fields=None,
+                           partitions=None, replace_partitions=None):
+        """
+        Load many GCS files straight into one table with a single load job.
+
+        This replaces loading each year into its own table and then combining
+        them with a query: one job round trip instead of one per year, and no
+        billed scan of the per-year tables.
+
+        When partitioned and the partition of each file is given, a table that
+        is already range partitioned on partition_field keeps its other
+        partitions: each changed file is loaded into its own partition
+        (table$2021, WRITE_TRUNCATE), with all the jobs submitted at once.
+        Otherwise the table is replaced by the files.
+
+        Args:
+            gcs_uris: List of GCS URIs, or a wildcard URI such as
+                gs://bucket/player_stats/player_stats_*
+            table_id: ID of the target table
+            dataset_id: ID of the dataset to use (default: afl_data)
+            source_format: 'parquet' or 'csv' (default: settings.UPLOAD_FORMAT)
+            schema: Optional explicit schema for CSV loads
+            partitioned: Whether the table is range partitioned by year (default: False)
+            partition_field: Integer column to partition on (default: year)
+            partition_range: (start, end) of the partition range
+                (default: settings.COMBINED_PARTITION_RANGE)
+            cluster_fields: Columns to cluster on (default: settings.COMBINED_CLUSTER_FIELDS)
+            partitions: Partition value (e.g. year) of each URI in gcs_uris, in order
+            replace_partitions: Partitions whose data changed (default: all of them);
+                only these are loaded into an existing partitioned table
+
+        Returns:
+            bool: Success status
+        """
+        if not gcs_uris:
+            logger.error("No source URIs provided")
+            return False
+
+        partitioning = None
+        clustering_fields = None
+        if partitioned:
+            partitioning = range_partitioning(
+                partition_field, partition_range or settings.COMBINED_PARTITION_RANGE)
+            clustering_fields = cluster_fields or settings.COMBINED_CLUSTER_FIELDS
+            try:
+                partitioned_table = self._check_range_partitioning(
+                    f"{self.client.project}.{dataset_id}.{table_id}", partition_field,
+                    drop_mismatched=True)
+            except Exception as e:
+                logger.error(f"Error checking table partitioning: {str(e)}")
+                return False
+            if partitioned_table and partitions is not None:
+                changed = set(partitions if replace_partitions is None else replace_partitions)
+                loads = [(uri, f"{table_id}${partition}")
+                         for uri, partition in zip(gcs_uris, partitions) if partition in changed]
+                return self._load_partitions(loads, dataset_id, source_format, schema)
+
+        if not isinstance(gcs_uris, str):
+            gcs_uris = list(gcs_uris)
+            logger.info(
+                f"Bulk loading {len(gcs_uris)} files into {dataset_id}.{table_id}")
+        return self.upload_from_gcs(
+            gcs_uris,
+            table_id,
+            dataset_id=dataset_id,
+            write_disposition=WRITE_TRUNCATE,
+            source_format=source_format,
+            schema=schema,
+            partitioning=partitioning,
+            clustering_fields=clustering_fields
+        )
+
+    def _load_partitions(self, loads, dataset_id, source_format=None, schema=None):
+        """
+        Replace partitions of a table with load jobs submitted together.
+
+        Args:
+            loads: List of (gcs_uri, "table$partition") pairs
+            dataset_id: ID of the table's dataset
+            source_format: 'parquet' or 'csv' (default: settings.UPLOAD_FORMAT)
+            schema: Optional explicit schema for CSV loads
+
+        Returns:
+            bool: Success status
+        """
+        if not loads:
+            logger.info(f"No partitions changed in {dataset_id}")
+            return True
+        logger.info(f"Replacing {len(loads)} partitions in {dataset_id}")
+        results = self.load_many(
+            loads, dataset_id=dataset_id, write_disposition=WRITE_TRUNCATE,
+            source_format=source_format,
+            schemas={table_id: schema for _, table_id in loads} if schema else None)
+        return all(result['status'] == 'ok' for result in results.values())
+
+    def _table_exists(self, table_ref):
+        """Check whether a table exists."""
+        try:
+            self.limiter.call(self.client.get_table, table_ref)
+            return True
+        except NotFound:
+            return False
+
+    def _check_range_partitioning(self, table_ref, field, drop_mismatched=False):
+        """
+        Check whether an existing table is integer-range partitioned on a field.
+
+        BigQuery refuses to replace a table with one that has a different
+        partitioning specification, so with drop_mismatched a table that
+        exists with another layout is dropped to make way for the new one.
+
+        Args:
+            table_ref: Fully qualified table reference
+            field: Integer column the table should be partitioned on
+            drop_mismatched: Whether to drop a table partitioned differently
+
+        Returns:
+            bool: True if the table exists and is range partitioned on the field
+        """
+        try:
+            table = self.limiter.call(self.client.get_table, table_ref)
+        except NotFound:
+            return False
+        partitioning = table.range_partitioning
+        if partitioning is not None and partitioning.field == field:
+            return True
+        if drop_mismatched:
+            logger.info(
+                f"Dropping {table_ref} to recreate it partitioned on {field}")
+            self.limiter.call(self.client.delete_table, table_ref, not_found_ok=True)
+        return False
+
+    def replace_partitions(self, partition_sources, destination_table_ref):
+        """
+        Replace individual partitions of a range-partitioned table.
+
+        One copy job per partition is submitted with a partition decorator
+        (table$2021) and WRITE_TRUNCATE, so only those partitions are rewritten.
+        All jobs are submitted before waiting on any of them, and copies that
+        fail with a retryable error are submitted again.
+
+        Args:
+            partition_sources: Dict of partition value (e.g. year) -> source table reference
+            destination_table_ref: Fully qualified destination table
+
+        Returns:
+            bool: Success status
+        """
+        from google.cloud import bigquery
+
+        try:
+            job_config = bigquery.CopyJobConfig(
+                write_disposition=WRITE_TRUNCATE)
+
+            def submitter(partition, source_table):
+                return lambda: self._submit_job(
+                    self.client.copy_table,
+                    source_table,
+                    f"{destination_table_ref}${partition}",
+                    job_config=job_config
+                )
+
+            submitters = {}
+            jobs = {}
+            for partition, source_table in partition_sources.items():
+                logger.info(
+                    f"Replacing partition {partition} of {destination_table_ref} from {source_table}")
+                submitters[partition] = submitter(partition, source_table)
+                jobs[partition] = submitters[partition]()
+            for partition in jobs:
+                self._wait_for_job(jobs, partition, resubmit=submitters[partition])
+            logger.info(
+                f"Replaced {len(jobs)} partitions of {destination_table_ref}")
+            return True
+        except Exception as e:
+            logger.error(f"Error replacing partitions: {str(e)}")
+            return False
+
     def create_combined_table(self, years, source_dataset_id='afl_player_data',
                               destination_dataset_id='afl_data',
                               table_prefix='player_stats_',
                               suffix='_bq',
-                              destination_table='combined_player_stats_bq'):
+                              destination_table='combined_player_stats_bq',
+                              partitioned=False,
+                              partition_field='year',
+                              partition_range=None,
+                              cluster_fields=None,
+                              replace_years=None):
         """
         Create a combined table from multiple years of data.
 
+        When partitioned, the table is integer-range partitioned on the year
+        column and clustered. If it already exists with that layout, only the
+        partitions for the given years are replaced; otherwise it is (re)created
+        from the given years.
+
         Args:
             years: List of years to combine
             source_dataset_id: Source dataset ID (default: afl_player_data)
@@ -114,6 +671,14 @@ class BigQueryManager:
             table_prefix: Prefix for source tables (default: player_stats_)
             suffix: Suffix for source tables (default: _bq)
             destination_table: Name of the destination table (default: combined_player_stats_bq)
+            partitioned: Whether to partition the table by year (default: False)
+            partition_field: Integer column to partition on (default: year)
+            partition_range: (start, end) of the partition range
+                (default: settings.COMBINED_PARTITION_RANGE)
+            cluster_fields: Columns to cluster on (default: settings.COMBINED_CLUSTER_FIELDS)
+            replace_years: Years whose data changed (default: all of them). If the
+                table already exists, only these years are rewritten, and nothing
+                is done when the list is empty
 
         Returns:
             bool: Success status
@@ -135,27 +700,45 @@ class BigQueryManager:
             # Construct destination table reference
             destination_table_ref = f"{self.client.project}.{destination_dataset_id}.{destination_table}"
 
-            # Construct query to combine tables
-            union_clauses = ""
-            if len(source_tables) > 1:
-                union_clauses = " UNION ALL ".join(
-                    [f"SELECT * FROM `{table}`" for table in source_tables[1:]])
+            if replace_years is not None and not replace_years and self._table_exists(destination_table_ref):
+                logger.info(
+                    f"No years changed, keeping combined table {destination_table_ref}")
+                return True
 
-            query = f"""
-            CREATE OR REPLACE TABLE `{destination_table_ref}` AS
-            SELECT * FROM `{source_tables[0]}`
-            {f" UNION ALL {union_clauses}" if union_clauses else ""}
-            """
+            if partitioned:
+                if self._check_range_partitioning(destination_table_ref, partition_field,
+                                                  drop_mismatched=True):
+                    changed = set(years if replace_years is None else replace_years)
+                    return self.replace_partitions(
+                        {year: table for year, table in zip(years, source_tables) if year in changed},
+                        destination_table_ref)
+                query = build_combined_table_query(
+                    destination_table_ref,
+                    source_tables,
+                    partition_field=partition_field,
+                    partition_range=partition_range or settings.COMBINED_PARTITION_RANGE,
+                    cluster_fields=cluster_fields or settings.COMBINED_CLUSTER_FIELDS
+                )
+            else:
+                query = build_combined_table_query(
+                    destination_table_ref, source_tables)
 
             # Execute query
             logger.info(
                 f"Running query to combine tables into {destination_table_ref}...")
-            query_job = self.client.query(query)
-            query_job.result()
+            def submit():
+                return self._submit_job(self.client.query, query)
+
+            # CREATE OR REPLACE can safely run again if the job fails
+            self._wait_for_job({'query': submit()}, 'query', resubmit=submit)
 
             logger.info(
                 f"Combined table '{destination_table_ref}' created with data from: {', '.join(source_tables)}")
             return True
+        except NotFound as e:
+            self.dataset_cache.invalidate(destination_dataset_id)
+            logger.error(f"Error creating combined table: {str(e)}")
+            return False
         except Exception as e:
             logger.error(f"Error creating combined table: {str(e)}")
             return False
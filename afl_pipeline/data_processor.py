@@ -3,7 +3,10 @@ Data Processor module for AFL Data Pipeline.
 Handles data transformations and preprocessing.
 """
 
+import hashlib
 import logging
+import re
+import numpy as np
 import pandas as pd
 
 # Configure logging
@@ -13,11 +16,175 @@ logging.basicConfig(
 )
 logger = logging.getLogger('afl_pipeline.data_processor')
 
+# Position of finals rounds after the home-and-away rounds
+FINALS_ROUND_ORDER = {
+    'EF': 101,
+    'QF': 101,
+    'SF': 102,
+    'PF': 103,
+    'GF': 104,
+}
+
+# Column types for preprocessed player stats. The type of a column must not
+# depend on the season's values, so that the per-year tables, the combined
+# table and wildcard loads agree; columns not listed here are stored as
+# strings (see _coerce_column).
+PLAYER_STATS_SCHEMA = {
+    'Season': 'integer',
+    'Round': 'category',
+    'Local.start.time': 'integer',
+    'Venue': 'category',
+    'Attendance': 'integer',
+    'ID': 'integer',
+    'Jumper.No.': 'category',
+    'Playing.for': 'category',
+    'Home.team': 'category',
+    'Away.team': 'category',
+    'First.name': 'category',
+    'Surname': 'category',
+    # Quarter-by-quarter goals and behinds of each team
+    **{f'{side}Q{quarter}{kind}': 'integer'
+       for side in 'HA' for quarter in range(1, 5) for kind in 'GB'},
+    'Home.score': 'integer',
+    'Away.score': 'integer',
+    # Player statistics
+    'Kicks': 'integer',
+    'Marks': 'integer',
+    'Handballs': 'integer',
+    'Disposals': 'integer',
+    'Goals': 'integer',
+    'Behinds': 'integer',
+    'Hit.Outs': 'integer',
+    'Tackles': 'integer',
+    'Rebounds': 'integer',
+    'Inside.50s': 'integer',
+    'Clearances': 'integer',
+    'Clangers': 'integer',
+    'Frees.For': 'integer',
+    'Frees.Against': 'integer',
+    'Brownlow.Votes': 'integer',
+    'Contested.Possessions': 'integer',
+    'Uncontested.Possessions': 'integer',
+    'Contested.Marks': 'integer',
+    'Marks.Inside.50': 'integer',
+    'One.Percenters': 'integer',
+    'Bounces': 'integer',
+    'Goal.Assists': 'integer',
+    'Time.on.Ground..': 'integer',
+    'Substitute': 'category',
+    'Umpire.1': 'category',
+    'Umpire.2': 'category',
+    'Umpire.3': 'category',
+    'Umpire.4': 'category',
+    'group_id': 'integer',
+    # Added by enrichment.enrich_player_matches
+    'Opponent': 'category',
+    'Margin': 'integer',
+    'Result': 'category',
+}
+
+# Columns dropped before storage
+DROPPED_COLUMNS = ['Date']
+
+# Nullable integer types tried, smallest first
+INTEGER_DTYPES = ['Int8', 'Int16', 'Int32', 'Int64']
+
+# Unlisted columns become categoricals when at most this share of values is distinct
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Sort order for serialised files; keeps similar values together so they compress well
+STORAGE_SORT_COLUMNS = ['Season', 'Round', 'ID']
+
+# Columns identifying a match within a season
+MATCH_KEY_COLUMNS = ['Round', 'Home.team', 'Away.team']
+
+
+def frame_memory(df):
+    """
+    Get the memory used by a dataframe, including the contents of string columns.
+
+    Args:
+        df: pandas DataFrame
+
+    Returns:
+        int: Memory usage in bytes
+    """
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def _to_smallest_integer(values, name=None):
+    """
+    Downcast numeric values to the smallest nullable integer dtype that holds them.
+
+    Values with a fractional part become nulls, with a warning, rather than
+    turning the column into floats: an integer column must stay an integer
+    in every season (see PLAYER_STATS_SCHEMA).
+    """
+    non_null = values.dropna()
+    fractional = non_null % 1 != 0
+    if fractional.any():
+        logger.warning(
+            f"Setting {int(fractional.sum())} non-integer values of integer column "
+            f"'{name}' to null, e.g. {non_null[fractional].iloc[0]}")
+        values = values.mask(fractional.reindex(values.index, fill_value=False))
+        non_null = non_null[~fractional]
+    low = non_null.min() if len(non_null) else 0
+    high = non_null.max() if len(non_null) else 0
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype.lower())
+        if info.min <= low and high <= info.max:
+            if values.dtype == dtype:
+                return values
+            return values.astype(dtype)
+    return values.astype('Int64')
+
+
+def _to_category(values):
+    """Convert values to a categorical of strings, keeping nulls as nulls."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    if not pd.api.types.is_object_dtype(values.dtype):
+        values = values.astype('string')
+    return values.astype('category')
+
+
+def _coerce_column(name, values):
+    """
+    Coerce one column according to PLAYER_STATS_SCHEMA.
+
+    Unlisted columns are stored as strings whatever their values, so a column
+    that happens to hold only numbers in one season does not load as INT64 in
+    that season's table and STRING in another's. Strings with few distinct
+    values become categoricals, which are still stored as strings.
+    """
+    kind = PLAYER_STATS_SCHEMA.get(name)
+
+    if kind == 'integer':
+        return _to_smallest_integer(pd.to_numeric(values, errors='coerce'), name)
+    if kind == 'float':
+        return pd.to_numeric(values, errors='coerce').astype('float64')
+    if kind == 'category':
+        return _to_category(values)
+    if kind == 'string':
+        return values
+
+    if not isinstance(values.dtype, pd.StringDtype):
+        values = values.astype('string')
+    if values.nunique(dropna=True) <= CATEGORY_MAX_UNIQUE_RATIO * len(values):
+        return values.astype('category')
+    return values
+
 
 def preprocess_player_stats(df, year):
     """
     Preprocess player statistics dataframe for storage.
 
+    Columns are coerced according to PLAYER_STATS_SCHEMA: numbers are parsed
+    with to_numeric and downcast to the smallest nullable integer type,
+    repeated strings (teams, venue, round, ...) become categoricals and
+    unlisted columns become strings. The input
+    frame is not modified, and columns that need no conversion are not copied.
+
     Args:
         df: pandas DataFrame with player statistics
         year: Year of the data
@@ -28,37 +195,28 @@ def preprocess_player_stats(df, year):
     logger.info(f"Preprocessing player stats for year {year}")
 
     try:
+        memory_before = frame_memory(df)
+
+        columns = {}
+        for col, values in df.items():
+            # Drop the columns that are not stored
+            if col in DROPPED_COLUMNS:
+                logger.info(f"Dropped '{col}' column")
+                continue
+            columns[col] = _coerce_column(col, values)
+
         # Add year column
-        df['year'] = year
-
-        # Convert column types if needed
-        type_conversions = {
-            'Season': 'float',
-            'Round': 'str',
-            'Local.start.time': 'int',
-            'Attendance': 'float',
-            'ID': 'int',
-            'Jumper.No.': 'str',
-        }
-
-        # Apply type conversions where possible
-        for col, dtype in type_conversions.items():
-            if col in df.columns:
-                try:
-                    df[col] = df[col].astype(dtype)
-                except:
-                    logger.warning(
-                        f"Could not convert column {col} to {dtype}")
-
-        # Drop the Date column if it exists
-        if 'Date' in df.columns:
-            df = df.drop('Date', axis=1)
-            logger.info("Dropped 'Date' column")
+        columns['year'] = pd.Series(year, index=df.index, dtype='Int16')
+
+        processed_df = pd.DataFrame(columns, index=df.index, copy=False)
 
         # Return the processed dataframe
+        memory_after = frame_memory(processed_df)
         logger.info(
-            f"Preprocessed dataframe has {len(df)} rows and {len(df.columns)} columns")
-        return df
+            f"Preprocessed dataframe has {len(processed_df)} rows and {len(processed_df.columns)} columns; "
+            f"memory {memory_before / 1e6:.1f} MB -> {memory_after / 1e6:.1f} MB "
+            f"({memory_before / max(memory_after, 1):.1f}x smaller)")
+        return processed_df
 
     except Exception as e:
         logger.error(f"Error preprocessing data: {str(e)}")
@@ -66,12 +224,149 @@ def preprocess_player_stats(df, year):
         return df
 
 
-def create_sample_data(year):
+def content_hash(df, *salt):
+    """
+    Compute a stable hash of a dataframe's contents.
+
+    The hash covers the column names, dtypes and every value in row order,
+    so it changes whenever the data that would be uploaded changes.
+
+    Args:
+        df: pandas DataFrame
+        *salt: Extra values mixed into the hash (e.g. the upload format)
+
+    Returns:
+        str: Hex digest of the contents
+    """
+    digest = hashlib.sha256()
+    for part in salt:
+        digest.update(f"{part}\0".encode('utf-8'))
+    for name, dtype in df.dtypes.items():
+        digest.update(f"{name}:{dtype}\0".encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def round_order(rounds):
+    """
+    Map round labels to sortable round numbers.
+
+    Home-and-away rounds ("1", "Round 1", 1) map to their number and finals
+    ("QF", "GF", ...) map to numbers after every home-and-away round. Each
+    distinct label is parsed once, so a season costs little more than a round.
+
+    Args:
+        rounds: pandas Series of round labels
+
+    Returns:
+        pandas Series: Round numbers (NaN where the label is not recognised)
+    """
+    codes, distinct = pd.factorize(rounds)
+    labels = pd.Series(distinct, dtype=object).astype(str).str.strip()
+    numbers = pd.to_numeric(
+        labels.str.extract(r'(\d+)', expand=False), errors='coerce')
+    finals = labels.str.upper().map(FINALS_ROUND_ORDER)
+    distinct_numbers = numbers.fillna(finals).to_numpy(dtype=float)
+    values = distinct_numbers.take(codes, mode='clip') if len(distinct_numbers) else np.full(len(codes), np.nan)
+    return pd.Series(np.where(codes >= 0, values, np.nan), index=rounds.index)
+
+
+def latest_round(df):
+    """
+    Get the latest round present in a player statistics dataframe.
+
+    Args:
+        df: pandas DataFrame with a Round column
+
+    Returns:
+        int or None: The latest round number, or None if there is none
+    """
+    if 'Round' not in df.columns or df.empty:
+        return None
+    latest = round_order(df['Round']).max()
+    return None if pd.isna(latest) else int(latest)
+
+
+def match_keys(df):
+    """
+    Get a key identifying the match of each row within its season.
+
+    Keys join the MATCH_KEY_COLUMNS present, e.g. "Round 5|Richmond|Carlton".
+
+    Args:
+        df: pandas DataFrame with player statistics
+
+    Returns:
+        pandas Series: Match key of each row
+    """
+    keys = pd.Series('', index=df.index, dtype=object)
+    for position, col in enumerate(c for c in MATCH_KEY_COLUMNS if c in df.columns):
+        values = df[col].astype(str).astype(object)
+        keys = values if position == 0 else keys + '|' + values
+    return keys
+
+
+def _storage_sort_key(series):
+    """Turn one sort column into a numeric key array without copying its values."""
+    if series.name == 'Round':
+        # Map each distinct round label once instead of parsing every row
+        codes, labels = pd.factorize(series)
+        keys = round_order(pd.Series(labels)).to_numpy(dtype=float)
+        return np.where(codes < 0, np.nan, keys[codes])
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy(dtype=float, na_value=np.nan)
+    codes, _ = pd.factorize(series, sort=True)
+    return codes
+
+
+def storage_order(df):
+    """
+    Get the row positions that sort a dataframe by (Season, Round, ID) for storage.
+
+    Rounds are sorted in playing order rather than alphabetically. Only one
+    numeric key per sort column is built, so large frames can be written in
+    sorted chunks without materialising a sorted copy of the whole frame.
+
+    Args:
+        df: pandas DataFrame with player statistics
+
+    Returns:
+        numpy array: Row positions in storage order
+    """
+    keys = [_storage_sort_key(df[col])
+            for col in STORAGE_SORT_COLUMNS if col in df.columns]
+    if not keys:
+        return np.arange(len(df))
+    # np.lexsort sorts by the last key first
+    return np.lexsort(keys[::-1])
+
+
+def bigquery_column_name(name):
+    """
+    Convert a column name into a valid BigQuery column name.
+
+    Matches the names BigQuery generates when autodetecting CSV headers,
+    e.g. "Local.start.time" becomes "Local_start_time".
+
+    Args:
+        name: Original column name
+
+    Returns:
+        str: BigQuery-safe column name
+    """
+    safe_name = re.sub(r'[^A-Za-z0-9_]', '_', str(name))
+    if not safe_name or safe_name[0].isdigit():
+        safe_name = f'_{safe_name}'
+    return safe_name
+
+
+def create_sample_data(year, round_number=None):
     """
     Create sample player statistics data for testing.
 
     Args:
         year: Year to create sample data for
+        round_number: Round to label the sample rows with (default: 1)
 
     Returns:
         pandas DataFrame: Sample data
@@ -81,7 +376,7 @@ def create_sample_data(year):
     # Create a sample DataFrame that resembles AFL player statistics
     data = {
         'Season': [year] * 10,
-        'Round': ['Round 1'] * 10,
+        'Round': [f'Round {round_number or 1}'] * 10,
         'Local.start.time': [1920] * 10,
         'Venue': ['M.C.G.'] * 10,
         'Attendance': [88084] * 10,
@@ -0,0 +1,283 @@
+"""
+Derived statistics module for AFL Data Pipeline.
+Computes per-player season aggregates and rolling form from per-game stats.
+"""
+
+import logging
+import os
+import threading
+import pandas as pd
+
+from .data_processor import round_order
+from . import settings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.derived_stats')
+
+# Per-game stats computed from other columns: name -> (column, weight) terms
+DERIVED_COLUMNS = {
+    'Disposals': [('Kicks', 1), ('Handballs', 1)],
+    'Points': [('Goals', 6), ('Behinds', 1)],
+}
+
+# Per-game stats that are totalled, averaged and tracked as form
+STAT_COLUMNS = [
+    'Kicks', 'Handballs', 'Disposals', 'Marks', 'Goals', 'Behinds', 'Points',
+    'Hit.Outs', 'Tackles',
+]
+
+# Player details carried into the aggregates (the latest value of each)
+PLAYER_COLUMNS = ['First.name', 'Surname', 'Playing.for']
+
+
+def add_derived_stats(df):
+    """
+    Add the DERIVED_COLUMNS computed from the stats already in a frame.
+
+    Derived stats whose source columns are missing are left out.
+
+    Args:
+        df: pandas DataFrame of per-game player stats
+
+    Returns:
+        pandas DataFrame: A copy of the frame with the derived columns
+    """
+    columns = {}
+    for name, terms in DERIVED_COLUMNS.items():
+        if name in df.columns or not all(column in df.columns for column, _ in terms):
+            continue
+        total = 0
+        for column, weight in terms:
+            total = total + pd.to_numeric(df[column], errors='coerce') * weight
+        columns[name] = total
+    return df.assign(**columns)
+
+
+def stat_columns(df):
+    """Get the STAT_COLUMNS present in a frame."""
+    return [column for column in STAT_COLUMNS if column in df.columns]
+
+
+def season_totals(df):
+    """
+    Total each player's stats over the games in a frame.
+
+    Args:
+        df: pandas DataFrame of per-game player stats with derived stats added
+
+    Returns:
+        pandas DataFrame: One row per player ID with player details, Games and
+            a total per stat
+    """
+    aggregations = {column: (column, 'last') for column in PLAYER_COLUMNS if column in df.columns}
+    aggregations['Games'] = ('ID', 'size')
+    aggregations.update({column: (column, 'sum') for column in stat_columns(df)})
+    return df.groupby('ID', sort=True, observed=True).agg(**aggregations).reset_index()
+
+
+def combine_totals(previous, new):
+    """
+    Add the totals of newly arrived games to earlier season totals.
+
+    Args:
+        previous: Output of season_totals for the earlier games
+        new: Output of season_totals for the new games
+
+    Returns:
+        pandas DataFrame: Combined totals, one row per player ID
+    """
+    combined = pd.concat([previous, new], ignore_index=True)
+    aggregations = {column: 'last' for column in PLAYER_COLUMNS if column in combined.columns}
+    aggregations['Games'] = 'sum'
+    aggregations.update({column: 'sum' for column in stat_columns(combined)})
+    return combined.groupby('ID', sort=True, observed=True).agg(aggregations).reset_index()
+
+
+def season_aggregates(totals, year):
+    """
+    Turn season totals into the published season aggregates table.
+
+    Args:
+        totals: Output of season_totals or combine_totals
+        year: Season of the totals
+
+    Returns:
+        pandas DataFrame: Totals plus a per-game average ("<stat>.avg") of each stat
+    """
+    stats = stat_columns(totals)
+    games = totals['Games'].astype('float64')
+    averages = {f"{column}.avg": totals[column].astype('float64') / games for column in stats}
+    return totals.assign(**averages).assign(Season=year)
+
+
+def _games_in_order(df):
+    """Per-game rows with a numeric round, sorted by player and round."""
+    games = df[['ID', 'Season', 'Round'] + stat_columns(df)].assign(
+        round_number=round_order(df['Round']))
+    return games.sort_values(['ID', 'round_number'], kind='stable')
+
+
+def rolling_form(games, window):
+    """
+    Compute each player's mean stats over their last N games.
+
+    Args:
+        games: Output of _games_in_order
+        window: Number of games in the rolling window
+
+    Returns:
+        pandas DataFrame: One "<stat>.last<N>" column per stat, on the index of games
+    """
+    stats = stat_columns(games)
+    means = (games[stats].astype('float64')
+             .groupby(games['ID'], sort=False)
+             .rolling(window, min_periods=1)
+             .mean()
+             .reset_index(level=0, drop=True))
+    return means.reindex(games.index).rename(columns=lambda column: f"{column}.last{window}")
+
+
+class DerivedStatsEngine:
+    """
+    Keeps season aggregates and rolling form up to date as rounds arrive.
+
+    Form is the mean over a player's last `window` games of the season. For
+    each season the engine stores the running totals of every player and the
+    last window - 1 games of each player, so a new round is combined with
+    that state instead of recomputing the season.
+
+    With save=False the new state is held until commit(), so rounds whose
+    tables failed to publish can be added again.
+    """
+
+    def __init__(self, state_dir=None, window=None):
+        """
+        Initialize the Derived Stats Engine.
+
+        Args:
+            state_dir: Directory for the per-season state (default: settings.DERIVED_STATE_DIR)
+            window: Games in the rolling form window (default: settings.FORM_WINDOW)
+        """
+        self.state_dir = state_dir or settings.DERIVED_STATE_DIR
+        self.window = window or settings.FORM_WINDOW
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def _path(self, year, name):
+        return os.path.join(self.state_dir, f"{name}_{year}.parquet")
+
+    def _load_state(self, year):
+        """Load a season's totals and recent games, or (None, None) if there are none."""
+        try:
+            return (pd.read_parquet(self._path(year, 'season_totals')),
+                    pd.read_parquet(self._path(year, 'recent_games')))
+        except FileNotFoundError:
+            return None, None
+
+    def _save_state(self, year, totals, recent_games):
+        """Atomically write a season's totals and recent games."""
+        os.makedirs(self.state_dir, exist_ok=True)
+        for name, df in (('season_totals', totals), ('recent_games', recent_games)):
+            path = self._path(year, name)
+            df.to_parquet(f"{path}.tmp", index=False)
+            os.replace(f"{path}.tmp", path)
+
+    def _form_table(self, df, games, form):
+        """Join the form columns to the per-game details of the rows in df."""
+        details = [column for column in ['ID', 'Season', 'Round'] + PLAYER_COLUMNS if column in df.columns]
+        return pd.concat([df[details], form.loc[df.index]], axis=1).reset_index(drop=True)
+
+    def _store(self, year, totals, recent_games, save):
+        with self._lock:
+            if save:
+                self._pending.pop(year, None)
+                self._save_state(year, totals, recent_games)
+            else:
+                self._pending[year] = (totals, recent_games)
+
+    def has_state(self, year):
+        """Check whether a season has saved state for update_season to build on."""
+        return all(os.path.exists(self._path(year, name))
+                   for name in ('season_totals', 'recent_games'))
+
+    def commit(self, year):
+        """Save the state held back by a rebuild or update with save=False."""
+        with self._lock:
+            if year in self._pending:
+                self._save_state(year, *self._pending.pop(year))
+
+    def rebuild_season(self, year, df, save=True):
+        """
+        Compute a season's derived tables from all of its games.
+
+        Args:
+            year: Season of the games
+            df: pandas DataFrame of the season's per-game player stats
+            save: Whether to save the season's state now (else on commit)
+
+        Returns:
+            dict: 'season_stats' (one row per player) and 'form' (one row per game)
+        """
+        df = add_derived_stats(df)
+        games = _games_in_order(df)
+        form = rolling_form(games, self.window)
+        totals = season_totals(df)
+
+        self._store(year, totals, self._recent_games(games), save)
+        logger.info(f"Rebuilt derived stats for {len(totals)} players in {year}")
+        return {
+            'season_stats': season_aggregates(totals, year),
+            'form': self._form_table(df, games, form),
+        }
+
+    def update_season(self, year, new_rows, save=True):
+        """
+        Add newly arrived games to a season's derived tables.
+
+        The new games must not have been added before. The season must have
+        saved state (see has_state): the new games alone are not the season,
+        so without it the caller has to rebuild_season from every game.
+
+        Args:
+            year: Season of the games
+            new_rows: pandas DataFrame of the new per-game player stats
+            save: Whether to save the season's state now (else on commit)
+
+        Returns:
+            dict: 'season_stats' (the whole season, one row per player) and
+                'form' (one row per new game)
+
+        Raises:
+            ValueError: If the season has no saved state
+        """
+        with self._lock:
+            totals, recent_games = self._load_state(year)
+        if totals is None:
+            raise ValueError(
+                f"No derived stats state for {year}; rebuild the season from all of its games")
+
+        df = add_derived_stats(new_rows)
+        new_games = _games_in_order(df)
+        games = pd.concat([recent_games, new_games.reset_index(drop=True)], ignore_index=True)
+        games = games.sort_values(['ID', 'round_number'], kind='stable')
+        form = rolling_form(games, self.window)
+        # Rows from the new frame are the last len(new_games) rows before sorting
+        new_positions = range(len(recent_games), len(recent_games) + len(new_games))
+        new_form = form.loc[new_positions]
+        new_form.index = new_games.index
+
+        totals = combine_totals(totals, season_totals(df))
+        self._store(year, totals, self._recent_games(games), save)
+        logger.info(f"Updated derived stats for {year} with {len(new_rows)} new games")
+        return {
+            'season_stats': season_aggregates(totals, year),
+            'form': self._form_table(df, new_games, new_form),
+        }
+
+    def _recent_games(self, games):
+        """Keep each player's last window - 1 games, all that the next form update needs."""
+        return games.groupby('ID', sort=False).tail(self.window - 1).reset_index(drop=True)
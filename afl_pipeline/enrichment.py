@@ -0,0 +1,177 @@
+"""
+Enrichment module for AFL Data Pipeline.
+Joins player stats to the fixture and results of their matches.
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+
+from .data_processor import round_order
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.enrichment')
+
+# Columns that identify a match in every dataset once normalised
+MATCH_KEYS = ['Season', 'round_key', 'home_key', 'away_key']
+
+# fitzRoy column names (afltables and footywire sources) -> normalised names
+RESULTS_COLUMNS = {
+    'Season': 'Season',
+    'Round': 'Round',
+    'Home.Team': 'Home.team',
+    'Away.Team': 'Away.team',
+    'Home.Points': 'Home.score',
+    'Away.Points': 'Away.score',
+    'Venue': 'Venue',
+}
+FIXTURE_COLUMNS = {
+    'Season': 'Season',
+    'Round': 'Round',
+    'Home.Team': 'Home.team',
+    'Away.Team': 'Away.team',
+    'Venue': 'Venue',
+}
+
+# Team names used by other sources -> the afltables name used in player stats
+TEAM_ALIASES = {
+    'adelaide crows': 'adelaide',
+    'brisbane': 'brisbane lions',
+    'geelong cats': 'geelong',
+    'gold coast suns': 'gold coast',
+    'gws': 'greater western sydney',
+    'gws giants': 'greater western sydney',
+    'kangaroos': 'north melbourne',
+    'sydney swans': 'sydney',
+    'west coast eagles': 'west coast',
+}
+
+# Match result from the player's team's point of view
+RESULT_LABELS = ['W', 'L', 'D']
+
+
+def team_key(teams):
+    """
+    Normalise team names so the same team matches across sources.
+
+    Works on the distinct names only, so it costs the same for a season as
+    for a single match.
+
+    Args:
+        teams: pandas Series of team names
+
+    Returns:
+        pandas Series: Lower-case team names with aliases resolved
+    """
+    teams = teams.astype('category')
+    names = teams.cat.categories.astype(str).str.strip().str.lower()
+    keys = pd.Series(names, dtype=object).replace(TEAM_ALIASES).to_numpy()
+    codes = teams.cat.codes.to_numpy()
+    if not len(keys):
+        return pd.Series(None, index=teams.index, dtype=object)
+    return pd.Series(
+        np.where(codes >= 0, keys.take(codes, mode='clip'), None), index=teams.index, dtype=object)
+
+
+def _match_keys(df):
+    """Build the normalised match key columns of a frame with Season, Round and teams."""
+    return pd.DataFrame({
+        'Season': pd.to_numeric(df['Season'], errors='coerce').astype('Int16'),
+        'round_key': round_order(df['Round']).astype('Float32'),
+        'home_key': team_key(df['Home.team']),
+        'away_key': team_key(df['Away.team']),
+    }, index=df.index)
+
+
+def _normalise_matches(df, columns):
+    """
+    Keep one row per match of a fixture or results frame, with normalised keys.
+
+    Args:
+        df: fitzRoy fixture or results frame
+        columns: Mapping of source column -> normalised name (see RESULTS_COLUMNS)
+
+    Returns:
+        pandas DataFrame: Match keys and the mapped value columns
+    """
+    df = df.rename(columns=columns)
+    values = [name for name in columns.values()
+              if name in df.columns and name not in ('Season', 'Round', 'Home.team', 'Away.team')]
+    matches = pd.concat([_match_keys(df), df[values]], axis=1)
+    return matches.drop_duplicates(subset=MATCH_KEYS, keep='last')
+
+
+def enrich_player_matches(player_stats, fixture=None, results=None):
+    """
+    Add match context to player stats with vectorised merges on the match keys.
+
+    Each row gets its match's home and away score (from results, falling back
+    to the scores already in the player stats), the team
+    it played against, the margin and result from its own team's point of
+    view, and the venue (player stats first, then fixture, then results).
+    Matches are keyed by season, round number and both teams, so round labels
+    and team names from different sources line up. Rows without a matching
+    result keep empty scores, margin and result, and rows whose team is
+    neither side of their match get no opponent, margin or result.
+
+    Args:
+        player_stats: fitzRoy player stats frame
+        fixture: Optional fitzRoy fixture frame of the same seasons
+        results: Optional fitzRoy results frame of the same seasons
+
+    Returns:
+        pandas DataFrame: Player stats with Opponent, Home.score, Away.score,
+            Margin, Result and Venue columns
+    """
+    keys = _match_keys(player_stats)
+    enriched = player_stats.copy()
+
+    venue = player_stats['Venue'] if 'Venue' in player_stats.columns else pd.Series(
+        None, index=player_stats.index, dtype=object)
+    # afltables player stats carry the scores too; results take precedence
+    home_score, away_score = (
+        pd.to_numeric(player_stats[column], errors='coerce') if column in player_stats.columns
+        else pd.Series(np.nan, index=player_stats.index)
+        for column in ('Home.score', 'Away.score'))
+
+    for matches, columns in ((fixture, FIXTURE_COLUMNS), (results, RESULTS_COLUMNS)):
+        if matches is None or matches.empty:
+            continue
+        matched = keys.merge(
+            _normalise_matches(matches, columns), on=MATCH_KEYS, how='left', validate='many_to_one')
+        matched.index = player_stats.index
+        if 'Venue' in matched.columns:
+            venue = venue.astype(object).fillna(matched['Venue'].astype(object))
+        if 'Home.score' in matched.columns:
+            home_score = pd.to_numeric(matched['Home.score'], errors='coerce').fillna(home_score)
+            away_score = pd.to_numeric(matched['Away.score'], errors='coerce').fillna(away_score)
+
+    playing_for = team_key(player_stats['Playing.for']).to_numpy()
+    is_home = playing_for == keys['home_key'].to_numpy()
+    is_away = playing_for == keys['away_key'].to_numpy()
+    # Rows whose team is neither side of the match get no opponent, margin or result
+    unmatched = ~(is_home | is_away)
+    margin = np.where(is_home, home_score - away_score,
+                      np.where(is_away, away_score - home_score, np.nan))
+    result = np.select([margin > 0, margin < 0, margin == 0], RESULT_LABELS, default='')
+
+    enriched['Opponent'] = np.where(
+        is_home, player_stats['Away.team'], np.where(is_away, player_stats['Home.team'], None))
+    enriched['Home.score'] = pd.array(home_score, dtype='Int16')
+    enriched['Away.score'] = pd.array(away_score, dtype='Int16')
+    enriched['Margin'] = pd.array(margin, dtype='Int16')
+    enriched['Result'] = pd.Categorical(np.where(result == '', None, result), categories=RESULT_LABELS)
+    enriched['Venue'] = venue
+
+    if unmatched.any():
+        logger.warning(
+            f"{int(unmatched.sum())} player rows play for neither team of their match; "
+            f"leaving their opponent, margin and result empty")
+    matched_rows = int(enriched['Margin'].notna().sum())
+    logger.info(
+        f"Enriched {len(enriched)} player rows; {matched_rows} matched a result")
+    return enriched
@@ -0,0 +1,771 @@
+"""
+Fake cloud module for AFL Data Pipeline.
+In-process stand-ins for the GCS and BigQuery clients.
+
+The fakes implement the parts of ``storage.Client`` and ``bigquery.Client``
+that StorageManager and BigQueryManager use. Blobs and tables are kept in
+memory, load, copy and query jobs run asynchronously on a thread pool, and a
+NetworkProfile injects per-request latency, a shared bandwidth limit and
+rate-limit errors so performance experiments can run without network access.
+
+Example:
+    profile = NetworkProfile(latency=0.05, bandwidth=10e6, requests_per_second=20)
+    storage_client = FakeStorageClient(profile=profile)
+    bigquery_client = FakeBigQueryClient(storage_client, profile=profile)
+    pipeline = AFLDataPipeline(storage_client=storage_client,
+                               bigquery_client=bigquery_client)
+"""
+
+import collections
+import fnmatch
+import io
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from google.api_core.exceptions import BadRequest, Conflict, Forbidden, NotFound, TooManyRequests
+from google.cloud import bigquery
+
+from .data_processor import bigquery_column_name
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.fake_cloud')
+
+DEFAULT_PROJECT = 'fake-project'
+
+# pandas dtypes for BigQuery column types when reading CSV loads with a schema
+CSV_FIELD_DTYPES = {
+    'INTEGER': 'Int64',
+    'INT64': 'Int64',
+    'FLOAT': 'float64',
+    'FLOAT64': 'float64',
+    'BOOLEAN': 'boolean',
+    'BOOL': 'boolean',
+    'STRING': 'string',
+}
+
+# First bytes of a zstd frame; BigQuery loads only read uncompressed or gzip CSV
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# CREATE OR REPLACE TABLE statements as built by build_combined_table_query
+CREATE_TABLE_PATTERN = re.compile(
+    r"CREATE\s+OR\s+REPLACE\s+TABLE\s+`(?P<destination>[^`]+)`\s*"
+    r"(?:PARTITION\s+BY\s+RANGE_BUCKET\(\s*(?P<field>\w+)\s*,\s*"
+    r"GENERATE_ARRAY\(\s*(?P<start>-?\d+)\s*,\s*(?P<end>-?\d+)\s*,\s*(?P<interval>\d+)\s*\)\s*\)\s*)?"
+    r"(?:CLUSTER\s+BY\s+(?P<cluster>[\w\s,]+?)\s*)?"
+    r"AS\s+(?P<select>.*)$",
+    re.IGNORECASE | re.DOTALL)
+SELECT_TABLE_PATTERN = re.compile(r"SELECT\s+\*\s+FROM\s+`([^`]+)`", re.IGNORECASE)
+
+
+class NetworkProfile:
+    """
+    Latency, bandwidth and rate limits applied to every fake cloud request.
+
+    All requests made through one profile share its bandwidth, so concurrent
+    transfers slow each other down the way they would on a real uplink.
+    Randomised errors use a seeded generator so runs are reproducible.
+    """
+
+    def __init__(self, latency=0.0, bandwidth=None, requests_per_second=None, error_rate=0.0,
+                 job_latency=0.0, job_throughput=None, job_error_rate=0.0, seed=0,
+                 sleep=time.sleep, clock=time.monotonic):
+        """
+        Initialize the Network Profile.
+
+        Args:
+            latency: Seconds added to every request
+            bandwidth: Shared transfer rate in bytes per second (default: unlimited)
+            requests_per_second: Requests allowed in any one-second window; requests
+                beyond that fail with TooManyRequests (default: unlimited)
+            error_rate: Probability that a request fails with TooManyRequests
+            job_latency: Seconds every load, copy or query job takes to run
+            job_throughput: Bytes per second processed by jobs (default: unlimited)
+            job_error_rate: Probability that a job fails with a rateLimitExceeded
+                error before writing anything
+            seed: Seed for the injected errors
+            sleep: Function used to wait
+            clock: Function returning the current time in seconds
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests_per_second = requests_per_second
+        self.error_rate = error_rate
+        self.job_latency = job_latency
+        self.job_throughput = job_throughput
+        self.job_error_rate = job_error_rate
+        self.sleep = sleep
+        self.clock = clock
+        self.requests = 0
+        self.operations = collections.Counter()
+        self.bytes_transferred = 0
+        self.throttled = 0
+        self.failed_jobs = 0
+        self._random = random.Random(seed)
+        self._recent = collections.deque()
+        self._link_free_at = 0.0
+        self._lock = threading.Lock()
+
+    def request(self, operation, nbytes=0):
+        """
+        Account for one request, waiting for its latency and transfer time.
+
+        Args:
+            operation: Name of the operation (used in error messages)
+            nbytes: Bytes sent or received by the request
+
+        Raises:
+            TooManyRequests: If the request is rate limited
+        """
+        with self._lock:
+            now = self.clock()
+            if self.requests_per_second is not None:
+                while self._recent and self._recent[0] <= now - 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.requests_per_second:
+                    self.throttled += 1
+                    raise TooManyRequests(f"Rate limit exceeded for {operation}")
+                self._recent.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.throttled += 1
+                raise TooManyRequests(f"Injected rate limit error for {operation}")
+
+            self.requests += 1
+            self.operations[operation] += 1
+            self.bytes_transferred += nbytes
+            finish = now + self.latency
+            if self.bandwidth and nbytes:
+                # Transfers queue for the shared link
+                start = max(now, self._link_free_at)
+                self._link_free_at = start + nbytes / self.bandwidth
+                finish = self._link_free_at + self.latency
+
+        if finish > now:
+            self.sleep(finish - now)
+
+    def run_job(self, nbytes=0):
+        """
+        Wait for the time a job processing ``nbytes`` of data takes.
+
+        Raises:
+            Forbidden: If the job is failed with an injected rateLimitExceeded error
+        """
+        if self.job_error_rate:
+            with self._lock:
+                failed = self._random.random() < self.job_error_rate
+                self.failed_jobs += failed
+            if failed:
+                raise Forbidden("Injected job error: rateLimitExceeded",
+                                errors=[{'reason': 'rateLimitExceeded'}])
+        delay = self.job_latency
+        if self.job_throughput and nbytes:
+            delay += nbytes / self.job_throughput
+        if delay > 0:
+            self.sleep(delay)
+
+
+class FakeBlobWriter(io.RawIOBase):
+    """Writable stream for a resumable upload; each full chunk is one request."""
+
+    def __init__(self, blob, content_type=None, chunk_size=None):
+        self.blob = blob
+        self.content_type = content_type
+        self.chunk_size = chunk_size
+        self._buffer = io.BytesIO()
+        self._sent = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        written = self._buffer.write(data)
+        if self.chunk_size:
+            while self._buffer.tell() - self._sent >= self.chunk_size:
+                self.blob.bucket.client.profile.request('upload_chunk', self.chunk_size)
+                self._sent += self.chunk_size
+        return written
+
+    def close(self):
+        if not self.closed:
+            data = self._buffer.getvalue()
+            self.blob.bucket.client.profile.request('upload_chunk', len(data) - self._sent)
+            self.blob._store(data, self.content_type)
+        super().close()
+
+
+class FakeBlob:
+    """Stand-in for google.cloud.storage.Blob."""
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.content_encoding = None
+        self.metadata = None
+        self.size = None
+        self.generation = None
+
+    def _profile(self):
+        return self.bucket.client.profile
+
+    def _store(self, data, content_type):
+        """Save the blob's contents and attributes in the bucket."""
+        with self.bucket.lock:
+            self.bucket.generation += 1
+            self.content_type = content_type or self.content_type or 'application/octet-stream'
+            self.size = len(data)
+            self.generation = self.bucket.generation
+            self.bucket.objects[self.name] = {
+                'data': bytes(data),
+                'content_type': self.content_type,
+                'content_encoding': self.content_encoding,
+                'metadata': dict(self.metadata) if self.metadata else None,
+                'generation': self.generation,
+            }
+
+    def _load_attributes(self, stored):
+        self.content_type = stored['content_type']
+        self.content_encoding = stored['content_encoding']
+        self.metadata = dict(stored['metadata']) if stored['metadata'] else None
+        self.size = len(stored['data'])
+        self.generation = stored['generation']
+
+    def _stored(self):
+        stored = self.bucket.objects.get(self.name)
+        if stored is None:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        return stored
+
+    def upload_from_string(self, data, content_type='text/plain'):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._profile().request('upload', len(data))
+        self._store(data, content_type)
+
+    def open(self, mode='r', content_type=None, chunk_size=None, ignore_flush=False, **kwargs):
+        if 'w' in mode:
+            return FakeBlobWriter(self, content_type, chunk_size)
+        data = self.download_as_bytes()
+        return io.BytesIO(data) if 'b' in mode else io.StringIO(data.decode('utf-8'))
+
+    def download_as_bytes(self):
+        stored = self._stored()
+        self._profile().request('download', len(stored['data']))
+        return stored['data']
+
+    def exists(self):
+        self._profile().request('exists')
+        return self.name in self.bucket.objects
+
+    def reload(self):
+        self._profile().request('reload')
+        self._load_attributes(self._stored())
+
+    def patch(self):
+        self._profile().request('patch')
+        with self.bucket.lock:
+            self._stored()['metadata'] = dict(self.metadata) if self.metadata else None
+
+    def delete(self):
+        self._profile().request('delete')
+        with self.bucket.lock:
+            self._stored()
+            del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    """Stand-in for google.cloud.storage.Bucket."""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.objects = {}
+        self.generation = 0
+        self.lock = threading.RLock()
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        self.client.profile.request('get_blob')
+        stored = self.objects.get(name)
+        if stored is None:
+            return None
+        blob = FakeBlob(self, name)
+        blob._load_attributes(stored)
+        return blob
+
+    def list_blobs(self, prefix=None, match_glob=None):
+        self.client.profile.request('list_blobs')
+        with self.lock:
+            names = sorted(self.objects)
+        blobs = []
+        for name in names:
+            if prefix and not name.startswith(prefix):
+                continue
+            if match_glob and not fnmatch.fnmatchcase(name, match_glob):
+                continue
+            blob = FakeBlob(self, name)
+            blob._load_attributes(self.objects[name])
+            blobs.append(blob)
+        return blobs
+
+
+class FakeStorageClient:
+    """In-memory stand-in for google.cloud.storage.Client."""
+
+    def __init__(self, profile=None, project=DEFAULT_PROJECT, auto_create_buckets=True):
+        """
+        Initialize the fake storage client.
+
+        Args:
+            profile: NetworkProfile applied to every request (default: no delays)
+            project: Project name
+            auto_create_buckets: Create buckets on first use instead of raising NotFound
+        """
+        self.profile = profile or NetworkProfile()
+        self.project = project
+        self.auto_create_buckets = auto_create_buckets
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def create_bucket(self, bucket_name):
+        self.profile.request('create_bucket')
+        with self._lock:
+            if bucket_name in self.buckets:
+                raise Conflict(f"Bucket {bucket_name} already exists")
+            self.buckets[bucket_name] = FakeBucket(self, bucket_name)
+            return self.buckets[bucket_name]
+
+    def bucket(self, bucket_name):
+        with self._lock:
+            if bucket_name not in self.buckets:
+                self.buckets[bucket_name] = FakeBucket(self, bucket_name)
+            return self.buckets[bucket_name]
+
+    def get_bucket(self, bucket_name):
+        self.profile.request('get_bucket')
+        if bucket_name not in self.buckets and not self.auto_create_buckets:
+            raise NotFound(f"Bucket {bucket_name} not found")
+        return self.bucket(bucket_name)
+
+    def list_blobs(self, bucket_or_name, prefix=None, match_glob=None):
+        bucket = bucket_or_name if isinstance(bucket_or_name, FakeBucket) else self.bucket(bucket_or_name)
+        return bucket.list_blobs(prefix=prefix, match_glob=match_glob)
+
+    def read_uri(self, uri):
+        """
+        Read every object matching a gs:// URI, which may contain a * wildcard.
+
+        Args:
+            uri: gs://bucket/path URI
+
+        Returns:
+            list: (name, bytes, content_encoding) for each matching object
+        """
+        match = re.match(r'gs://([^/]+)/(.+)$', uri)
+        if not match:
+            raise BadRequest(f"Invalid source URI: {uri}")
+        bucket_name, path = match.groups()
+        bucket = self.buckets.get(bucket_name)
+        if bucket is None:
+            raise NotFound(f"Bucket {bucket_name} not found")
+        with bucket.lock:
+            if '*' in path:
+                names = [name for name in sorted(bucket.objects) if fnmatch.fnmatchcase(name, path)]
+            else:
+                names = [path] if path in bucket.objects else []
+            if not names:
+                raise NotFound(f"Not found: URI {uri}")
+            return [(name, bucket.objects[name]['data'], bucket.objects[name]['content_encoding'])
+                    for name in names]
+
+
+class FakeDataset:
+    """Stand-in for google.cloud.bigquery.Dataset."""
+
+    def __init__(self, project, dataset_id, location=None):
+        self.project = project
+        self.dataset_id = dataset_id
+        self.location = location
+
+    @property
+    def full_dataset_id(self):
+        return f"{self.project}.{self.dataset_id}"
+
+
+class FakeTable:
+    """Stand-in for google.cloud.bigquery.Table, holding its rows as a DataFrame."""
+
+    def __init__(self, table_ref, dataframe, range_partitioning=None, clustering_fields=None):
+        self.project, self.dataset_id, self.table_id = table_ref.split('.')
+        self.dataframe = dataframe.reset_index(drop=True)
+        self.range_partitioning = range_partitioning
+        self.clustering_fields = clustering_fields
+        self.modified = time.time()
+
+    @property
+    def full_table_id(self):
+        return f"{self.project}.{self.dataset_id}.{self.table_id}"
+
+    @property
+    def num_rows(self):
+        return len(self.dataframe)
+
+    @property
+    def num_bytes(self):
+        return int(self.dataframe.memory_usage(deep=True).sum())
+
+    @property
+    def schema(self):
+        from .bigquery import schema_from_dataframe
+        return schema_from_dataframe(self.dataframe)
+
+
+class FakeJob:
+    """
+    Stand-in for a BigQuery load, copy or query job.
+
+    The job runs on the client's thread pool as soon as it is created;
+    result() waits for it and raises its error, if any.
+    """
+
+    def __init__(self, client, job_type, job_id):
+        self.client = client
+        self.job_type = job_type
+        self.job_id = job_id
+        self.state = 'PENDING'
+        self.created = time.time()
+        self.started = None
+        self.ended = None
+        self.output_rows = None
+        self.input_file_bytes = None
+        self.output_bytes = None
+        self.slot_millis = None
+        self.error_result = None
+        self.errors = None
+        self._rows = None
+        self._future = None
+
+    def _run(self, work):
+        self.state = 'RUNNING'
+        self.started = time.time()
+        try:
+            self._rows = work(self)
+        except Exception as e:
+            self.error_result = {'reason': type(e).__name__, 'message': str(e)}
+            self.errors = [self.error_result]
+            raise
+        finally:
+            self.ended = time.time()
+            # One slot busy for the whole run of the job
+            self.slot_millis = int((self.ended - self.started) * 1000)
+            self.state = 'DONE'
+
+    def done(self, reload=True):
+        return self._future.done()
+
+    def running(self):
+        return self.state == 'RUNNING'
+
+    def cancel(self):
+        # Only a job still waiting for a free slot can be stopped
+        return self._future.cancel()
+
+    def exception(self, timeout=None):
+        return self._future.exception(timeout)
+
+    def reload(self):
+        self.client.profile.request('get_job')
+
+    def result(self, timeout=None):
+        self._future.result(timeout)
+        if self.job_type == 'query':
+            return list(self._rows or [])
+        return self
+
+
+class FakeBigQueryClient:
+    """In-memory stand-in for google.cloud.bigquery.Client."""
+
+    def __init__(self, storage_client=None, profile=None, project=DEFAULT_PROJECT,
+                 max_concurrent_jobs=8):
+        """
+        Initialize the fake BigQuery client.
+
+        Args:
+            storage_client: FakeStorageClient that load jobs read gs:// URIs from
+            profile: NetworkProfile applied to every request (default: the storage
+                client's profile, or no delays)
+            project: Project name
+            max_concurrent_jobs: Jobs run at once; further jobs wait in a queue
+        """
+        self.storage_client = storage_client
+        self.profile = profile or (storage_client.profile if storage_client else NetworkProfile())
+        self.project = project
+        self.datasets = {}
+        self.tables = {}
+        self.jobs = []
+        self._job_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrent_jobs, thread_name_prefix='fake-bigquery-job')
+
+    def _dataset_ref(self, dataset):
+        if hasattr(dataset, 'dataset_id'):
+            return f"{dataset.project}.{dataset.dataset_id}"
+        dataset = str(dataset)
+        return dataset if '.' in dataset else f"{self.project}.{dataset}"
+
+    def _table_ref(self, table):
+        """Split a table reference into the full table ID and a partition decorator."""
+        if hasattr(table, 'table_id'):
+            table = f"{table.project}.{table.dataset_id}.{table.table_id}"
+        table = str(table)
+        table, _, partition = table.partition('$')
+        if table.count('.') == 1:
+            table = f"{self.project}.{table}"
+        return table, partition or None
+
+    def get_dataset(self, dataset_ref):
+        self.profile.request('get_dataset')
+        ref = self._dataset_ref(dataset_ref)
+        if ref not in self.datasets:
+            raise NotFound(f"Not found: Dataset {ref}")
+        return self.datasets[ref]
+
+    def create_dataset(self, dataset, exists_ok=False):
+        self.profile.request('create_dataset')
+        ref = self._dataset_ref(dataset)
+        with self._lock:
+            if ref in self.datasets:
+                if exists_ok:
+                    return self.datasets[ref]
+                raise Conflict(f"Already Exists: Dataset {ref}")
+            project, dataset_id = ref.split('.')
+            self.datasets[ref] = FakeDataset(project, dataset_id, getattr(dataset, 'location', None))
+            return self.datasets[ref]
+
+    def get_table(self, table):
+        self.profile.request('get_table')
+        ref, _ = self._table_ref(table)
+        with self._lock:
+            if ref not in self.tables:
+                raise NotFound(f"Not found: Table {ref}")
+            return self.tables[ref]
+
+    def delete_table(self, table, not_found_ok=False):
+        self.profile.request('delete_table')
+        ref, _ = self._table_ref(table)
+        with self._lock:
+            if ref not in self.tables:
+                if not_found_ok:
+                    return
+                raise NotFound(f"Not found: Table {ref}")
+            del self.tables[ref]
+
+    def _lookup_table(self, table):
+        """Get a table for a running job, which makes no API request."""
+        ref, _ = self._table_ref(table)
+        with self._lock:
+            if ref not in self.tables:
+                raise NotFound(f"Not found: Table {ref}")
+            return self.tables[ref]
+
+    def list_tables(self, dataset):
+        self.profile.request('list_tables')
+        prefix = self._dataset_ref(dataset) + '.'
+        with self._lock:
+            return [table for ref, table in sorted(self.tables.items()) if ref.startswith(prefix)]
+
+    def get_job(self, job_id, **kwargs):
+        self.profile.request('get_job')
+        with self._lock:
+            for job in self.jobs:
+                if job.job_id == job_id:
+                    return job
+        raise NotFound(f"Not found: Job {self.project}:{job_id}")
+
+    def _submit(self, job_type, work, job_id=None):
+        """Create a job and start running it in the background."""
+        with self._lock:
+            if job_id is not None and any(job.job_id == job_id for job in self.jobs):
+                raise Conflict(f"Already Exists: Job {self.project}:{job_id}")
+            job = FakeJob(self, job_type, job_id or f"fake_{job_type}_{next(self._job_ids)}")
+            job._future = self._executor.submit(job._run, work)
+            self.jobs.append(job)
+        return job
+
+    def _write_table(self, destination, dataframe, write_disposition, range_partitioning=None,
+                     clustering_fields=None, default_disposition='WRITE_APPEND'):
+        """Write rows into a table the way a load or copy job's disposition says."""
+        ref, partition = self._table_ref(destination)
+        project, dataset_id, _ = ref.split('.')
+        disposition = write_disposition or default_disposition
+        with self._lock:
+            if f"{project}.{dataset_id}" not in self.datasets:
+                raise NotFound(f"Not found: Dataset {project}:{dataset_id}")
+            existing = self.tables.get(ref)
+
+            if partition is not None:
+                if existing is None or existing.range_partitioning is None:
+                    raise BadRequest(f"Partition decorator used on non-partitioned table {ref}")
+                field = existing.range_partitioning.field
+                if (dataframe[field] != int(partition)).any():
+                    raise BadRequest(f"Rows outside partition {partition} of {ref}")
+                kept = existing.dataframe
+                if disposition == 'WRITE_TRUNCATE':
+                    kept = kept[kept[field] != int(partition)]
+                existing.dataframe = pd.concat([kept, dataframe], ignore_index=True)
+                existing.modified = time.time()
+                return existing
+
+            if existing is not None and range_partitioning is not None and (
+                    existing.range_partitioning is None
+                    or existing.range_partitioning.field != range_partitioning.field):
+                raise BadRequest(
+                    f"Cannot replace a table with a different partitioning spec: {ref}")
+            if existing is not None and disposition == 'WRITE_EMPTY' and existing.num_rows:
+                raise Conflict(f"Already Exists: Table {ref}")
+            if existing is not None and disposition == 'WRITE_APPEND':
+                existing.dataframe = pd.concat([existing.dataframe, dataframe], ignore_index=True)
+                existing.modified = time.time()
+                return existing
+
+            table = FakeTable(
+                ref, dataframe,
+                range_partitioning=range_partitioning or (existing.range_partitioning if existing else None),
+                clustering_fields=clustering_fields or (existing.clustering_fields if existing else None))
+            self.tables[ref] = table
+            return table
+
+    def _read_source(self, data, content_encoding, job_config):
+        """Parse one source file of a load job into a DataFrame."""
+        source_format = getattr(job_config, 'source_format', None) or bigquery.SourceFormat.CSV
+        if source_format == bigquery.SourceFormat.PARQUET:
+            return pd.read_parquet(io.BytesIO(data))
+
+        if data[:4] == ZSTD_MAGIC:
+            raise BadRequest("Error while reading data: unsupported compression (zstd)")
+        compression = 'gzip' if data[:2] == b'\x1f\x8b' else None
+        schema = getattr(job_config, 'schema', None)
+        if schema:
+            names = [field.name for field in schema]
+            dtypes = {field.name: CSV_FIELD_DTYPES.get(field.field_type, 'object') for field in schema}
+            return pd.read_csv(io.BytesIO(data), compression=compression, header=0,
+                               names=names, dtype=dtypes)
+        dataframe = pd.read_csv(io.BytesIO(data), compression=compression)
+        return dataframe.rename(columns=bigquery_column_name)
+
+    def load_table_from_uri(self, source_uris, destination, job_config=None, job_id=None, **kwargs):
+        if self.storage_client is None:
+            raise BadRequest("FakeBigQueryClient has no storage client to load from")
+        self.profile.request('insert_job')
+        uris = [source_uris] if isinstance(source_uris, str) else list(source_uris)
+
+        def work(job):
+            frames = []
+            nbytes = 0
+            for uri in uris:
+                for _, data, content_encoding in self.storage_client.read_uri(uri):
+                    nbytes += len(data)
+                    frames.append(self._read_source(data, content_encoding, job_config))
+            self.profile.run_job(nbytes)
+            dataframe = pd.concat(frames, ignore_index=True)
+            self._write_table(
+                destination, dataframe, getattr(job_config, 'write_disposition', None),
+                range_partitioning=getattr(job_config, 'range_partitioning', None),
+                clustering_fields=getattr(job_config, 'clustering_fields', None))
+            job.output_rows = len(dataframe)
+            job.input_file_bytes = nbytes
+            job.output_bytes = int(dataframe.memory_usage(deep=True).sum())
+
+        return self._submit('load', work, job_id)
+
+    def load_table_from_dataframe(self, dataframe, destination, job_config=None, job_id=None,
+                                  **kwargs):
+        self.profile.request('insert_job', int(dataframe.memory_usage(deep=True).sum()))
+        dataframe = dataframe.rename(columns=bigquery_column_name)
+
+        def work(job):
+            self.profile.run_job(int(dataframe.memory_usage(deep=True).sum()))
+            self._write_table(
+                destination, dataframe.copy(), getattr(job_config, 'write_disposition', None),
+                range_partitioning=getattr(job_config, 'range_partitioning', None),
+                clustering_fields=getattr(job_config, 'clustering_fields', None))
+            job.output_rows = len(dataframe)
+
+        return self._submit('load', work, job_id)
+
+    def copy_table(self, sources, destination, job_config=None, job_id=None, **kwargs):
+        self.profile.request('insert_job')
+        sources = [sources] if isinstance(sources, str) or hasattr(sources, 'table_id') else list(sources)
+
+        def work(job):
+            frames = [self._lookup_table(source).dataframe for source in sources]
+            dataframe = pd.concat(frames, ignore_index=True)
+            self.profile.run_job(int(dataframe.memory_usage(deep=True).sum()))
+            self._write_table(
+                destination, dataframe, getattr(job_config, 'write_disposition', None),
+                default_disposition='WRITE_EMPTY')
+            job.output_rows = len(dataframe)
+
+        return self._submit('copy', work, job_id)
+
+    def query(self, query, job_config=None, job_id=None, **kwargs):
+        """
+        Run a query job.
+
+        Only the statements the pipeline issues are understood: CREATE OR REPLACE
+        TABLE ... AS a UNION ALL of SELECT * FROM `table`, and a bare
+        SELECT * FROM `table`. Anything else fails with BadRequest.
+        """
+        self.profile.request('insert_job')
+
+        def work(job):
+            statement = query.strip().rstrip(';')
+            create = CREATE_TABLE_PATTERN.match(statement)
+            select = create.group('select') if create else statement
+            sources = SELECT_TABLE_PATTERN.findall(select)
+            if not sources or SELECT_TABLE_PATTERN.sub('', select).replace('UNION ALL', '').strip():
+                raise BadRequest(f"Query not supported by FakeBigQueryClient: {statement[:200]}")
+            dataframe = pd.concat(
+                [self._lookup_table(source).dataframe for source in sources], ignore_index=True)
+            self.profile.run_job(int(dataframe.memory_usage(deep=True).sum()))
+
+            if not create:
+                return dataframe.to_dict('records')
+
+            destination, _ = self._table_ref(create.group('destination'))
+            partitioning = None
+            if create.group('field'):
+                partitioning = bigquery.RangePartitioning(
+                    field=create.group('field'),
+                    range_=bigquery.PartitionRange(
+                        start=int(create.group('start')), end=int(create.group('end')),
+                        interval=int(create.group('interval'))))
+            clustering = None
+            if create.group('cluster'):
+                clustering = [field.strip() for field in create.group('cluster').split(',')]
+            with self._lock:
+                # CREATE OR REPLACE may change the partitioning, unlike a load
+                self.tables.pop(destination, None)
+                self._write_table(destination, dataframe, 'WRITE_TRUNCATE',
+                                  range_partitioning=partitioning, clustering_fields=clustering)
+            job.output_rows = len(dataframe)
+            return []
+
+        return self._submit('query', work, job_id)
+
+    def close(self):
+        """Wait for running jobs and shut down the job thread pool."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,261 @@
+"""
+Fetch cache module for AFL Data Pipeline.
+Caches fitzRoy fetch results on disk as Parquet files.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from . import settings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.fetch_cache')
+
+
+class FetchCache:
+    """
+    On-disk Parquet cache for fitzRoy fetch results.
+
+    Entries are keyed on the dataset name and the fetch arguments. Results for
+    finished seasons never expire; results that include the current season (or
+    no season at all) expire after a TTL. Single rounds of the current season
+    and empty current-season results are never cached, since a round in
+    progress or not played yet changes from one run to the next. The total
+    size of the cache is capped and the least recently used entries are
+    evicted first.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, cache_dir=None, ttl_seconds=None, max_bytes=None,
+                 current_season=None, clock=time.time):
+        """
+        Initialize the Fetch Cache.
+
+        Args:
+            cache_dir: Directory for the cache files (default: settings.FETCH_CACHE_DIR)
+            ttl_seconds: Lifetime of current-season entries (default: settings.FETCH_CACHE_TTL_SECONDS)
+            max_bytes: Maximum total size of cached files (default: settings.FETCH_CACHE_MAX_BYTES)
+            current_season: Season still in progress (default: the current calendar year)
+            clock: Function returning the current time in seconds
+        """
+        self.cache_dir = cache_dir or settings.FETCH_CACHE_DIR
+        self.ttl_seconds = settings.FETCH_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_bytes = settings.FETCH_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.current_season = current_season or datetime.date.today().year
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        self._lock = threading.RLock()
+
+    def _key(self, dataset, params):
+        """Build a stable cache key from the dataset name and fetch arguments."""
+        payload = json.dumps({'dataset': dataset, 'params': params},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _is_historical(self, params):
+        """Check whether every requested season has finished."""
+        season = params.get('season')
+        if season is None:
+            return False
+        seasons = season if isinstance(season, (list, tuple)) else [season]
+        return all(int(s) < self.current_season for s in seasons)
+
+    def _is_cacheable(self, params, df=None):
+        """Check whether a fetch result (or, without df, any result) may be cached."""
+        if self._is_historical(params):
+            return True
+        if params.get('round_number') is not None:
+            return False
+        return df is None or not df.empty
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(os.path.join(self.cache_dir, self.INDEX_FILE)) as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, index_path)
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def contains(self, dataset, **params):
+        """
+        Check whether a fetch result is cached and unexpired, without reading it.
+
+        Args:
+            dataset: Name of the fetched dataset (e.g. player_stats)
+            **params: Fetch arguments
+
+        Returns:
+            bool: True if get() would find the entry
+        """
+        if not self._is_cacheable(params):
+            return False
+        with self._lock:
+            entry = self._load_index().get(self._key(dataset, params))
+            return entry is not None and (
+                entry['expires_at'] is None or self.clock() < entry['expires_at'])
+
+    def get(self, dataset, **params):
+        """
+        Look up a cached fetch result.
+
+        Args:
+            dataset: Name of the fetched dataset (e.g. player_stats)
+            **params: Fetch arguments
+
+        Returns:
+            pandas DataFrame or None: The cached data, or None on a miss
+        """
+        if not self._is_cacheable(params):
+            self.misses += 1
+            return None
+        with self._lock:
+            index = self._load_index()
+            key = self._key(dataset, params)
+            entry = index.get(key)
+            now = self.clock()
+
+            if entry is not None and entry['expires_at'] is not None and now >= entry['expires_at']:
+                logger.info(f"Cache entry for {dataset} {params} expired")
+                self._remove(key)
+                self._save_index()
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            try:
+                df = pd.read_parquet(self._path(key))
+            except Exception as e:
+                logger.warning(
+                    f"Dropping unreadable cache entry for {dataset} {params}: {str(e)}")
+                self._remove(key)
+                self._save_index()
+                self.misses += 1
+                return None
+
+            entry['last_access'] = now
+            self._save_index()
+            self.hits += 1
+            logger.info(f"Cache hit for {dataset} {params}")
+            return df
+
+    def put(self, dataset, df, **params):
+        """
+        Store a fetch result in the cache.
+
+        Args:
+            dataset: Name of the fetched dataset (e.g. player_stats)
+            df: pandas DataFrame to cache
+            **params: Fetch arguments
+
+        Returns:
+            bool: Success status (False when the result may not be cached)
+        """
+        if not self._is_cacheable(params, df):
+            logger.info(f"Not caching {dataset} {params}, which may still change")
+            return False
+        with self._lock:
+            index = self._load_index()
+            key = self._key(dataset, params)
+            path = self._path(key)
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                df.to_parquet(path, index=False)
+            except Exception as e:
+                logger.warning(
+                    f"Could not cache {dataset} {params}: {str(e)}")
+                return False
+
+            now = self.clock()
+            index[key] = {
+                'dataset': dataset,
+                'params': params,
+                'size': os.path.getsize(path),
+                'created_at': now,
+                'last_access': now,
+                'expires_at': None if self._is_historical(params) else now + self.ttl_seconds,
+            }
+            self._evict()
+            self._save_index()
+            return True
+
+    def get_or_fetch(self, dataset, fetch_function, before_fetch=None, **params):
+        """
+        Return a cached result, or fetch, cache and return it on a miss.
+
+        Args:
+            dataset: Name of the fetched dataset (e.g. player_stats)
+            fetch_function: Function called with **params on a miss
+            before_fetch: Optional callable run before fetching (e.g. R initialisation)
+            **params: Fetch arguments
+
+        Returns:
+            pandas DataFrame: The fetched data
+        """
+        df = self.get(dataset, **params)
+        if df is not None:
+            return df
+        if before_fetch is not None:
+            before_fetch()
+        df = fetch_function(**params)
+        self.put(dataset, df, **params)
+        return df
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        total = sum(entry['size'] for entry in self._index.values())
+        by_age = sorted(self._index.items(),
+                        key=lambda item: item[1]['last_access'])
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            logger.info(
+                f"Evicting cache entry for {entry['dataset']} {entry['params']}")
+            total -= entry['size']
+            self._remove(key)
+
+    def size(self):
+        """Return the total size in bytes of the cached files."""
+        with self._lock:
+            return sum(entry['size'] for entry in self._load_index().values())
+
+    def clear(self):
+        """Remove every cache entry."""
+        with self._lock:
+            for key in list(self._load_index()):
+                self._remove(key)
+            self._save_index()
@@ -0,0 +1,292 @@
+"""
+Fetch pool module for AFL Data Pipeline.
+Runs fitzRoy fetches in a pool of worker processes, each with its own embedded R.
+"""
+
+import collections
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from . import settings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.fetch_pool')
+
+
+class FetchError(Exception):
+    """Raised when a fetch request fails in (or keeps crashing) a worker."""
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker process dies or times out while serving a request."""
+
+
+def initialise_r():
+    """Default worker initializer: load the fitzRoy R packages."""
+    from Data_Pipeline.Functions.get_data_functions import func_initialise
+    func_initialise()
+
+
+def fetch_player_stats(**kwargs):
+    """Default worker fetch function: fitzRoy fetch_player_stats."""
+    from Data_Pipeline.Functions.get_data_functions import fetch_player_stats as fetch
+    return fetch(**kwargs)
+
+
+def _worker_main(conn, initializer, fetch_function):
+    """
+    Entry point of a worker process.
+
+    Runs the initializer once, then serves fetch requests received over the pipe
+    until it receives None. Results are returned as Parquet bytes.
+    """
+    initializer()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        try:
+            df = fetch_function(**request)
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, index=False)
+            conn.send(('ok', buffer.getvalue()))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+    conn.close()
+
+
+class _Worker:
+    """A single worker process and the parent end of its pipe."""
+
+    def __init__(self, context, initializer, fetch_function):
+        self.context = context
+        self.initializer = initializer
+        self.fetch_function = fetch_function
+        self.process = None
+        self.conn = None
+        self.start()
+
+    def start(self):
+        """Start (or start again) the worker process."""
+        parent_conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(child_conn, self.initializer, self.fetch_function),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def request(self, kwargs, timeout=None):
+        """
+        Send a fetch request and wait for the reply.
+
+        Raises:
+            WorkerCrashed: If the process dies or the request times out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self.conn.send(kwargs)
+            while not self.conn.poll(0.5):
+                if not self.process.is_alive():
+                    raise WorkerCrashed(
+                        f"worker exited with code {self.process.exitcode}")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise WorkerCrashed(f"request timed out after {timeout}s")
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerCrashed(f"lost connection to worker: {str(e)}")
+
+    def restart(self):
+        """Kill the worker process and start a fresh one."""
+        self.stop(graceful=False)
+        self.start()
+
+    def stop(self, graceful=True):
+        """Stop the worker process."""
+        if graceful and self.process.is_alive():
+            try:
+                self.conn.send(None)
+                self.process.join(5)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+        self.conn.close()
+
+
+class RFetchPool:
+    """
+    Pool of worker processes, each running its own embedded R interpreter.
+
+    rpy2 runs a single-threaded R interpreter per process, so fetching several
+    seasons at once needs several processes. Each worker runs the initializer
+    (func_initialise by default) once and then serves fetch requests. A worker
+    that crashes or hangs is killed and replaced, and its request is retried,
+    without affecting requests running on the other workers.
+    """
+
+    def __init__(self, workers=None, max_retries=None, task_timeout=None,
+                 start_method='spawn', initializer=initialise_r,
+                 fetch_function=fetch_player_stats):
+        """
+        Initialize the fetch pool.
+
+        Args:
+            workers: Number of worker processes (default: settings.FETCH_WORKERS)
+            max_retries: Times a request is retried after its worker crashes
+                (default: settings.FETCH_WORKER_MAX_RETRIES)
+            task_timeout: Seconds before a request is treated as hung (default: no limit)
+            start_method: multiprocessing start method (default: spawn)
+            initializer: Picklable callable run once in each worker
+            fetch_function: Picklable callable run for each request
+        """
+        self.workers = workers or settings.FETCH_WORKERS or os.cpu_count()
+        self.max_retries = settings.FETCH_WORKER_MAX_RETRIES if max_retries is None else max_retries
+        self.task_timeout = task_timeout
+        self.context = multiprocessing.get_context(start_method)
+        self.initializer = initializer
+        self.fetch_function = fetch_function
+        self.restarts = 0
+        self._idle = None
+        self._all_workers = []
+        logger.info(f"RFetchPool initialized with {self.workers} workers")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def start(self):
+        """Start the worker processes (called automatically on first fetch)."""
+        if self._idle is not None:
+            return
+        self._idle = queue.Queue()
+        for _ in range(self.workers):
+            worker = _Worker(self.context, self.initializer,
+                             self.fetch_function)
+            self._all_workers.append(worker)
+            self._idle.put(worker)
+
+    def close(self):
+        """Stop all worker processes."""
+        for worker in self._all_workers:
+            worker.stop()
+        self._all_workers = []
+        self._idle = None
+
+    def fetch(self, season=None, round_number=None, source=None, comp=None):
+        """
+        Fetch one request on the next free worker.
+
+        Args:
+            season: Season (or list of seasons) to fetch
+            round_number: Round to fetch (default: all rounds)
+            source: fitzRoy data source
+            comp: fitzRoy competition
+
+        Returns:
+            pandas DataFrame: The fetched data
+
+        Raises:
+            FetchError: If the fetch fails or the worker keeps crashing
+        """
+        self.start()
+        request = {'season': season, 'round_number': round_number,
+                   'source': source, 'comp': comp}
+        worker = self._idle.get()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    status, payload = worker.request(
+                        request, self.task_timeout)
+                    break
+                except WorkerCrashed as e:
+                    logger.warning(
+                        f"Fetch worker crashed on {request} (attempt {attempt + 1}): {str(e)}")
+                    worker.restart()
+                    self.restarts += 1
+            else:
+                raise FetchError(
+                    f"Worker crashed {self.max_retries + 1} times fetching {request}")
+        finally:
+            self._idle.put(worker)
+
+        if status != 'ok':
+            raise FetchError(f"Fetch failed for {request}:\n{payload}")
+        return pd.read_parquet(io.BytesIO(payload))
+
+    def fetch_seasons(self, seasons, round_number=None, source=None, comp=None):
+        """
+        Fetch several seasons in parallel, one request per season.
+
+        Args:
+            seasons: List of seasons to fetch
+            round_number: Round to fetch for every season (default: all rounds)
+            source: fitzRoy data source
+            comp: fitzRoy competition
+
+        Returns:
+            dict: Season -> pandas DataFrame, or None if that season failed
+        """
+        return dict(self.iter_seasons(seasons, round_number, source, comp))
+
+    def iter_seasons(self, seasons, round_number=None, source=None, comp=None, lookahead=None):
+        """
+        Fetch several seasons in parallel, yielding each one in order.
+
+        Only `lookahead` seasons are fetched ahead of the one being consumed,
+        so memory is bounded by a few seasons however many are requested.
+
+        Args:
+            seasons: Seasons to fetch
+            round_number: Round to fetch for every season (default: all rounds)
+            source: fitzRoy data source
+            comp: fitzRoy competition
+            lookahead: Seasons fetched or fetching at once (default: the number of workers)
+
+        Yields:
+            tuple: (season, pandas DataFrame, or None if that season failed)
+        """
+        self.start()
+        lookahead = lookahead or self.workers
+
+        def fetch_season(season):
+            try:
+                return self.fetch(season, round_number, source, comp)
+            except FetchError as e:
+                logger.error(f"Error fetching season {season}: {str(e)}")
+                return None
+
+        pending = collections.deque()
+        seasons = iter(seasons)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for season in itertools.islice(seasons, lookahead):
+                pending.append((season, executor.submit(fetch_season, season)))
+            while pending:
+                season, future = pending.popleft()
+                df = future.result()
+                for next_season in itertools.islice(seasons, 1):
+                    pending.append((next_season, executor.submit(fetch_season, next_season)))
+                yield season, df
+                del df
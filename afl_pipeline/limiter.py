@@ -0,0 +1,233 @@
+"""
+Limiter module for AFL Data Pipeline.
+Adapts the concurrency of GCS and BigQuery requests to their rate limits.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from google.cloud.exceptions import (
+    BadGateway, Forbidden, GatewayTimeout, InternalServerError, ServiceUnavailable,
+    TooManyRequests)
+
+from . import settings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.limiter')
+
+# Reasons BigQuery and GCS give (with a 403) when a quota or rate limit is hit
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded')
+
+# Transient server errors that are retried without counting as throttling
+TRANSIENT_ERRORS = (InternalServerError, BadGateway, GatewayTimeout)
+
+
+def is_throttled(error):
+    """
+    Check whether an error means the service is asking for fewer requests.
+
+    Args:
+        error: Exception raised by a client call
+
+    Returns:
+        bool: True for 429, 503 and 403 rate-limit or quota errors
+    """
+    if isinstance(error, (TooManyRequests, ServiceUnavailable)):
+        return True
+    if isinstance(error, Forbidden):
+        reasons = [item.get('reason') for item in (error.errors or []) if isinstance(item, dict)]
+        return any(reason in RATE_LIMIT_REASONS for reason in reasons) or any(
+            reason in str(error) for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def is_retryable(error):
+    """Check whether a failed client call should be tried again."""
+    return is_throttled(error) or isinstance(error, TRANSIENT_ERRORS)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for one service that adapts to its rate limits (AIMD).
+
+    Every call made through the limiter takes a slot; at most `limit` calls
+    run at once. When the service throttles a call the limit is cut by
+    decrease_factor, at most once per round of calls, since the calls already
+    in flight when the limit was cut were sent at the old limit. Each success
+    grows the limit by 1 / limit, about one slot per round of successful
+    calls. Throttled and transient errors are retried with exponential
+    backoff and full jitter, without holding a slot while waiting.
+
+    Calls made from inside another call of the same limiter on the same
+    thread run in the outer call's slot, so nested manager methods cannot
+    deadlock.
+    """
+
+    def __init__(self, name, max_limit, min_limit=None, initial_limit=None, max_attempts=None,
+                 backoff_base=None, backoff_max=None, decrease_factor=None,
+                 sleep=time.sleep, rng=None):
+        """
+        Initialize the Adaptive Limiter.
+
+        Args:
+            name: Name of the service, used in logs and metrics
+            max_limit: Most calls allowed at once
+            min_limit: Fewest calls allowed at once (default: settings.CLOUD_MIN_CONCURRENCY)
+            initial_limit: Calls allowed at once to begin with (default: max_limit)
+            max_attempts: Tries per call before its error is raised
+                (default: settings.CLOUD_RETRY_ATTEMPTS)
+            backoff_base: Longest wait before the first retry in seconds
+                (default: settings.CLOUD_BACKOFF_BASE_SECONDS)
+            backoff_max: Cap on the wait before any retry in seconds
+                (default: settings.CLOUD_BACKOFF_MAX_SECONDS)
+            decrease_factor: Factor the limit is multiplied by when throttled
+                (default: settings.CLOUD_CONCURRENCY_DECREASE)
+            sleep: Function used to wait between tries
+            rng: random.Random used for the jitter
+        """
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min_limit or settings.CLOUD_MIN_CONCURRENCY
+        self.limit = float(initial_limit or max_limit)
+        self.max_attempts = max_attempts or settings.CLOUD_RETRY_ATTEMPTS
+        self.backoff_base = backoff_base if backoff_base is not None else settings.CLOUD_BACKOFF_BASE_SECONDS
+        self.backoff_max = backoff_max if backoff_max is not None else settings.CLOUD_BACKOFF_MAX_SECONDS
+        self.decrease_factor = decrease_factor or settings.CLOUD_CONCURRENCY_DECREASE
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.decreases = 0
+        self.waits = 0
+        self.backoff_seconds = 0.0
+        self.lowest_limit = self.limit
+        self._generation = 0
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    def _acquire(self):
+        """Wait for a free slot and return the generation of the limit it was taken at."""
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                self.waits += 1
+                while self.in_flight >= int(self.limit):
+                    self._condition.wait()
+            self.in_flight += 1
+            return self._generation
+
+    def _release(self, generation, outcome):
+        """Give back a slot and adjust the limit for the call's outcome."""
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == 'ok':
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif outcome == 'throttled' and generation == self._generation:
+                self._generation += 1
+                self.decreases += 1
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self.lowest_limit = min(self.lowest_limit, self.limit)
+                logger.info(f"{self.name} throttled, concurrency limit now {int(self.limit)}")
+            self._condition.notify_all()
+
+    def backoff(self, attempt):
+        """Get the wait before retry number `attempt` (from 1), with full jitter."""
+        return self.rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call a function that makes a cloud request within the limit.
+
+        Args:
+            func: Function making the request
+            *args: Positional arguments for func
+            **kwargs: Keyword arguments for func
+
+        Returns:
+            The result of func
+
+        Raises:
+            Exception: The error of the last try, or any error that is not retried
+        """
+        if getattr(self._local, 'depth', 0):
+            return func(*args, **kwargs)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            generation = self._acquire()
+            self._local.depth = 1
+            outcome = 'error'
+            try:
+                result = func(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            except Exception as e:
+                if is_throttled(e):
+                    outcome = 'throttled'
+                retryable = is_retryable(e)
+                with self._condition:
+                    self.throttled += outcome == 'throttled'
+                    self.failures += retryable and attempt >= self.max_attempts
+                if not retryable:
+                    raise
+                if attempt >= self.max_attempts:
+                    logger.error(f"{self.name} request failed after {attempt} attempts: {str(e)}")
+                    raise
+                delay = self.backoff(attempt)
+                with self._condition:
+                    self.retries += 1
+                    self.backoff_seconds += delay
+                logger.warning(
+                    f"{self.name} request failed ({str(e)}), retrying in {delay:.2f}s")
+            finally:
+                self._local.depth = 0
+                with self._condition:
+                    self.calls += outcome == 'ok'
+                self._release(generation, outcome)
+            self.sleep(delay)
+
+    def record_retry(self, error, delay):
+        """
+        Count a retry made outside call(), such as submitting a failed job again.
+
+        Args:
+            error: The error that is being retried
+            delay: Seconds waited before the retry
+        """
+        with self._condition:
+            self.retries += 1
+            self.throttled += is_throttled(error)
+            self.backoff_seconds += delay
+
+    def stats(self):
+        """
+        Get the current limit and the retry counters.
+
+        Returns:
+            dict: Current, lowest and maximum limit, calls in flight, successful
+                calls, retries, throttled tries, calls that failed after
+                retrying, limit decreases, waits for a slot and seconds of backoff
+        """
+        with self._condition:
+            return {
+                'limit': int(self.limit),
+                'lowest_limit': int(self.lowest_limit),
+                'max_limit': self.max_limit,
+                'in_flight': self.in_flight,
+                'calls': self.calls,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'failures': self.failures,
+                'decreases': self.decreases,
+                'waits': self.waits,
+                'backoff_seconds': self.backoff_seconds,
+            }
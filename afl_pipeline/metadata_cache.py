@@ -0,0 +1,87 @@
+"""
+Metadata cache module for AFL Data Pipeline.
+Remembers cloud resource lookups (buckets, datasets) between API calls.
+"""
+
+import threading
+import time
+
+
+class MetadataCache:
+    """
+    Thread-safe cache of resource lookups with an optional TTL.
+
+    Entries are invalidated explicitly when the resource turns out to be
+    gone (e.g. an API call fails with NotFound), so a stale entry costs at
+    most one failed call.
+    """
+
+    def __init__(self, ttl_seconds=None, clock=time.monotonic):
+        """
+        Initialize the Metadata Cache.
+
+        Args:
+            ttl_seconds: Lifetime of an entry in seconds (default: never expires)
+            clock: Function returning the current time in seconds
+        """
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a cached value.
+
+        Args:
+            key: Resource name
+
+        Returns:
+            The cached value, or None if it is missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl_seconds is None or self.clock() - stored_at < self.ttl_seconds:
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Cache a value.
+
+        Args:
+            key: Resource name
+            value: Value to cache (must not be None)
+        """
+        with self._lock:
+            self._entries[key] = (value, self.clock())
+
+    def invalidate(self, key=None):
+        """
+        Drop a cached value.
+
+        Args:
+            key: Resource name (default: drop every entry)
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """
+        Get the hit and miss counters.
+
+        Returns:
+            dict: Hits, misses and the number of cached entries
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
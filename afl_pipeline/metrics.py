@@ -0,0 +1,292 @@
+"""
+Metrics module for AFL Data Pipeline.
+Records timed spans for each pipeline stage and exports them as a run report.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.metrics')
+
+# Prefix for exported Prometheus metrics
+PROMETHEUS_PREFIX = 'afl_pipeline'
+
+# Name of the span that covers a whole run
+RUN_SPAN = 'run'
+
+# Adaptive limiter stats exported per cloud service from the 'concurrency_limits' info
+LIMITER_METRICS = [
+    ('cloud_concurrency_limit', 'Current adaptive concurrency limit of each cloud service', 'limit'),
+    ('cloud_concurrency_lowest_limit', 'Lowest adaptive concurrency limit of each cloud service', 'lowest_limit'),
+    ('cloud_retries_total', 'Cloud requests retried after a throttled or transient error', 'retries'),
+    ('cloud_throttled_total', 'Cloud requests throttled by the service', 'throttled'),
+    ('cloud_failures_total', 'Cloud requests that still failed after every retry', 'failures'),
+]
+
+
+class Span:
+    """One timed stage of the pipeline, e.g. fetching or uploading one year."""
+
+    def __init__(self, name, labels=None, start=None):
+        self.name = name
+        self.labels = labels or {}
+        self.start = start
+        self.duration = None
+        self.rows = None
+        self.bytes = None
+        self.status = 'ok'
+        self.error = None
+
+    @property
+    def rows_per_second(self):
+        if not self.rows or not self.duration:
+            return None
+        return self.rows / self.duration
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'labels': self.labels,
+            'duration_seconds': self.duration,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_second': self.rows_per_second,
+            'status': self.status,
+            'error': self.error,
+        }
+
+
+class RunMetrics:
+    """
+    Collects the spans of one pipeline run.
+
+    Spans can be recorded from several threads at once. Stage totals add up
+    the time of every span of a stage, so stages that run concurrently can
+    account for more time than the run's wall time.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        """
+        Initialize the Run Metrics.
+
+        Args:
+            clock: Function returning a monotonic time in seconds
+        """
+        self.clock = clock
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.spans = []
+        self.info = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **labels):
+        """
+        Time a block of code as a span.
+
+        The span is yielded so rows and bytes can be set on it. An exception
+        marks the span as failed and is re-raised.
+
+        Args:
+            name: Stage name (fetch, preprocess, upload, ...)
+            **labels: Labels for the span, e.g. year=2021
+        """
+        span = Span(name, labels, self.clock())
+        try:
+            yield span
+        except Exception as e:
+            span.status = 'error'
+            span.error = str(e)
+            raise
+        finally:
+            span.duration = self.clock() - span.start
+            self._add(span)
+
+    def record(self, name, duration, rows=None, nbytes=None, status='ok', **labels):
+        """
+        Record a span that was timed elsewhere.
+
+        Args:
+            name: Stage name
+            duration: Wall time in seconds
+            rows: Rows processed
+            nbytes: Bytes processed
+            status: 'ok' or 'error'
+            **labels: Labels for the span
+
+        Returns:
+            Span: The recorded span
+        """
+        span = Span(name, labels)
+        span.duration = duration
+        span.rows = rows
+        span.bytes = nbytes
+        span.status = status
+        self._add(span)
+        return span
+
+    def set_info(self, key, value):
+        """Attach a run-level value (e.g. the years skipped) to the report."""
+        with self._lock:
+            self.info[key] = value
+
+    def _add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def run_duration(self):
+        """Get the wall time of the run span, or None if there is none yet."""
+        durations = [span.duration for span in self.spans if span.name == RUN_SPAN]
+        return durations[-1] if durations else None
+
+    def stage_totals(self):
+        """
+        Add up the spans of each stage.
+
+        Returns:
+            dict: Stage name -> count, errors, seconds, rows, bytes and rows_per_second,
+                in the order stages were first recorded
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            if span.name == RUN_SPAN:
+                continue
+            total = totals.setdefault(span.name, {
+                'count': 0, 'errors': 0, 'seconds': 0.0, 'rows': 0, 'bytes': 0})
+            total['count'] += 1
+            total['errors'] += span.status != 'ok'
+            total['seconds'] += span.duration or 0.0
+            total['rows'] += span.rows or 0
+            total['bytes'] += span.bytes or 0
+        for total in totals.values():
+            total['rows_per_second'] = (
+                total['rows'] / total['seconds'] if total['rows'] and total['seconds'] else None)
+        return totals
+
+    def to_dict(self):
+        """
+        Build the JSON run report.
+
+        Returns:
+            dict: Run details, stage totals and every span
+        """
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+            info = dict(self.info)
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'duration_seconds': self.run_duration(),
+            'info': info,
+            'stages': self.stage_totals(),
+            'spans': spans,
+        }
+
+    def write_json(self, path):
+        """
+        Write the JSON run report.
+
+        Args:
+            path: Path of the report file
+        """
+        _write_atomically(path, json.dumps(self.to_dict(), indent=2, default=str))
+        logger.info(f"Run report written to {path}")
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """
+        Render the stage totals in the Prometheus text exposition format.
+
+        Args:
+            prefix: Prefix for the metric names
+
+        Returns:
+            str: The metrics, ready for the node_exporter textfile collector
+        """
+        totals = self.stage_totals()
+        metrics = [
+            ('stage_duration_seconds', 'Wall time spent in each pipeline stage', 'seconds'),
+            ('stage_rows_total', 'Rows processed by each pipeline stage', 'rows'),
+            ('stage_bytes_total', 'Bytes processed by each pipeline stage', 'bytes'),
+            ('stage_spans_total', 'Spans recorded for each pipeline stage', 'count'),
+            ('stage_errors_total', 'Failed spans of each pipeline stage', 'errors'),
+            ('stage_rows_per_second', 'Rows per second of each pipeline stage', 'rows_per_second'),
+        ]
+        lines = []
+        for name, help_text, key in metrics:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            for stage, total in totals.items():
+                if total[key] is not None:
+                    lines.append(f'{prefix}_{name}{{stage="{stage}"}} {total[key]:g}')
+
+        with self._lock:
+            limits = dict(self.info.get('concurrency_limits') or {})
+        if limits:
+            for name, help_text, key in LIMITER_METRICS:
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                for service, stats in limits.items():
+                    lines.append(f'{prefix}_{name}{{service="{service}"}} {stats[key]:g}')
+
+        lines.append(f"# HELP {prefix}_run_duration_seconds Wall time of the last pipeline run")
+        lines.append(f"# TYPE {prefix}_run_duration_seconds gauge")
+        lines.append(f"{prefix}_run_duration_seconds {self.run_duration() or 0:g}")
+        lines.append(f"# HELP {prefix}_run_start_timestamp_seconds Start time of the last pipeline run")
+        lines.append(f"# TYPE {prefix}_run_start_timestamp_seconds gauge")
+        lines.append(f"{prefix}_run_start_timestamp_seconds {self.started_at:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix=PROMETHEUS_PREFIX):
+        """
+        Write the stage totals as a Prometheus textfile.
+
+        Args:
+            path: Path of the .prom file
+            prefix: Prefix for the metric names
+        """
+        _write_atomically(path, self.to_prometheus(prefix))
+        logger.info(f"Prometheus metrics written to {path}")
+
+    def summary_table(self):
+        """
+        Format the stage totals as a table showing where the time went.
+
+        Returns:
+            str: The summary table
+        """
+        totals = self.stage_totals()
+        run_seconds = self.run_duration() or sum(total['seconds'] for total in totals.values())
+        lines = [f"{'stage':<16} {'spans':>5} {'seconds':>9} {'% run':>6} "
+                 f"{'rows':>10} {'MB':>9} {'rows/s':>11}"]
+        for stage, total in totals.items():
+            share = total['seconds'] / run_seconds * 100 if run_seconds else 0.0
+            rows_per_second = f"{total['rows_per_second']:,.0f}" if total['rows_per_second'] else '-'
+            lines.append(
+                f"{stage:<16} {total['count']:>5} {total['seconds']:>9.3f} {share:>5.1f}% "
+                f"{total['rows']:>10,} {total['bytes'] / 1e6:>9.2f} {rows_per_second:>11}")
+        if self.run_duration() is not None:
+            lines.append(f"{RUN_SPAN:<16} {'':>5} {self.run_duration():>9.3f}")
+        return '\n'.join(lines)
+
+
+def _write_atomically(path, text):
+    """Write a text file via a temporary file so readers never see half of it."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
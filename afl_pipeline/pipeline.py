@@ -3,16 +3,26 @@ Main pipeline module for AFL Data Pipeline.
 Coordinates the entire data pipeline process.
 """
 
+import contextlib
 import os
 import logging
 import sys
-from google.cloud import storage, bigquery
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import pandas as pd
 
-from .storage import StorageManager
-from .bigquery import BigQueryManager
-from .data_processor import preprocess_player_stats, create_sample_data
+from .storage import StorageManager, shard_count
+from .bigquery import BigQueryManager, schema_from_dataframe, WRITE_TRUNCATE, WRITE_APPEND
+from .enrichment import enrich_player_matches
+from .derived_stats import DerivedStatsEngine
+from .data_processor import (
+    preprocess_player_stats, create_sample_data, round_order, latest_round, match_keys,
+    frame_memory, content_hash)
+from .fetch_pool import RFetchPool
+from .fetch_cache import FetchCache
+from .state import RoundTracker, ContentManifest, RunManifest
+from .metrics import RunMetrics, RUN_SPAN
 from . import settings
-from Data_Pipeline.Functions.get_data_functions import func_initialise, fetch_player_stats
 
 # Configure logging
 logging.basicConfig(
@@ -22,23 +32,70 @@ logging.basicConfig(
 logger = logging.getLogger('afl_pipeline.pipeline')
 
 
+# The R functions are imported on first use, so importing the pipeline does not
+# load rpy2 (and start an embedded R) for sample-data or cached runs
+def func_initialise():
+    """Load the fitzRoy R packages."""
+    from Data_Pipeline.Functions.get_data_functions import func_initialise as initialise
+    initialise()
+
+
+def fetch_player_stats(**params):
+    """fitzRoy fetch_player_stats."""
+    from Data_Pipeline.Functions.get_data_functions import fetch_player_stats as fetch
+    return fetch(**params)
+
+
+def fetch_fixture(**params):
+    """fitzRoy fetch_fixture."""
+    from Data_Pipeline.Functions.get_data_functions import fetch_fixture as fetch
+    return fetch(**params)
+
+
+def fetch_results(**params):
+    """fitzRoy fetch_results."""
+    from Data_Pipeline.Functions.get_data_functions import fetch_results as fetch
+    return fetch(**params)
+
+
+def fetch_season_bundle(**params):
+    """Player stats, fixture and results of a season from one R evaluation."""
+    from Data_Pipeline.Functions.get_data_functions import fetch_season_bundle as fetch
+    return fetch(**params)
+
+
+# fitzRoy fetch functions by dataset name
+FETCH_FUNCTIONS = {
+    'player_stats': fetch_player_stats,
+    'fixture': fetch_fixture,
+    'results': fetch_results,
+}
+
+
 class AFLDataPipeline:
     """Main class for coordinating the AFL data pipeline."""
 
-    def __init__(self, service_account_file=None, gcs_bucket_name=None):
+    def __init__(self, service_account_file=None, gcs_bucket_name=None,
+                 storage_client=None, bigquery_client=None):
         """
         Initialize the AFL Data Pipeline.
 
         Args:
             service_account_file: Path to the service account file for authentication
             gcs_bucket_name: Name of the GCS bucket to use
+            storage_client: Optional storage client to use instead of creating one,
+                e.g. a fake_cloud.FakeStorageClient for offline runs
+            bigquery_client: Optional BigQuery client to use instead of creating one,
+                e.g. a fake_cloud.FakeBigQueryClient for offline runs
         """
         # Use values from settings or override with provided values
         self.bucket_name = gcs_bucket_name or settings.GCS_BUCKET_NAME
         service_account_path = service_account_file or settings.DEFAULT_SERVICE_ACCOUNT_PATH
 
-        # Handle authentication
-        if service_account_path:
+        # Handle authentication (not needed when both clients are provided)
+        if storage_client is not None and bigquery_client is not None:
+            logger.info("Using provided storage and BigQuery clients")
+        elif service_account_path:
             if not os.path.exists(service_account_path):
                 logger.error(
                     f"Service account file not found: {service_account_path}")
@@ -52,21 +109,509 @@ class AFLDataPipeline:
 
         # Initialize Google Cloud clients
         try:
-            self.storage_client = storage.Client()
-            self.bigquery_client = bigquery.Client()
+            if storage_client is None:
+                from google.cloud import storage
+                storage_client = storage.Client()
+            if bigquery_client is None:
+                from google.cloud import bigquery
+                bigquery_client = bigquery.Client()
+            self.storage_client = storage_client
+            self.bigquery_client = bigquery_client
 
             # Initialize managers
             self.storage = StorageManager(
                 self.storage_client, self.bucket_name)
             self.bigquery = BigQueryManager(self.bigquery_client)
 
+            # Cache fetch results so finished seasons are not scraped again
+            self.fetch_cache = FetchCache() if settings.FETCH_CACHE_ENABLED else None
+            self._r_initialised = False
+
+            # Last ingested round per season for incremental runs
+            self.round_tracker = RoundTracker()
+
+            # Timed spans of the current run (replaced by each run_pipeline call)
+            self.metrics = RunMetrics()
+
+            # Content hashes of loaded files, so unchanged years can be skipped
+            self.content_manifest = ContentManifest()
+            self._content_hashes = {}
+            self._skipped_steps = {}
+            self._skip_lock = threading.Lock()
+
+            # Stages each year of the current run has completed, for resuming runs
+            self.run_manifest = RunManifest(
+                storage=self.storage if settings.RUN_MANIFEST_GCS_PATH else None)
+            self._resuming = False
+            self._resumed_years = []
+
+            # Rows and schema of each file uploaded in the current run, for batch loads
+            self._uploaded_frames = {}
+            # Size of each file uploaded in the current run before and after compression
+            self._upload_sizes = {}
+
+            # Season aggregates and rolling form, updated as rounds arrive
+            self.derived_stats = DerivedStatsEngine() if settings.DERIVED_STATS_ENABLED else None
+
             logger.info(
                 f"AFLDataPipeline initialized with bucket: {self.bucket_name}")
         except Exception as e:
             logger.error(f"Error initializing AFLDataPipeline: {str(e)}")
             raise
 
-    def process_year(self, year, use_sample_data=False, skip_gcs=False):
+    def ensure_r_initialised(self):
+        """Initialise the R environment the first time a real fetch is needed."""
+        if not self._r_initialised:
+            logger.info("Initialising R environment")
+            func_initialise()
+            self._r_initialised = True
+
+    def fetch_dataset(self, dataset, **params):
+        """
+        Fetch a fitzRoy dataset, going through the fetch cache if enabled.
+
+        R is only initialised when the data is not already cached.
+
+        Args:
+            dataset: Name of the dataset (player_stats, fixture or results)
+            **params: Arguments for the fitzRoy fetch function
+
+        Returns:
+            pandas DataFrame: The fetched data
+        """
+        fetch_function = FETCH_FUNCTIONS[dataset]
+        if self.fetch_cache is None:
+            self.ensure_r_initialised()
+            return fetch_function(**params)
+        return self.fetch_cache.get_or_fetch(
+            dataset, fetch_function, before_fetch=self.ensure_r_initialised, **params)
+
+    def fetch_bundle(self, year, round_number=None):
+        """
+        Fetch a season's player stats, fixture and results with one R call.
+
+        Each dataset is cached under its own name and source, so the R call is
+        only made when one of them is missing from the fetch cache.
+
+        Args:
+            year: Season to fetch
+            round_number: Single round to fetch (default: the whole season)
+
+        Returns:
+            dict: Dataset name (player_stats, fixture, results) -> pandas DataFrame
+        """
+        params = {'season': year}
+        if round_number is not None:
+            params['round_number'] = round_number
+        sources = settings.BUNDLE_SOURCES
+
+        if self.fetch_cache is not None:
+            cached = {dataset: self.fetch_cache.get(dataset, source=source, **params)
+                      for dataset, source in sources.items()}
+            if all(df is not None for df in cached.values()):
+                return cached
+
+        self.ensure_r_initialised()
+        bundle = fetch_season_bundle(sources=sources, **params)
+        if self.fetch_cache is not None:
+            for dataset, df in bundle.items():
+                self.fetch_cache.put(dataset, df, source=sources.get(dataset), **params)
+        return bundle
+
+    def _fetch_year(self, year, use_sample_data=False, round_number=None):
+        """
+        Fetch raw player stats for a year (or create sample data).
+
+        With settings.ENRICH_PLAYER_STATS, real data is fetched together with the
+        season's fixture and results and enriched with each match's scores,
+        margin, result and venue (see enrichment.enrich_player_matches).
+
+        Args:
+            year: Year to fetch
+            use_sample_data: Whether to create sample data instead of fetching real data
+            round_number: Single round to fetch (default: the whole season)
+
+        Returns:
+            pandas DataFrame: Raw player statistics
+        """
+        with self.metrics.span('fetch', year=year) as span:
+            if use_sample_data:
+                # Create sample data
+                logger.info(f"Using sample data for year {year}")
+                df = create_sample_data(year, round_number)
+            else:
+                logger.info(f"Fetching real data for year {year}")
+
+                # Add parent directory to path to find Functions module
+                parent_dir = os.path.dirname(
+                    os.path.dirname(os.path.abspath(__file__)))
+                if parent_dir not in sys.path:
+                    sys.path.append(parent_dir)
+
+                if settings.ENRICH_PLAYER_STATS:
+                    bundle = self.fetch_bundle(year, round_number)
+                    df = bundle['player_stats']
+                else:
+                    params = {'season': year, 'source': 'afltables'}
+                    if round_number is not None:
+                        params['round_number'] = round_number
+                    df = self.fetch_dataset('player_stats', **params)
+            span.rows = len(df)
+
+        if settings.ENRICH_PLAYER_STATS and not use_sample_data:
+            with self.metrics.span('enrich', year=year) as span:
+                df = enrich_player_matches(df, bundle['fixture'], bundle['results'])
+                span.rows = len(df)
+        return df
+
+    def _preprocess_year(self, year, df):
+        """
+        Preprocess a year's raw player stats, recording a preprocess span.
+
+        Args:
+            year: Year of the data
+            df: Raw player statistics
+
+        Returns:
+            pandas DataFrame: Preprocessed player statistics
+        """
+        with self.metrics.span('preprocess', year=year) as span:
+            processed_df = preprocess_player_stats(df, year)
+            span.rows = len(processed_df)
+            span.bytes = frame_memory(processed_df)
+            return processed_df
+
+    def _prepare_year(self, year, use_sample_data=False, dataframe=None):
+        """
+        Fetch (unless already fetched) and preprocess a year's player stats.
+
+        Args:
+            year: Year to prepare
+            use_sample_data: Whether to use sample data instead of fetching real data
+            dataframe: Already-fetched player stats to use instead of fetching
+
+        Returns:
+            pandas DataFrame: Preprocessed player statistics
+        """
+        df = dataframe if dataframe is not None else self._fetch_year(
+            year, use_sample_data)
+        self._checkpoint(year, 'fetched', df)
+        # Preprocess data before uploading
+        df = self._preprocess_year(year, df)
+        self._checkpoint(year, 'preprocessed', df)
+        return df
+
+    def _checkpoint(self, year, stage, df=None, data_hash=None, **details):
+        """
+        Record a stage a year completed in the run manifest (see RunManifest).
+
+        Does nothing outside a run.
+
+        Args:
+            year: Year that completed the stage
+            stage: One of state.RUN_STAGES
+            df: Optional frame of the stage, whose rows are recorded
+            data_hash: Content hash of the stage's data, when it is already known
+                (frames are not hashed just to checkpoint them)
+            **details: Other details to record, e.g. gcs_path=... or table=...
+        """
+        if not self.run_manifest.active:
+            return
+        if df is not None:
+            details['rows'] = len(df)
+        self.run_manifest.record(year, stage, data_hash, **details)
+
+    def _mark_skipped(self, year, step):
+        """Record that a step was skipped for a year because its data was unchanged."""
+        with self._skip_lock:
+            self._skipped_steps.setdefault(year, set()).add(step)
+
+    def skipped_years(self, step='load'):
+        """
+        Get the years of the current run whose data was unchanged.
+
+        Args:
+            step: 'upload' or 'load'
+
+        Returns:
+            list: Sorted years for which the step was skipped
+        """
+        with self._skip_lock:
+            return sorted(year for year, steps in self._skipped_steps.items() if step in steps)
+
+    def _upload_year(self, year, df, gcs_path=None):
+        """
+        Upload a year's preprocessed player stats to GCS.
+
+        With settings.SKIP_UNCHANGED, a content hash of the frame is stored in
+        the blob's metadata, and the upload is skipped when the content
+        manifest or the existing blob already has the same hash. A sharded
+        upload is only skipped when all of its shards, and no others, carry
+        the hash.
+
+        With settings.SHARDED_UPLOADS, frames of more than
+        settings.UPLOAD_SHARD_ROWS rows are uploaded as parallel shards under
+        the path and later loaded through their wildcard URI; other uploads
+        remove shards left by an earlier sharded upload.
+
+        Serialisation and upload are recorded as separate spans from the
+        storage manager's upload stats, and the file's size before and after
+        compression goes into the run report's upload_sizes.
+
+        Args:
+            year: Year being uploaded
+            df: Preprocessed pandas DataFrame
+            gcs_path: Path within the bucket (default: the year's player stats path)
+
+        Returns:
+            bool: Success status
+        """
+        gcs_path = gcs_path or settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(year=year)
+        self._uploaded_frames[gcs_path] = {'rows': len(df), 'schema': schema_from_dataframe(df)}
+        sharded = settings.SHARDED_UPLOADS and len(df) > settings.UPLOAD_SHARD_ROWS
+        if sharded:
+            self.storage.sharded_uri(gcs_path)
+        metadata = None
+        if settings.SKIP_UNCHANGED:
+            data_hash = content_hash(df, settings.UPLOAD_FORMAT, self._upload_compression())
+            self._content_hashes[gcs_path] = data_hash
+            if self.content_manifest.get(gcs_path) == data_hash:
+                stored = True
+            elif sharded:
+                stored = self.storage.check_shards_exist(
+                    gcs_path, shard_count(len(df)), data_hash)
+            else:
+                stored = self.storage.check_blob_exists(gcs_path, content_hash=data_hash)
+            if stored:
+                logger.info(
+                    f"Data for year {year} is unchanged, skipping upload to {gcs_path}")
+                self._mark_skipped(year, 'upload')
+                self._checkpoint(year, 'uploaded', data_hash=data_hash, rows=len(df),
+                                 gcs_path=gcs_path, sharded=sharded)
+                return True
+            metadata = {'content_hash': data_hash}
+
+        start = self.metrics.clock()
+        if sharded:
+            gcs_success = self.storage.upload_dataframe_sharded(
+                df, gcs_path, metadata=metadata) is not None
+        else:
+            gcs_success = self.storage.upload_dataframe(df, gcs_path, metadata=metadata)
+            if gcs_success and settings.SHARDED_UPLOADS:
+                self.storage.delete_shards(gcs_path)
+        stats = self.storage.upload_stats.get(gcs_path) if gcs_success else None
+        if stats:
+            self.metrics.record('serialise', stats['serialise_seconds'],
+                                rows=stats['rows'], year=year)
+            self.metrics.record('upload', stats['upload_seconds'], rows=stats['rows'],
+                                nbytes=stats['bytes'], year=year)
+            self._upload_sizes[gcs_path] = {
+                'raw_bytes': stats['raw_bytes'],
+                'bytes': stats['bytes'],
+                'content_encoding': stats['content_encoding'],
+                'ratio': stats['raw_bytes'] / stats['bytes'] if stats['bytes'] else None,
+            }
+        else:
+            self.metrics.record('upload', self.metrics.clock() - start,
+                                status='ok' if gcs_success else 'error', year=year)
+        if not gcs_success:
+            logger.error(
+                f"Failed to upload data to GCS for year {year}")
+        else:
+            self._checkpoint(year, 'uploaded', data_hash=self._content_hashes.get(gcs_path),
+                             rows=len(df), gcs_path=gcs_path, sharded=sharded)
+        return gcs_success
+
+    def _record_load(self, gcs_path, data_hash, table_id, write_disposition=None):
+        """
+        Record a load of a file into a year's table in the content manifest.
+
+        Args:
+            gcs_path: Path of the file within the bucket
+            data_hash: Content hash of the loaded frame, or None if not known
+            table_id: ID of the year's table
+            write_disposition: BigQuery write disposition of the load
+        """
+        if data_hash is not None:
+            self.content_manifest.record(gcs_path, data_hash, table_id)
+        self.content_manifest.record_contents(
+            f"{settings.PLAYER_STATS_DATASET_ID}.{table_id}", data_hash,
+            append=write_disposition == WRITE_APPEND)
+
+    @staticmethod
+    def _upload_compression():
+        """Get the compression used for uploads in the configured format."""
+        if settings.UPLOAD_FORMAT == 'csv':
+            return settings.CSV_COMPRESSION
+        return settings.PARQUET_COMPRESSION
+
+    @staticmethod
+    def _check_load_format():
+        """
+        Check that BigQuery can load the configured upload format.
+
+        Raises:
+            ValueError: If uploads are zstd-compressed CSV, which BigQuery cannot read
+        """
+        if settings.UPLOAD_FORMAT == 'csv' and settings.CSV_COMPRESSION == 'zstd':
+            raise ValueError(
+                "BigQuery cannot load zstd-compressed CSV; use CSV_COMPRESSION = 'gzip' "
+                "or upload without loading into BigQuery")
+
+    def _load_unchanged(self, year, gcs_path, table_id, data_hash):
+        """
+        Check whether a year's load can be skipped because its data is unchanged.
+
+        See _load_year. A skipped load is marked as such for the run.
+
+        Args:
+            year: Year being loaded
+            gcs_path: Path of the file within the bucket
+            table_id: ID of the year's table
+            data_hash: Content hash of the uploaded frame (None: never skip)
+
+        Returns:
+            bool: True if the table already holds the data
+        """
+        unchanged = (data_hash is not None
+                     and self.content_manifest.get(gcs_path, table=table_id) == data_hash)
+        if unchanged:
+            logger.info(
+                f"Data for year {year} is unchanged, skipping load into {table_id}")
+            self._mark_skipped(year, 'load')
+        return unchanged
+
+    def _load_year(self, year, gcs_path, write_disposition=None, df=None, checkpoint=True):
+        """
+        Load a year's GCS file into its BigQuery table.
+
+        When the content manifest records that the file's content hash (see
+        _upload_year) was already loaded into the table, the load is skipped.
+
+        Args:
+            year: Year being loaded
+            gcs_path: Path of the file within the bucket
+            write_disposition: BigQuery write disposition (default: WRITE_TRUNCATE)
+            df: The uploaded DataFrame, used to give CSV loads an explicit schema
+            checkpoint: Whether to record the year as loaded in the run manifest
+                (not for a single round of a season)
+
+        Returns:
+            bool: Success status
+
+        Raises:
+            ValueError: If the upload format cannot be loaded (see _check_load_format)
+        """
+        self._check_load_format()
+        gcs_uri = self.storage.source_uri(gcs_path)
+        table_id = settings.BIGQUERY_PLAYER_STATS_TABLE_TEMPLATE.format(
+            year=year)
+
+        data_hash = self._content_hashes.get(gcs_path) if df is not None else None
+        if self._load_unchanged(year, gcs_path, table_id, data_hash):
+            if checkpoint:
+                self._checkpoint(year, 'loaded', data_hash=data_hash, gcs_path=gcs_path,
+                                 table=table_id)
+            return True
+
+        stats = self.storage.upload_stats.get(gcs_path) or {}
+        with self.metrics.span('bigquery_load', year=year) as span:
+            bq_success = self.bigquery.upload_from_gcs(
+                gcs_uri,
+                table_id,
+                dataset_id=settings.PLAYER_STATS_DATASET_ID,
+                write_disposition=write_disposition,
+                schema=schema_from_dataframe(df) if df is not None else None
+            )
+            span.rows = len(df) if df is not None else stats.get('rows')
+            span.bytes = stats.get('bytes')
+            span.status = 'ok' if bq_success else 'error'
+        if not bq_success:
+            logger.error(
+                f"Failed to upload data to BigQuery for year {year}")
+            return False
+        self._record_load(gcs_path, data_hash, table_id, write_disposition)
+        if checkpoint:
+            self._checkpoint(year, 'loaded', data_hash=data_hash, gcs_path=gcs_path, table=table_id)
+        return True
+
+    def publish_derived_stats(self, year, df, rounds=None, season=None):
+        """
+        Compute a season's derived tables and load them into BigQuery.
+
+        The season stats table is replaced every time. The form table is
+        replaced when the whole season is given and appended to when only new
+        rounds are. The engine's state is saved only once both tables are
+        loaded. Does nothing unless settings.DERIVED_STATS_ENABLED is set.
+
+        New rounds need the engine's saved state for the season, which is
+        missing when derived stats were enabled mid-season or the state
+        directory is new. The whole season is then taken from season and both
+        tables are rebuilt; without season, or if it lacks some of the new
+        games, publishing fails rather than replacing the season stats with
+        those of part of the season.
+
+        Args:
+            year: Season of the player stats
+            df: Preprocessed player stats of the whole season, or of new rounds
+            rounds: (first, last) round numbers of df when it holds only new rounds
+            season: Optional callable returning the preprocessed player stats of
+                the whole season, used when new rounds have no state to build on
+
+        Returns:
+            bool: Success status
+        """
+        if self.derived_stats is None:
+            return True
+
+        with self.metrics.span('derived_stats', year=year) as span:
+            try:
+                if rounds is not None and season is not None and not self.derived_stats.has_state(year):
+                    logger.info(
+                        f"No derived stats state for year {year}, rebuilding from the whole season")
+                    season_df = season()
+                    if not match_keys(df).isin(set(match_keys(season_df))).all():
+                        raise ValueError("the whole season is missing some of the new games")
+                    df, rounds = season_df, None
+                if rounds is None:
+                    tables = self.derived_stats.rebuild_season(year, df, save=False)
+                    form_path = settings.GCS_FORM_PATH_TEMPLATE.format(year=year)
+                    form_disposition = WRITE_TRUNCATE
+                else:
+                    tables = self.derived_stats.update_season(year, df, save=False)
+                    form_path = settings.GCS_FORM_ROUNDS_PATH_TEMPLATE.format(
+                        year=year, first_round=rounds[0], last_round=rounds[1])
+                    form_disposition = WRITE_APPEND
+            except Exception as e:
+                span.status = 'error'
+                span.error = str(e)
+                logger.error(f"Failed to compute derived stats for year {year}: {str(e)}")
+                return False
+            span.rows = len(tables['season_stats']) + len(tables['form'])
+
+            uploads = [
+                (tables['season_stats'], settings.GCS_SEASON_STATS_PATH_TEMPLATE.format(year=year),
+                 settings.BIGQUERY_SEASON_STATS_TABLE_TEMPLATE.format(year=year), WRITE_TRUNCATE),
+                (tables['form'], form_path,
+                 settings.BIGQUERY_FORM_TABLE_TEMPLATE.format(year=year), form_disposition),
+            ]
+            for table_df, gcs_path, table_id, write_disposition in uploads:
+                success = self.storage.upload_dataframe(table_df, gcs_path) and self.bigquery.upload_from_gcs(
+                    self.storage.source_uri(gcs_path),
+                    table_id,
+                    dataset_id=settings.DERIVED_STATS_DATASET_ID,
+                    write_disposition=write_disposition,
+                    schema=schema_from_dataframe(table_df)
+                )
+                if not success:
+                    span.status = 'error'
+                    logger.error(f"Failed to publish {table_id} for year {year}")
+                    return False
+            self.derived_stats.commit(year)
+        return True
+
+    def process_year(self, year, use_sample_data=False, skip_gcs=False, dataframe=None,
+                     incremental=False, load_to_bigquery=True):
         """
         Process a single year of data.
 
@@ -74,63 +619,49 @@ class AFLDataPipeline:
             year: Year to process
             use_sample_data: Whether to use sample data instead of fetching real data
             skip_gcs: Whether to skip the GCS upload step
+            dataframe: Already-fetched player stats to use instead of fetching
+            incremental: Whether to ingest only the rounds added since the last run
+            load_to_bigquery: Whether to load the year into its own BigQuery table
+                (bulk loads skip this and load every year at once)
 
         Returns:
             bool: Success status
         """
+        if incremental:
+            return self.process_year_incremental(year, use_sample_data)
+
         logger.info(f"Processing year {year}")
         try:
             gcs_path = settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(
                 year=year)
+            df = None
+
+            # A resumed run picks up at the load if the year's file is already uploaded
+            uploaded = self.run_manifest.done(year, 'uploaded') if self._resuming else None
+            if uploaded and uploaded.get('gcs_path') == gcs_path:
+                logger.info(
+                    f"Year {year} was uploaded before the run was interrupted, resuming at the load")
+                self._mark_skipped(year, 'upload')
 
             # Step 1: Upload to GCS (if not skipped)
-            if not skip_gcs:
-                if use_sample_data:
-                    # Create sample data
-                    logger.info(f"Using sample data for year {year}")
-                    df = create_sample_data(year)
-                else:
-                    # Import fitzRoy functions here to avoid circular imports
-                    logger.info(f"Fetching real data for year {year}")
-
-                    # Add parent directory to path to find Functions module
-                    parent_dir = os.path.dirname(
-                        os.path.dirname(os.path.abspath(__file__)))
-                    if parent_dir not in sys.path:
-                        sys.path.append(parent_dir)
-
-                    # Import the function to fetch player stats
-                    try:
-                        df = fetch_player_stats(
-                            season=year, source='afltables')
-                    except ImportError:
-                        logger.error(
-                            "Could not import fetch_player_stats. Make sure AFL_data_functions is in your Python path.")
-                        return False
-
-                # Preprocess data before uploading
-                df = preprocess_player_stats(df, year)
+            elif not skip_gcs:
+                try:
+                    df = self._prepare_year(year, use_sample_data, dataframe)
+                except ImportError:
+                    logger.error(
+                        "Could not import fetch_player_stats. Make sure AFL_data_functions is in your Python path.")
+                    return False
 
                 # Upload to GCS
-                gcs_success = self.storage.upload_dataframe(df, gcs_path)
-                if not gcs_success:
-                    logger.error(
-                        f"Failed to upload data to GCS for year {year}")
+                if not self._upload_year(year, df):
                     return False
 
             # Step 2: Upload from GCS to BigQuery
-            gcs_uri = f'gs://{self.bucket_name}/{gcs_path}'
-            table_id = settings.BIGQUERY_PLAYER_STATS_TABLE_TEMPLATE.format(
-                year=year)
+            if load_to_bigquery and not self._load_year(year, gcs_path, df=df):
+                return False
 
-            bq_success = self.bigquery.upload_from_gcs(
-                gcs_uri,
-                table_id,
-                dataset_id=settings.PLAYER_STATS_DATASET_ID
-            )
-            if not bq_success:
-                logger.error(
-                    f"Failed to upload data to BigQuery for year {year}")
+            # Step 3: Derived tables of the whole season
+            if df is not None and not self.publish_derived_stats(year, df):
                 return False
 
             logger.info(f"Successfully processed year {year}")
@@ -139,7 +670,584 @@ class AFLDataPipeline:
             logger.error(f"Error processing year {year}: {str(e)}")
             return False
 
-    def run_pipeline(self, years, use_sample_data=False, skip_gcs=False, create_combined=True):
+    def process_year_incremental(self, year, use_sample_data=False):
+        """
+        Ingest only the games of a season added since the last run.
+
+        The last ingested round of each season, and which of its games were
+        ingested, are kept by the round tracker. That round is fetched again
+        for games played since, then newer rounds one at a time with the
+        round_number argument; the new games are uploaded as a separate file
+        and appended to the season table. A season with no recorded rounds is
+        loaded in full first.
+
+        Args:
+            year: Season to process
+            use_sample_data: Whether to use sample data instead of fetching real data
+
+        Returns:
+            bool: Success status
+        """
+        logger.info(f"Processing year {year} incrementally")
+        try:
+            last_round = self.round_tracker.last_round(year)
+
+            if last_round is None:
+                logger.info(
+                    f"No ingested rounds recorded for year {year}, loading the full season")
+                df = self._preprocess_year(
+                    year, self._fetch_year(year, use_sample_data))
+                gcs_path = settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(
+                    year=year)
+                if not self._upload_year(year, df, gcs_path):
+                    return False
+                if not self._load_year(year, gcs_path, df=df):
+                    return False
+                if not self.publish_derived_stats(year, df):
+                    return False
+                season_round = latest_round(df)
+                if season_round is not None:
+                    self.round_tracker.record(
+                        year, season_round, self._round_matches(df, season_round))
+                logger.info(f"Successfully processed year {year}")
+                return True
+
+            # Fetch newer games until the source has nothing more to give
+            ingested_matches = self.round_tracker.ingested_matches(year)
+            new_frames = []
+            first_round = ingested_round = None
+            for rounds, df in self._iter_rounds(year, use_sample_data, after_round=last_round,
+                                                ingested_matches=ingested_matches):
+                new_frames.append(df)
+                if first_round is None:
+                    first_round = rounds[0]
+                ingested_round = rounds[1]
+
+            if not new_frames:
+                logger.info(
+                    f"No games after those ingested in round {last_round} available for year {year}")
+                return True
+
+            df = self._preprocess_year(
+                year, pd.concat(new_frames, ignore_index=True))
+            gcs_path = settings.GCS_PLAYER_STATS_ROUNDS_PATH_TEMPLATE.format(
+                year=year, first_round=first_round, last_round=ingested_round)
+            if not self._upload_year(year, df, gcs_path):
+                logger.error(
+                    f"Failed to upload rounds {first_round}-{ingested_round} to GCS for year {year}")
+                return False
+            if not self._load_year(year, gcs_path,
+                                   write_disposition=WRITE_APPEND,
+                                   df=df):
+                return False
+            if not self.publish_derived_stats(
+                    year, df, rounds=(first_round, ingested_round),
+                    season=lambda: self._preprocess_year(
+                        year, self._fetch_year(year, use_sample_data))):
+                return False
+
+            self.round_tracker.record(year, ingested_round, self._round_matches(
+                df, ingested_round, ingested_matches if ingested_round == last_round else None))
+            logger.info(
+                f"Successfully appended rounds {first_round}-{ingested_round} for year {year}")
+            return True
+        except Exception as e:
+            logger.error(
+                f"Error processing year {year} incrementally: {str(e)}")
+            return False
+
+    def run_years_concurrently(self, years, use_sample_data=False, skip_gcs=False, prefetched=None,
+                               load_to_bigquery=True):
+        """
+        Process several years with overlapping fetch, upload and load stages.
+
+        Each stage has its own bounded worker pool, so while one year is being
+        uploaded or loaded into BigQuery the next year is already being fetched.
+        A loaded year's derived stats are published on its load worker.
+        Fetching uses settings.FETCH_CONCURRENCY workers (1 by default, since the
+        embedded R interpreter is single-threaded), and at most
+        settings.MAX_YEARS_IN_FLIGHT years are held in memory at once.
+
+        Args:
+            years: List of years to process
+            use_sample_data: Whether to use sample data
+            skip_gcs: Whether to skip the fetch and GCS upload steps
+            prefetched: Optional dict of year -> already-fetched DataFrame
+            load_to_bigquery: Whether to load each year into its own BigQuery table
+
+        Returns:
+            list: List of successfully processed years, in the order given
+        """
+        prefetched = prefetched or {}
+        outcomes = {year: Future() for year in years}
+        in_flight = threading.BoundedSemaphore(settings.MAX_YEARS_IN_FLIGHT)
+
+        fetch_pool = ThreadPoolExecutor(
+            settings.FETCH_CONCURRENCY, thread_name_prefix='afl-fetch')
+        upload_pool = ThreadPoolExecutor(
+            settings.UPLOAD_CONCURRENCY, thread_name_prefix='afl-upload')
+        load_pool = ThreadPoolExecutor(
+            settings.LOAD_CONCURRENCY, thread_name_prefix='afl-load')
+
+        def finish(year, stage, error=None):
+            outcomes[year].set_result((stage, error))
+            in_flight.release()
+
+        def run_stage(year, stage, function, *args):
+            # Run one stage, returning its result or recording the failure
+            try:
+                result = function(*args)
+            except Exception as e:
+                finish(year, stage, str(e))
+                return None
+            if result is False:
+                finish(year, stage, f"{stage} step failed")
+                return None
+            return result
+
+        def publish(year, df):
+            # Derived tables of the whole season, once its player stats are in
+            if df is None or run_stage(year, 'derived_stats', self.publish_derived_stats, year, df):
+                finish(year, None)
+
+        def load(year, df):
+            gcs_path = settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(
+                year=year)
+            if run_stage(year, 'load', self._load_year, year, gcs_path, None, df):
+                publish(year, df)
+
+        def upload(year, df):
+            if run_stage(year, 'upload', self._upload_year, year, df):
+                if load_to_bigquery:
+                    load_pool.submit(load, year, df)
+                else:
+                    publish(year, df)
+
+        def fetch(year):
+            df = run_stage(year, 'fetch', self._prepare_year,
+                           year, use_sample_data, prefetched.get(year))
+            if df is not None:
+                upload_pool.submit(upload, year, df)
+
+        try:
+            for year in years:
+                in_flight.acquire()
+                if skip_gcs:
+                    load_pool.submit(load, year, None)
+                else:
+                    fetch_pool.submit(fetch, year)
+            results = {year: outcome.result()
+                       for year, outcome in outcomes.items()}
+        finally:
+            for pool in (fetch_pool, upload_pool, load_pool):
+                pool.shutdown(wait=True)
+
+        # Report outcomes in the order the years were given
+        successful_years = []
+        for year in years:
+            stage, error = results[year]
+            if stage is None:
+                logger.info(f"Successfully processed year {year}")
+                successful_years.append(year)
+            else:
+                logger.error(
+                    f"Error processing year {year} at {stage} stage: {error}")
+        return successful_years
+
+    def load_years_batch(self, years):
+        """
+        Load the GCS files of several years into their own tables as one batch.
+
+        All load jobs are submitted at once and waited on together (see
+        BigQueryManager.load_many), so the batch takes about as long as the
+        slowest job. Unchanged years are skipped as in _load_year.
+
+        Args:
+            years: List of years whose files should be loaded
+
+        Returns:
+            list: The years that were loaded (or unchanged), in the order given
+        """
+        loads = []
+        schemas = {}
+        pending = {}
+        for year in years:
+            gcs_path = settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(year=year)
+            table_id = settings.BIGQUERY_PLAYER_STATS_TABLE_TEMPLATE.format(year=year)
+            frame = self._uploaded_frames.get(gcs_path, {})
+            data_hash = self._content_hashes.get(gcs_path) if frame else None
+            if self._load_unchanged(year, gcs_path, table_id, data_hash):
+                self._checkpoint(year, 'loaded', data_hash=data_hash, gcs_path=gcs_path, table=table_id)
+                continue
+            loads.append((self.storage.source_uri(gcs_path), table_id))
+            schemas[table_id] = frame.get('schema')
+            pending[table_id] = (year, gcs_path, data_hash)
+
+        results = self.bigquery.load_many(
+            loads, dataset_id=settings.PLAYER_STATS_DATASET_ID, schemas=schemas) if loads else {}
+
+        failed_years = set()
+        for table_id, result in results.items():
+            year, gcs_path, data_hash = pending[table_id]
+            success = result['status'] == 'ok'
+            self.metrics.record('bigquery_load', result.get('seconds') or 0.0,
+                                rows=result.get('rows'), nbytes=result.get('input_bytes'),
+                                status='ok' if success else 'error', year=year)
+            if not success:
+                logger.error(
+                    f"Failed to upload data to BigQuery for year {year}: {result['error']}")
+                failed_years.add(year)
+                continue
+            self._record_load(gcs_path, data_hash, table_id)
+            self._checkpoint(year, 'loaded', data_hash=data_hash, gcs_path=gcs_path, table=table_id)
+        return [year for year in years if year not in failed_years]
+
+    def bulk_load_years(self, years, use_wildcard=False):
+        """
+        Load the GCS files of several years into the combined table in one job.
+
+        With settings.COMBINED_TABLE_PARTITIONED and an explicit list of years,
+        an existing combined table keeps every other season: only the years
+        whose files changed since they were last loaded replace their own
+        partitions (see BigQueryManager.bulk_load_from_gcs).
+
+        Args:
+            years: List of years whose files should be loaded
+            use_wildcard: Load every file matching settings.GCS_PLAYER_STATS_WILDCARD
+                instead of an explicit list of the given years, replacing the table
+
+        Returns:
+            bool: Success status
+        """
+        table_id = settings.COMBINED_STATS_TABLE_ID
+        gcs_paths = [settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(year=year) for year in years]
+        hashes = {path: self._content_hashes.get(path) for path in gcs_paths}
+        changed_years = [
+            year for year, (path, data_hash) in zip(years, hashes.items())
+            if data_hash is None or self.content_manifest.get(path, table=table_id) != data_hash]
+
+        # Nothing to do when every file was already loaded into the table as it is
+        if not use_wildcard and not changed_years:
+            logger.info(f"Data for years {years} is unchanged, skipping bulk load")
+            for year in years:
+                self._mark_skipped(year, 'load')
+            return True
+
+        if use_wildcard:
+            gcs_uris = f'gs://{self.bucket_name}/{settings.GCS_PLAYER_STATS_WILDCARD}'
+        else:
+            gcs_uris = [self.storage.source_uri(path) for path in gcs_paths]
+        success = self.bigquery.bulk_load_from_gcs(
+            gcs_uris,
+            table_id,
+            dataset_id=settings.COMBINED_STATS_DATASET_ID,
+            partitioned=settings.COMBINED_TABLE_PARTITIONED,
+            partitions=None if use_wildcard else years,
+            replace_partitions=None if use_wildcard else changed_years
+        )
+        if success:
+            for path, data_hash in hashes.items():
+                if data_hash is not None:
+                    self.content_manifest.record(path, data_hash, table_id)
+        return success
+
+    def fetch_years_parallel(self, years, fetch_workers):
+        """
+        Fetch player stats for several years with a pool of embedded-R workers.
+
+        Every year is held in memory at once; iter_fetched_years streams them.
+
+        Args:
+            years: List of years to fetch
+            fetch_workers: Number of worker processes
+
+        Returns:
+            dict: Year -> pandas DataFrame, or None if that year failed
+        """
+        return dict(self.iter_fetched_years(years, fetch_workers))
+
+    def iter_fetched_years(self, years, fetch_workers):
+        """
+        Fetch player stats for several years with a pool of embedded-R workers,
+        yielding each year in order.
+
+        Years already in the fetch cache are read from it when their turn
+        comes; only the rest are sent to the pool, which fetches at most
+        fetch_workers years ahead of the one being consumed. A cached year
+        can be gone by then, evicted by this run's own puts or expired, and is
+        then fetched in this process instead. The time spent waiting for each
+        year is recorded as a fetch span.
+
+        Args:
+            years: List of years to fetch
+            fetch_workers: Number of worker processes
+
+        Yields:
+            tuple: (year, pandas DataFrame, or None if that year failed)
+        """
+        missing_years = [
+            year for year in years
+            if self.fetch_cache is None
+            or not self.fetch_cache.contains('player_stats', season=year, source='afltables')]
+
+        with contextlib.ExitStack() as stack:
+            fetched = iter(())
+            if missing_years:
+                logger.info(
+                    f"Fetching {len(missing_years)} years with {fetch_workers} R worker processes")
+                pool = stack.enter_context(RFetchPool(workers=fetch_workers))
+                fetched = pool.iter_seasons(missing_years, source='afltables')
+                stack.callback(fetched.close)
+            missing_years = set(missing_years)
+
+            for year in years:
+                with self.metrics.span('fetch', year=year, workers=fetch_workers) as span:
+                    if year in missing_years:
+                        _, df = next(fetched)
+                        if df is not None and self.fetch_cache is not None:
+                            self.fetch_cache.put(
+                                'player_stats', df, season=year, source='afltables')
+                    else:
+                        df = self.fetch_cache.get(
+                            'player_stats', season=year, source='afltables')
+                        if df is None:
+                            logger.info(
+                                f"Year {year} is no longer in the fetch cache, fetching it")
+                            df = self._fetch_evicted_year(year)
+                    span.rows = len(df) if df is not None else None
+                yield year, df
+                df = None
+
+    def _fetch_evicted_year(self, year):
+        """Fetch a year in this process after it dropped out of the fetch cache."""
+        try:
+            return self.fetch_dataset('player_stats', season=year, source='afltables')
+        except Exception as e:
+            logger.error(f"Error fetching year {year}: {str(e)}")
+            return None
+
+    def _iter_rounds(self, year, use_sample_data=False, after_round=None, ingested_matches=None):
+        """
+        Fetch a season's rounds one at a time.
+
+        Rounds are fetched with the round_number argument until the source has
+        nothing more to give. A season with nothing ingested starts at round 0,
+        the Opening Round of seasons that have one, and moves on to round 1 when
+        the source has no round 0. When games of the last ingested round were
+        ingested before the round was over, that round is fetched again and
+        only its other games are kept. Sources that ignore round_number return
+        the whole season, so rows already ingested are dropped, the rest of the
+        season comes as one chunk and nothing more is fetched.
+
+        Args:
+            year: Season to fetch
+            use_sample_data: Whether to create sample data (a single round) instead
+            after_round: Last round already ingested; only later rounds, and games
+                of that round not in ingested_matches, are fetched (default:
+                nothing ingested, every round is fetched)
+            ingested_matches: Match keys (see match_keys) of the games of
+                after_round already ingested
+
+        Yields:
+            tuple: ((first_round, last_round), raw pandas DataFrame of those rounds)
+        """
+        ingested_matches = ingested_matches or set()
+        if after_round is None:
+            # Round 0 may not exist, and then round 1 is the first round
+            next_round = optional_round = 0
+        elif ingested_matches:
+            # Every game of the last ingested round may already be in
+            next_round = optional_round = after_round
+        else:
+            next_round, optional_round = after_round + 1, None
+        for _ in range(settings.MAX_ROUNDS_PER_SEASON):
+            df = self._fetch_year(year, use_sample_data, round_number=next_round)
+            whole_season = False
+            if 'Round' in df.columns and not df.empty:
+                order = round_order(df['Round'])
+                whole_season = bool((order.notna() & (order != next_round)).any())
+                new_rows = order >= next_round
+                if ingested_matches:
+                    new_rows &= ~((order == after_round) & match_keys(df).isin(ingested_matches))
+                df = df[new_rows]
+            if df.empty:
+                if next_round == optional_round and not whole_season:
+                    next_round += 1
+                    continue
+                break
+            first = round_order(df['Round']).min() if 'Round' in df.columns else None
+            rounds = (next_round if pd.isna(first) else int(first), latest_round(df) or next_round)
+            next_round = rounds[1] + 1
+            yield rounds, df
+            df = None
+            if use_sample_data or whole_season:
+                # Sample data has no notion of which rounds exist, and the rest
+                # of a whole season has just been yielded
+                break
+
+    @staticmethod
+    def _round_matches(df, round_number, matches=None):
+        """
+        Get the match keys of the games of one round in a frame.
+
+        Args:
+            df: pandas DataFrame with player statistics
+            round_number: Round whose games to return
+            matches: Match keys of the round ingested earlier, added to the result
+
+        Returns:
+            set: Match keys (see match_keys)
+        """
+        keys = set(matches or ())
+        if 'Round' in df.columns and not df.empty:
+            keys.update(match_keys(df[round_order(df['Round']) == round_number]).unique())
+        return keys
+
+    def iter_seasons(self, years, use_sample_data=False, by_round=False, fetch_workers=None):
+        """
+        Fetch and preprocess seasons one at a time, or one round at a time.
+
+        Each chunk is fetched when the previous one has been consumed (with
+        fetch workers, a few seasons ahead) and nothing is kept once it has
+        been yielded, so peak memory is set by the largest chunk rather than
+        by the number of seasons.
+
+        Args:
+            years: Seasons to fetch
+            use_sample_data: Whether to create sample data instead of fetching real data
+            by_round: Whether to yield each round (see _iter_rounds) instead of whole seasons
+            fetch_workers: Number of R worker processes fetching whole seasons ahead
+                (default: settings.FETCH_WORKERS, 1 = fetch in-process)
+
+        Yields:
+            tuple: (year, (first_round, last_round) or None for a whole season,
+                preprocessed pandas DataFrame, or None if the chunk could not be fetched)
+        """
+        fetch_workers = fetch_workers or settings.FETCH_WORKERS
+        if by_round:
+            for year in years:
+                rounds = (1, 1)
+                try:
+                    for rounds, df in self._iter_rounds(year, use_sample_data):
+                        df = self._preprocess_year(year, df)
+                        yield year, rounds, df
+                        df = None
+                except Exception as e:
+                    logger.error(f"Error fetching rounds of year {year}: {str(e)}")
+                    yield year, rounds, None
+        elif fetch_workers > 1 and not use_sample_data:
+            for year, df in self.iter_fetched_years(years, fetch_workers):
+                if df is None:
+                    logger.error(f"No data fetched for year {year}")
+                else:
+                    df = self._prepare_year(year, dataframe=df)
+                yield year, None, df
+                df = None
+        else:
+            for year in years:
+                try:
+                    df = self._prepare_year(year, use_sample_data)
+                except Exception as e:
+                    logger.error(f"Error fetching year {year}: {str(e)}")
+                    df = None
+                yield year, None, df
+                df = None
+
+    def stream_pipeline(self, years, use_sample_data=False, by_round=False, fetch_workers=None,
+                        load_to_bigquery=True):
+        """
+        Fetch, preprocess, upload and load seasons one chunk at a time.
+
+        Each season (or round, see iter_seasons) is uploaded and loaded before
+        the next one is fetched, so a backfill of every season needs no more
+        memory than its largest chunk. A whole season replaces its table.
+        Rounds are uploaded as separate files: the first rounds fetched for a
+        season replace the table and later rounds are appended to it. Round loads
+        are never skipped as unchanged, so the table is always rebuilt from
+        every round. The rest of a season whose chunk failed is skipped.
+
+        Args:
+            years: Seasons to process
+            use_sample_data: Whether to create sample data instead of fetching real data
+            by_round: Whether to process each round separately
+            fetch_workers: Number of R worker processes fetching whole seasons ahead
+            load_to_bigquery: Whether to load each chunk into the season's table
+
+        Yields:
+            dict: year, rounds ((first_round, last_round) or None), rows and success
+                of each chunk
+        """
+        failed_years = set()
+        streamed_year = None
+        for year, rounds, df in self.iter_seasons(years, use_sample_data, by_round, fetch_workers):
+            first_chunk = year != streamed_year
+            if first_chunk:
+                self._finish_streamed_season(streamed_year, by_round and load_to_bigquery,
+                                             failed_years)
+                streamed_year = year
+            result = {'year': year, 'rounds': rounds,
+                      'rows': len(df) if df is not None else None, 'success': False}
+            if df is not None and year not in failed_years:
+                try:
+                    result['success'] = self._publish_chunk(
+                        year, rounds, df, load_to_bigquery, first_chunk=first_chunk)
+                except Exception as e:
+                    logger.error(f"Error processing year {year}: {str(e)}")
+            df = None
+            if not result['success']:
+                failed_years.add(year)
+            yield result
+        self._finish_streamed_season(streamed_year, by_round and load_to_bigquery, failed_years)
+
+    def _finish_streamed_season(self, year, loaded_by_round, failed_years):
+        """Checkpoint a season streamed round by round once all its rounds are loaded."""
+        if year is None or year in failed_years:
+            return
+        if loaded_by_round:
+            self._checkpoint(year, 'loaded', table=settings.BIGQUERY_PLAYER_STATS_TABLE_TEMPLATE.format(
+                year=year))
+        logger.info(f"Successfully processed year {year}")
+
+    def _publish_chunk(self, year, rounds, df, load_to_bigquery=True, first_chunk=True):
+        """
+        Upload one chunk of stream_pipeline and load it into the season's table.
+
+        Args:
+            year: Season of the chunk
+            rounds: (first_round, last_round) of a round chunk, or None for a whole season
+            df: Preprocessed pandas DataFrame of the chunk
+            load_to_bigquery: Whether to load the chunk into the season's table
+            first_chunk: Whether this is the season's first chunk, which replaces
+                its table and derived stats instead of adding to them
+
+        Returns:
+            bool: Success status
+        """
+        if rounds is None:
+            gcs_path = settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(year=year)
+            write_disposition = None
+        else:
+            gcs_path = settings.GCS_PLAYER_STATS_ROUNDS_PATH_TEMPLATE.format(
+                year=year, first_round=rounds[0], last_round=rounds[1])
+            write_disposition = WRITE_TRUNCATE if first_chunk else WRITE_APPEND
+
+        if not self._upload_year(year, df, gcs_path):
+            return False
+        if load_to_bigquery:
+            if rounds is not None:
+                self._content_hashes.pop(gcs_path, None)
+            if not self._load_year(year, gcs_path, write_disposition, df=df,
+                                   checkpoint=rounds is None):
+                return False
+        if not self.publish_derived_stats(year, df, rounds=None if first_chunk else rounds):
+            return False
+        if rounds is not None:
+            self.round_tracker.record(year, rounds[1], self._round_matches(df, rounds[1]))
+        return True
+
+    def run_pipeline(self, years, use_sample_data=False, skip_gcs=False, create_combined=True,
+                     fetch_workers=None, incremental=False, concurrent=False, bulk_load=False,
+                     batch_load=False, resume=False, by_round=False):
         """
         Run the complete data pipeline for multiple years.
 
@@ -148,34 +1256,315 @@ class AFLDataPipeline:
             use_sample_data: Whether to use sample data
             skip_gcs: Whether to skip the GCS upload step
             create_combined: Whether to create a combined table
+            fetch_workers: Number of R worker processes used to fetch years in
+                parallel (default: settings.FETCH_WORKERS, 1 = fetch in-process)
+            incremental: Whether to ingest only rounds added since the last run
+            concurrent: Whether to overlap the fetch, upload and load stages of
+                different years (see run_years_concurrently)
+            bulk_load: Whether to skip the per-year tables and load every year's
+                file straight into the combined table with one load job (ignored
+                with create_combined=False)
+            batch_load: Whether to load the per-year tables after every year is
+                uploaded, submitting all load jobs at once (see load_years_batch)
+            resume: Whether to continue the last run if it was interrupted, skipping
+                the years (and stages) its run manifest records as done
+            by_round: Whether to stream each season one round at a time through
+                fetching, upload and load (see stream_pipeline), so memory is
+                bounded by the largest round; only for sequential full-season runs
 
         Returns:
             list: List of successfully processed years
         """
-        # Initialise the R environment
-        logger.info("Initialising R environment")
+        if resume and incremental:
+            logger.warning(
+                "Incremental runs resume from the ingested rounds; ignoring resume")
+            resume = False
+        self._start_run(years, resume)
+        requested_years = years
+        with self.metrics.span(RUN_SPAN):
+            fetch_workers = fetch_workers or settings.FETCH_WORKERS
+            parallel_fetch = (fetch_workers > 1 and not use_sample_data and not skip_gcs
+                              and not incremental)
+            if bulk_load and incremental:
+                logger.warning(
+                    "Bulk loading is not used for incremental runs, which append to per-year tables")
+                bulk_load = False
+            bulk_load = self._bulk_load_option(bulk_load, create_combined)
+            if batch_load and (incremental or bulk_load):
+                logger.warning(
+                    "Batch loading only loads full seasons into per-year tables, which incremental "
+                    "runs append to and bulk loads skip; ignoring batch_load")
+                batch_load = False
+            if by_round and (incremental or concurrent or bulk_load or batch_load or skip_gcs):
+                logger.warning(
+                    "Streaming by round is only used for sequential full-season runs; ignoring by_round")
+                by_round = False
+            load_each_year = not bulk_load and not batch_load
+            years = self._resume_years(years, bulk_load)
 
-        func_initialise()
+            logger.info(f"Running pipeline for years: {years}")
 
-        logger.info(f"Running pipeline for years: {years}")
+            # Process each year. R is initialised lazily, only if a year is not
+            # in the fetch cache
+            if concurrent and not incremental:
+                prefetched = {}
+                if parallel_fetch:
+                    with self.metrics.span('parallel_fetch', workers=fetch_workers) as span:
+                        prefetched = self.fetch_years_parallel(years, fetch_workers)
+                        span.rows = sum(len(df) for df in prefetched.values() if df is not None)
+                    for year in years:
+                        if prefetched.get(year) is None:
+                            logger.error(f"No data fetched for year {year}")
+                    years = [year for year in years if prefetched.get(year) is not None]
+                successful_years = self.run_years_concurrently(
+                    years, use_sample_data, skip_gcs, prefetched,
+                    load_to_bigquery=load_each_year)
+            elif by_round:
+                chunks = list(self.stream_pipeline(years, use_sample_data, by_round=True,
+                                                   load_to_bigquery=load_each_year))
+                successful_years = [
+                    year for year in years
+                    if any(chunk['year'] == year for chunk in chunks)
+                    and all(chunk['success'] for chunk in chunks if chunk['year'] == year)]
+            else:
+                # Fetched years are streamed, at most fetch_workers years ahead
+                fetched = (self.iter_fetched_years(years, fetch_workers) if parallel_fetch
+                           else ((year, None) for year in years))
+                successful_years = []
+                for year, df in fetched:
+                    if parallel_fetch and df is None:
+                        logger.error(f"No data fetched for year {year}")
+                        continue
+                    if incremental:
+                        success = self.process_year_incremental(
+                            year, use_sample_data)
+                    else:
+                        success = self.process_year(
+                            year, use_sample_data, skip_gcs, dataframe=df,
+                            load_to_bigquery=load_each_year)
+                    df = None
+                    if success:
+                        successful_years.append(year)
 
-        # Process each year
-        successful_years = []
+            # Load the per-year tables with one batch of jobs
+            if batch_load and successful_years:
+                with self.metrics.span('batch_load', years=len(successful_years)):
+                    successful_years = self.load_years_batch(successful_years)
+
+            successful_years = self._with_resumed_years(requested_years, successful_years)
+            successful_years = self.combine_years(successful_years, create_combined, bulk_load)
+
+        self._finish_run(successful_years)
+        return successful_years
+
+    def _start_run(self, years, resume=False):
+        """
+        Reset the metrics and per-run state at the start of a run.
+
+        Args:
+            years: Years of the run
+            resume: Whether to continue the last run if it was interrupted
+        """
+        self._check_load_format()
+        self.metrics = RunMetrics()
+        self.metrics.set_info('years', list(years))
+        self._resuming = self.run_manifest.start(years, self.metrics.run_id, resume)
+        self._resumed_years = []
+        self._content_hashes = {}
+        self._skipped_steps = {}
+        self._uploaded_frames = {}
+        self._upload_sizes = {}
+
+    def _resume_years(self, years, bulk_load=False):
+        """
+        Drop the years a resumed run already finished.
+
+        A year is finished once loaded into its table (for bulk loads, once
+        uploaded). Finished years are marked as skipped and kept in
+        _resumed_years; sharded uploads are loaded through their wildcard again.
+
+        Args:
+            years: Years of the run
+            bulk_load: Whether the run bulk loads the combined table
+
+        Returns:
+            list: The years still to process
+        """
+        if not self._resuming:
+            return years
+        stage = 'uploaded' if bulk_load else 'loaded'
+        remaining = []
         for year in years:
-            success = self.process_year(year, use_sample_data, skip_gcs)
-            if success:
-                successful_years.append(year)
+            gcs_path = settings.GCS_PLAYER_STATS_PATH_TEMPLATE.format(year=year)
+            uploaded = self.run_manifest.done(year, 'uploaded')
+            if uploaded and uploaded.get('sharded'):
+                self.storage.sharded_uri(gcs_path)
+            entry = self.run_manifest.done(year, stage)
+            if entry and entry.get('gcs_path') == gcs_path:
+                self._resumed_years.append(year)
+                self._mark_skipped(year, 'upload')
+                if stage == 'loaded':
+                    self._mark_skipped(year, 'load')
+            else:
+                remaining.append(year)
+        logger.info(
+            f"Resuming run: {len(self._resumed_years)} years already done, {len(remaining)} to process")
+        return remaining
+
+    @staticmethod
+    def _bulk_load_option(bulk_load, create_combined):
+        """Turn off bulk loading when the combined table it loads is not wanted."""
+        if bulk_load and not create_combined:
+            logger.warning(
+                "Bulk loading only loads the combined table, which create_combined=False "
+                "turns off; loading the per-year tables instead")
+            return False
+        return bulk_load
+
+    def _with_resumed_years(self, years, successful_years):
+        """Add the years done before a run was resumed to its successful years, in run order."""
+        done = set(successful_years) | set(self._resumed_years)
+        return [year for year in years if year in done]
 
-        # Create combined table if requested
-        if create_combined and successful_years:
+    def combine_years(self, successful_years, create_combined=True, bulk_load=False):
+        """
+        Build the combined table from the years processed in a run.
+
+        Args:
+            successful_years: Years that were processed successfully
+            create_combined: Whether to build the combined table at all
+            bulk_load: Whether to load every year's file straight into the combined
+                table with one load job instead of combining the per-year tables
+
+        Returns:
+            list: The successful years (empty if the bulk load failed)
+        """
+        # A resumed run may have been interrupted after building the combined table
+        if self._resuming and successful_years and all(
+                self.run_manifest.done(year, 'combined') for year in successful_years):
+            logger.info("Combined table already includes every year, skipping")
+            return successful_years
+
+        if not create_combined or not successful_years:
+            return successful_years
+
+        # Load all years into the combined table with a single job
+        if bulk_load:
+            logger.info("Bulk loading combined table")
+            with self.metrics.span('bulk_load', years=len(successful_years)) as span:
+                bulk_success = self.bulk_load_years(successful_years)
+                span.status = 'ok' if bulk_success else 'error'
+            if not bulk_success:
+                logger.error("Bulk load of the combined table failed")
+                return []
+            self._checkpoint_combined(successful_years)
+
+        # Create combined table from the per-year tables
+        else:
             logger.info("Creating combined table")
-            self.bigquery.create_combined_table(
-                successful_years,
-                source_dataset_id=settings.PLAYER_STATS_DATASET_ID,
-                destination_dataset_id=settings.COMBINED_STATS_DATASET_ID,
-                destination_table=settings.COMBINED_STATS_TABLE_ID
-            )
+            with self.metrics.span('combined_table', years=len(successful_years)) as span:
+                changed_years = self._combined_changed_years(successful_years)
+                combined_success = self.bigquery.create_combined_table(
+                    successful_years,
+                    source_dataset_id=settings.PLAYER_STATS_DATASET_ID,
+                    destination_dataset_id=settings.COMBINED_STATS_DATASET_ID,
+                    destination_table=settings.COMBINED_STATS_TABLE_ID,
+                    partitioned=settings.COMBINED_TABLE_PARTITIONED,
+                    replace_years=changed_years
+                )
+                span.status = 'ok' if combined_success else 'error'
+            if combined_success:
+                for year in changed_years:
+                    source = self._year_table_ref(year)
+                    contents = self.content_manifest.get(source)
+                    if contents is not None:
+                        self.content_manifest.record(
+                            source, contents, settings.COMBINED_STATS_TABLE_ID)
+                self._checkpoint_combined(successful_years)
+        return successful_years
+
+    @staticmethod
+    def _year_table_ref(year):
+        """Get the dataset.table reference of a year's table, its content manifest key."""
+        table_id = settings.BIGQUERY_PLAYER_STATS_TABLE_TEMPLATE.format(year=year)
+        return f"{settings.PLAYER_STATS_DATASET_ID}.{table_id}"
+
+    def _combined_changed_years(self, years):
+        """
+        Get the years whose table changed since it was copied into the combined table.
+
+        The content manifest keeps the contents of each year's table and the
+        contents last copied from it into the combined table (see
+        _record_load). A year with unknown contents counts as changed.
+
+        Args:
+            years: Years in the combined table
+
+        Returns:
+            list: The years whose partitions must be replaced, in the order given
+        """
+        changed_years = []
+        for year in years:
+            source = self._year_table_ref(year)
+            contents = self.content_manifest.get(source)
+            if contents is None or self.content_manifest.get(
+                    source, table=settings.COMBINED_STATS_TABLE_ID) != contents:
+                changed_years.append(year)
+        return changed_years
+
+    def _checkpoint_combined(self, years):
+        """Record the years included in the combined table."""
+        table = f"{settings.COMBINED_STATS_DATASET_ID}.{settings.COMBINED_STATS_TABLE_ID}"
+        for year in years:
+            self._checkpoint(year, 'combined', table=table)
+
+    def _finish_run(self, successful_years):
+        """Record the outcome of a run and export its metrics."""
+        self.metrics.set_info('successful_years', successful_years)
+        self.metrics.set_info('skipped_years', self.skipped_years('load'))
+        self.metrics.set_info('skipped_uploads', self.skipped_years('upload'))
+        self.metrics.set_info('upload_sizes', dict(self._upload_sizes))
+        self.metrics.set_info('resumed_years', list(self._resumed_years))
+        self.run_manifest.finish(successful_years)
+        self.report_metrics()
 
         logger.info(
             f"Pipeline completed. Successfully processed years: {successful_years}")
-        return successful_years
+
+    def report_metrics(self):
+        """
+        Log the summary of the current run and export its metrics.
+
+        The JSON run report and the Prometheus textfile are written to
+        settings.RUN_REPORT_PATH and settings.PROMETHEUS_TEXTFILE_PATH when set.
+        A failure to write them is logged and does not fail the run.
+        """
+        self.metrics.set_info('metadata_cache', {
+            'buckets': self.storage.bucket_cache.stats(),
+            'datasets': self.bigquery.dataset_cache.stats(),
+        })
+        limits = {
+            'gcs': self.storage.limiter.stats(),
+            'bigquery': self.bigquery.limiter.stats(),
+        }
+        self.metrics.set_info('concurrency_limits', limits)
+        logger.info(f"Run summary:\n{self.metrics.summary_table()}")
+        for service, stats in limits.items():
+            if stats['retries'] or stats['failures']:
+                logger.info(
+                    f"{service}: {stats['retries']} retries ({stats['throttled']} throttled), "
+                    f"{stats['failures']} failures, concurrency limit {stats['limit']} "
+                    f"(lowest {stats['lowest_limit']} of {stats['max_limit']})")
+        raw_bytes = sum(size['raw_bytes'] for size in self._upload_sizes.values())
+        nbytes = sum(size['bytes'] for size in self._upload_sizes.values())
+        if nbytes and raw_bytes != nbytes:
+            logger.info(
+                f"Uploaded {nbytes / 1e6:.2f} MB for {raw_bytes / 1e6:.2f} MB of data "
+                f"({raw_bytes / nbytes:.1f}x smaller)")
+        try:
+            if settings.RUN_REPORT_PATH:
+                self.metrics.write_json(settings.RUN_REPORT_PATH)
+            if settings.PROMETHEUS_TEXTFILE_PATH:
+                self.metrics.write_prometheus(settings.PROMETHEUS_TEXTFILE_PATH)
+        except Exception as e:
+            logger.error(f"Error writing run metrics: {str(e)}")
@@ -25,3 +25,139 @@ BIGQUERY_PLAYER_STATS_TABLE_TEMPLATE = 'player_stats_{year}_bq'
 PLAYER_STATS_DATASET_ID = 'afl_player_data'
 COMBINED_STATS_DATASET_ID = 'afl_data'
 COMBINED_STATS_TABLE_ID = 'combined_player_stats_bq'
+
+# Parallel fetching with embedded-R worker processes (1 = fetch in-process)
+FETCH_WORKERS = 1
+FETCH_WORKER_MAX_RETRIES = 2
+
+# On-disk Parquet cache for fitzRoy fetch results
+FETCH_CACHE_ENABLED = True
+FETCH_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    '.fetch_cache'
+)
+FETCH_CACHE_TTL_SECONDS = 6 * 60 * 60  # Current-season entries only
+FETCH_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Incremental round-level ingestion of the in-progress season
+GCS_PLAYER_STATS_ROUNDS_PATH_TEMPLATE = 'player_stats/rounds/player_stats_{year}_rounds_{first_round}_{last_round}'
+ROUND_STATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    '.pipeline_state',
+    'rounds.json'
+)
+MAX_ROUNDS_PER_SEASON = 30
+
+# File format for GCS uploads and BigQuery loads ('parquet' or 'csv')
+UPLOAD_FORMAT = 'parquet'
+PARQUET_COMPRESSION = 'snappy'  # snappy, gzip, zstd or none
+# CSV uploads are compressed as a stream: gzip, zstd or none. BigQuery can load
+# gzip CSV; zstd (needs the zstandard package) is for other readers only, so
+# it cannot be combined with BigQuery loads.
+CSV_COMPRESSION = 'none'
+GZIP_COMPRESSION_LEVEL = 6
+ZSTD_COMPRESSION_LEVEL = 3
+
+# Streaming uploads: rows serialised per chunk, and the resumable upload chunk
+# size (must be a multiple of 256 KiB)
+UPLOAD_CHUNK_ROWS = 50000
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Sharded uploads: frames with more rows than UPLOAD_SHARD_ROWS are uploaded as
+# row-range shards ("<path>/part-00000", ...) by UPLOAD_SHARD_WORKERS threads
+# and loaded through a wildcard URI
+SHARDED_UPLOADS = False
+UPLOAD_SHARD_ROWS = 500000
+UPLOAD_SHARD_WORKERS = 8
+
+# Concurrent multi-year runs: workers per stage and years held in memory at once
+FETCH_CONCURRENCY = 1  # The in-process R interpreter is single-threaded
+UPLOAD_CONCURRENCY = 4
+LOAD_CONCURRENCY = 4
+MAX_YEARS_IN_FLIGHT = 4
+
+# Enrich player stats with each match's scores, margin, result and venue. The
+# player stats, fixture and results of a season are fetched in one R call, from
+# these fitzRoy sources (fitzRoy has no afltables fixture)
+ENRICH_PLAYER_STATS = False
+BUNDLE_SOURCES = {
+    'player_stats': 'afltables',
+    'fixture': 'footywire',
+    'results': 'afltables',
+}
+
+# Wildcard matching every per-year player stats file, for bulk loads
+GCS_PLAYER_STATS_WILDCARD = 'player_stats/player_stats_*'
+
+# Combined table layout: integer-range partitioned on year (one partition per
+# season, end exclusive) and clustered, so updated seasons replace only their
+# own partitions and season-filtered queries scan less
+COMBINED_TABLE_PARTITIONED = True
+COMBINED_PARTITION_RANGE = (1897, 2101)
+COMBINED_CLUSTER_FIELDS = ['ID', 'Playing_for']
+
+# Run metrics: where to write the JSON run report and the Prometheus textfile
+# (e.g. into the node_exporter textfile collector directory) after each run.
+# None skips the file; the summary table is always logged.
+RUN_REPORT_PATH = None
+PROMETHEUS_TEXTFILE_PATH = None
+
+# How long BigQueryManager trusts that a dataset it has seen still exists
+DATASET_CACHE_TTL_SECONDS = 60 * 60
+
+# Skip the upload and load of years whose preprocessed data is unchanged,
+# comparing a content hash with the uploaded blob's metadata and a local manifest
+SKIP_UNCHANGED = True
+CONTENT_MANIFEST_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    '.pipeline_state',
+    'content_manifest.json'
+)
+
+# Run manifest checkpointing the stages each year of a run has completed, so
+# run_pipeline(resume=True) can continue an interrupted run. Kept locally, or in
+# the bucket at RUN_MANIFEST_GCS_PATH when that is set.
+RUN_MANIFEST_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    '.pipeline_state',
+    'run_manifest.json'
+)
+RUN_MANIFEST_GCS_PATH = None  # e.g. 'pipeline_state/run_manifest.json'
+
+# Asyncio pipeline (AsyncAFLDataPipeline): BigQuery jobs in flight at once,
+# request rates per service and how often running jobs are polled
+ASYNC_JOB_CONCURRENCY = 20
+GCS_REQUESTS_PER_SECOND = 10
+BIGQUERY_REQUESTS_PER_SECOND = 5
+JOB_POLL_INTERVAL_SECONDS = 0.5
+JOB_POLL_MAX_INTERVAL_SECONDS = 5
+JOB_TIMEOUT_SECONDS = 30 * 60
+
+# Adaptive limits shared by every GCS and BigQuery call (see limiter.py): calls
+# in flight per service shrink when the service throttles and grow back after
+# successes; throttled and transient errors are retried with jittered backoff
+GCS_MAX_CONCURRENCY = 32
+BIGQUERY_MAX_CONCURRENCY = 16
+CLOUD_MIN_CONCURRENCY = 1
+CLOUD_CONCURRENCY_DECREASE = 0.5
+CLOUD_RETRY_ATTEMPTS = 6
+CLOUD_BACKOFF_BASE_SECONDS = 0.5
+CLOUD_BACKOFF_MAX_SECONDS = 32
+
+# Derived tables built from each season's player stats: per-player season
+# totals and averages, and each game's rolling form over the player's last
+# FORM_WINDOW games of the season. Incremental runs update them from the state
+# kept in DERIVED_STATE_DIR instead of recomputing the season.
+DERIVED_STATS_ENABLED = False
+FORM_WINDOW = 5
+DERIVED_STATE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    '.pipeline_state',
+    'derived'
+)
+DERIVED_STATS_DATASET_ID = 'afl_derived'
+GCS_SEASON_STATS_PATH_TEMPLATE = 'derived/player_season_stats_{year}'
+GCS_FORM_PATH_TEMPLATE = 'derived/player_form/player_form_{year}'
+GCS_FORM_ROUNDS_PATH_TEMPLATE = 'derived/player_form/rounds/player_form_{year}_rounds_{first_round}_{last_round}'
+BIGQUERY_SEASON_STATS_TABLE_TEMPLATE = 'player_season_stats_{year}_bq'
+BIGQUERY_FORM_TABLE_TEMPLATE = 'player_form_{year}_bq'
@@ -0,0 +1,405 @@
+"""
+State module for AFL Data Pipeline.
+Keeps small pieces of pipeline state in local JSON files between runs.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from . import settings
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('afl_pipeline.state')
+
+
+def load_json_state(path):
+    """
+    Load a JSON state file.
+
+    Args:
+        path: Path to the state file
+
+    Returns:
+        dict: The stored state, or an empty dict if the file does not exist
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        logger.warning(f"Ignoring corrupt state file: {path}")
+        return {}
+
+
+def save_json_state(path, state):
+    """
+    Atomically write a JSON state file.
+
+    Args:
+        path: Path to the state file
+        state: JSON-serialisable dict to store
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class RoundTracker:
+    """
+    Records the last ingested round of each season and the games of that round.
+
+    A round is ingested game by game as its games are played, so a run in
+    the middle of a round records which of its games it loaded, and the next
+    run fetches the round again for the rest.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize the Round Tracker.
+
+        Args:
+            path: Path to the JSON state file (default: settings.ROUND_STATE_PATH)
+        """
+        self.path = path or settings.ROUND_STATE_PATH
+        self._lock = threading.Lock()
+
+    def _entry(self, season):
+        """Get a season's entry; older state files hold only the round number."""
+        entry = load_json_state(self.path).get(str(season))
+        if entry is None or isinstance(entry, dict):
+            return entry
+        return {'round': entry, 'matches': []}
+
+    def last_round(self, season):
+        """
+        Get the last ingested round of a season.
+
+        Args:
+            season: Season to look up
+
+        Returns:
+            int or None: The last ingested round, or None if nothing is recorded
+        """
+        with self._lock:
+            entry = self._entry(season)
+        return entry['round'] if entry else None
+
+    def ingested_matches(self, season):
+        """
+        Get the games of a season's last ingested round that were ingested.
+
+        Args:
+            season: Season to look up
+
+        Returns:
+            set: Match keys (see data_processor.match_keys); empty if none are recorded
+        """
+        with self._lock:
+            entry = self._entry(season)
+        return set(entry['matches']) if entry else set()
+
+    def record(self, season, round_number, matches=None):
+        """
+        Record the last ingested round of a season.
+
+        Args:
+            season: Season that was ingested
+            round_number: Last round ingested for that season
+            matches: Match keys of the games of that round ingested so far
+        """
+        with self._lock:
+            state = load_json_state(self.path)
+            state[str(season)] = {'round': int(round_number), 'matches': sorted(matches or ())}
+            save_json_state(self.path, state)
+        logger.info(f"Recorded round {round_number} as ingested for season {season}")
+
+    def reset(self, season):
+        """
+        Forget the ingested rounds of a season.
+
+        Args:
+            season: Season to reset
+        """
+        with self._lock:
+            state = load_json_state(self.path)
+            if state.pop(str(season), None) is not None:
+                save_json_state(self.path, state)
+
+
+class ContentManifest:
+    """
+    Records the content hash of each file whose data has been loaded into BigQuery.
+
+    A file whose preprocessed data hashes the same as its manifest entry needs
+    neither uploading nor loading again. Each entry also keeps the hash last
+    loaded into every table the file went to, so loads of one file into the
+    per-year and the combined table do not overwrite each other. Per-year
+    tables get entries of their own (see record_contents), from which the
+    combined table is built.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize the Content Manifest.
+
+        Args:
+            path: Path to the JSON state file (default: settings.CONTENT_MANIFEST_PATH)
+        """
+        self.path = path or settings.CONTENT_MANIFEST_PATH
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tables(entry):
+        """Get the table -> hash map of an entry, including entries with a single table."""
+        if 'tables' in entry:
+            return dict(entry['tables'])
+        return {entry['table']: entry['content_hash']} if entry.get('table') else {}
+
+    def get(self, file_path, table=None):
+        """
+        Get the content hash recorded for a file.
+
+        Args:
+            file_path: Path of the file within the bucket
+            table: If given, the hash last loaded into this table
+
+        Returns:
+            str or None: The recorded content hash, or None if nothing is recorded
+        """
+        with self._lock:
+            entry = load_json_state(self.path).get(file_path)
+        if not entry:
+            return None
+        if table is None:
+            return entry.get('content_hash')
+        return self._tables(entry).get(table)
+
+    def record(self, file_path, content_hash, table=None):
+        """
+        Record that a file's data has been loaded.
+
+        Args:
+            file_path: Path of the file within the bucket
+            content_hash: Content hash of the loaded data
+            table: Table the data was loaded into
+        """
+        with self._lock:
+            state = load_json_state(self.path)
+            tables = self._tables(state.get(file_path) or {})
+            if table is not None:
+                tables[table] = content_hash
+            state[file_path] = {'content_hash': content_hash, 'tables': tables}
+            save_json_state(self.path, state)
+
+    def record_contents(self, table, content_hash, append=False):
+        """
+        Record the data a table holds after a load into it.
+
+        Appending chains the new data's hash onto the table's, so the table's
+        hash changes with every load. A table whose contents are not known (no
+        hash, or an append to a table with no hash) is recorded without one.
+
+        Args:
+            table: Reference of the table (dataset.table)
+            content_hash: Content hash of the loaded data, or None
+            append: Whether the data was appended to the table
+        """
+        if append and content_hash is not None:
+            previous = self.get(table)
+            content_hash = (hashlib.sha256(f'{previous}+{content_hash}'.encode()).hexdigest()
+                            if previous is not None else None)
+        self.record(table, content_hash)
+
+    def forget(self, file_path):
+        """
+        Forget a file, so its data is uploaded and loaded again next time.
+
+        Args:
+            file_path: Path of the file within the bucket
+        """
+        with self._lock:
+            state = load_json_state(self.path)
+            if state.pop(file_path, None) is not None:
+                save_json_state(self.path, state)
+
+
+# Stages of a year recorded in the run manifest, in pipeline order
+RUN_STAGES = ('fetched', 'preprocessed', 'uploaded', 'loaded', 'combined')
+
+# Stages a resumed run picks up from; the others are written with the next of these
+SAVED_STAGES = ('uploaded', 'loaded', 'combined')
+
+
+class RunManifest:
+    """
+    Checkpoints the stages each year of a pipeline run has completed.
+
+    Every stage a year finishes is recorded with a timestamp, the content hash
+    of its data and details such as the file or table written, so an
+    interrupted run can be resumed: starting with resume=True continues the
+    last run if it did not finish, and its recorded stages count as done.
+    A run counts as finished once every one of its years has succeeded.
+
+    The manifest is a JSON file kept locally or, when a storage manager and a
+    GCS path are given, in the bucket so any machine can resume the run.
+    Stages are only recorded and reported while a run is active. The file is
+    only rewritten for the stages in SAVED_STAGES, and outside the lock, so
+    threads recording stages do not wait on each other's uploads; a rewrite
+    that has been overtaken by a newer one is skipped.
+    """
+
+    def __init__(self, path=None, storage=None, gcs_path=None):
+        """
+        Initialize the Run Manifest.
+
+        Args:
+            path: Path to the local JSON file (default: settings.RUN_MANIFEST_PATH)
+            storage: Optional StorageManager, to keep the manifest in its bucket
+            gcs_path: Path of the manifest within the bucket (default:
+                settings.RUN_MANIFEST_GCS_PATH); used only with a storage manager
+        """
+        self.path = path or settings.RUN_MANIFEST_PATH
+        self.storage = storage
+        self.gcs_path = gcs_path or settings.RUN_MANIFEST_GCS_PATH
+        self.state = {}
+        self.active = False
+        self.resumed = False
+        self._lock = threading.Lock()
+        # Held while writing the file; versions order the rewrites
+        self._save_lock = threading.Lock()
+        self._version = 0
+        self._saved_version = 0
+
+    def _load(self):
+        if self.storage is not None and self.gcs_path:
+            data = self.storage.download_bytes(self.gcs_path)
+            return json.loads(data) if data else {}
+        return load_json_state(self.path)
+
+    def _changed(self):
+        """Count a change to the state; the caller holds the lock."""
+        self._version += 1
+        return self._version
+
+    def _save(self, version):
+        """Write the latest state, unless a write since change version already has."""
+        with self._save_lock:
+            if version <= self._saved_version:
+                return
+            with self._lock:
+                version = self._version
+                state = copy.deepcopy(self.state)
+            if self.storage is not None and self.gcs_path:
+                self.storage.upload_bytes(
+                    json.dumps(state, indent=2, sort_keys=True).encode('utf-8'),
+                    self.gcs_path, content_type='application/json')
+            else:
+                save_json_state(self.path, state)
+            self._saved_version = version
+
+    def start(self, years, run_id, resume=False):
+        """
+        Start a run, or continue the last one.
+
+        Args:
+            years: Years of the run
+            run_id: ID for a new run
+            resume: Whether to continue the last run if it did not finish
+
+        Returns:
+            bool: True if an unfinished run was resumed
+        """
+        with self._lock:
+            previous = self._load() if resume else {}
+            self.resumed = bool(previous.get('run_id')) and not previous.get('finished_at')
+            if self.resumed:
+                self.state = previous
+                self.state['years'] = sorted(set(previous.get('years', [])) | set(years))
+                logger.info(f"Resuming run {self.state['run_id']}")
+            else:
+                if resume:
+                    logger.info("No unfinished run to resume, starting a new run")
+                self.state = {'run_id': run_id, 'started_at': time.time(), 'finished_at': None,
+                              'years': sorted(years), 'stages': {}}
+            self.active = True
+            version = self._changed()
+        self._save(version)
+        return self.resumed
+
+    def done(self, year, stage):
+        """
+        Get the record of a stage a year completed in the active run.
+
+        Args:
+            year: Year to look up
+            stage: One of RUN_STAGES
+
+        Returns:
+            dict or None: The stage's record, or None if it has not completed
+        """
+        with self._lock:
+            if not self.active:
+                return None
+            return self.state['stages'].get(str(year), {}).get(stage)
+
+    def record(self, year, stage, content_hash=None, **details):
+        """
+        Record that a year completed a stage of the active run.
+
+        Stages not in SAVED_STAGES are kept in memory until the next save.
+
+        Args:
+            year: Year that completed the stage
+            stage: One of RUN_STAGES
+            content_hash: Content hash of the stage's data
+            **details: JSON-serialisable details, e.g. rows=..., table=...
+        """
+        if stage not in RUN_STAGES:
+            raise ValueError(f"Unknown run stage: {stage}")
+        with self._lock:
+            if not self.active:
+                return
+            stages = self.state['stages'].setdefault(str(year), {})
+            stages[stage] = dict(details, content_hash=content_hash, at=time.time())
+            version = self._changed()
+        if stage in SAVED_STAGES:
+            self._save(version)
+
+    def finish(self, successful_years):
+        """
+        End the active run, marking it finished if every year succeeded.
+
+        Args:
+            successful_years: Years that succeeded in this part of the run
+
+        Returns:
+            bool: True if the run finished
+        """
+        with self._lock:
+            if not self.active:
+                return False
+            self.active = False
+            done = {int(year) for year, stages in self.state['stages'].items()
+                    if 'loaded' in stages or 'combined' in stages} | set(successful_years)
+            finished = set(self.state['years']) <= done
+            if finished:
+                self.state['finished_at'] = time.time()
+            version = self._changed()
+        self._save(version)
+        if not finished:
+            logger.info(f"Run {self.state['run_id']} is unfinished; resume=True will continue it")
+        return finished
@@ -3,8 +3,20 @@ Storage module for AFL Data Pipeline.
 Handles all Google Cloud Storage (GCS) operations.
 """
 
+import contextlib
+import gzip
+import io
 import os
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud.exceptions import NotFound
+
+from . import settings
+from .limiter import AdaptiveLimiter
+from .metadata_cache import MetadataCache
+from .data_processor import storage_order, bigquery_column_name
 
 # Configure logging
 logging.basicConfig(
@@ -13,65 +25,594 @@ logging.basicConfig(
 )
 logger = logging.getLogger('afl_pipeline.storage')
 
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'parquet': PARQUET_CONTENT_TYPE,
+}
+
+# CSV compression codec -> Content-Encoding stored with the blob. BigQuery CSV
+# loads read gzip; zstd is only for downstream readers that support it.
+CSV_CONTENT_ENCODINGS = {
+    'gzip': 'gzip',
+    'zstd': 'zstd',
+}
+
+# Connections per host kept by the requests adapter the storage client uses
+DEFAULT_CONNECTION_POOL_SIZE = 10
+
+
+def shard_path(file_path, index):
+    """Get the path of one shard of a sharded upload, e.g. "<file_path>/part-00003"."""
+    return f"{file_path}/part-{index:05d}"
+
+
+def shard_count(rows, shard_rows=None):
+    """Get the number of shards a sharded upload of `rows` rows is split into."""
+    shard_rows = shard_rows or settings.UPLOAD_SHARD_ROWS
+    return max(-(-rows // shard_rows), 1)
+
+
+def shard_wildcard(file_path):
+    """Get the path matching every shard of a sharded upload."""
+    return f"{file_path}/part-*"
+
+
+@contextlib.contextmanager
+def _compressing_writer(fileobj, compression):
+    """
+    Compress everything written to the yielded file object into fileobj.
+
+    The compressor is flushed when the block exits; fileobj is left open.
+
+    Args:
+        fileobj: Binary file-like object to write the compressed stream to
+        compression: None or 'none' (no compression), 'gzip' or 'zstd'
+    """
+    if compression in (None, 'none'):
+        yield fileobj
+    elif compression == 'gzip':
+        # mtime=0 keeps the output identical for identical input
+        with gzip.GzipFile(fileobj=fileobj, mode='wb', mtime=0,
+                           compresslevel=settings.GZIP_COMPRESSION_LEVEL) as writer:
+            yield writer
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "zstd compression needs the zstandard package (pip install zstandard)")
+        compressor = zstandard.ZstdCompressor(level=settings.ZSTD_COMPRESSION_LEVEL)
+        with compressor.stream_writer(fileobj, closefd=False) as writer:
+            yield writer
+    else:
+        raise ValueError(f"Unsupported CSV compression: {compression}")
+
+
+def _parquet_schema(dataframe, column_names):
+    """
+    Build one Arrow schema for every chunk of a DataFrame.
+
+    Types are taken from an empty slice; object columns are inferred from a
+    sample of their non-null values so a chunk of all-null values cannot
+    change the schema.
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(
+        dataframe.iloc[:0].set_axis(column_names, axis=1), preserve_index=False)
+    for position, (name, series) in enumerate(dataframe.items()):
+        if schema.field(position).type == pa.null():
+            field_type = pa.string()
+            # Scan in slices so no full-column copy is made
+            for start in range(0, len(series), 10000):
+                sample = series.iloc[start:start + 10000].dropna()
+                if len(sample):
+                    field_type = pa.array(sample.head(1000)).type
+                    break
+            schema = schema.set(
+                position, pa.field(column_names[position], field_type))
+    return schema
+
+
+def write_dataframe(dataframe, fileobj, file_format='csv', compression=None, chunk_rows=None,
+                    sort_within_chunks=False):
+    """
+    Serialise a DataFrame into a writable binary file object, chunk by chunk.
+
+    Only one chunk of rows is serialised at a time, so the extra memory used is
+    bounded by the chunk size rather than the size of the frame.
+
+    CSV output keeps the frame's row order and column names. Parquet output is
+    sorted by (Season, Round, ID) so runs of similar values compress well, and
+    column names are made BigQuery-safe to match CSV autodetection. Sorting the
+    whole frame needs a row permutation as large as the frame's row count, so
+    for strictly bounded memory each chunk can be sorted on its own instead;
+    fetched data already arrives in season and round order.
+
+    CSV output can be compressed as a whole stream with gzip or zstd; each
+    chunk is compressed as it is written.
+
+    Args:
+        dataframe: pandas DataFrame to serialise
+        fileobj: Binary file-like object to write to
+        file_format: 'csv' or 'parquet'
+        compression: Parquet compression codec (snappy, gzip, zstd or none), or
+            CSV stream compression (gzip, zstd or none)
+        chunk_rows: Rows serialised per chunk (default: the whole frame at once)
+        sort_within_chunks: Sort Parquet rows within each chunk rather than globally
+
+    Returns:
+        int: Size of the CSV text before compression (None for Parquet)
+    """
+    chunk_rows = max(chunk_rows or len(dataframe), 1)
+
+    if file_format == 'csv':
+        raw_bytes = 0
+        with _compressing_writer(fileobj, compression) as writer:
+            for start in range(0, max(len(dataframe), 1), chunk_rows):
+                chunk = dataframe.iloc[start:start + chunk_rows]
+                data = chunk.to_csv(index=False, header=start == 0).encode('utf-8')
+                writer.write(data)
+                raw_bytes += len(data)
+        return raw_bytes
+
+    if file_format != 'parquet':
+        raise ValueError(f"Unsupported upload format: {file_format}")
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    column_names = [bigquery_column_name(col) for col in dataframe.columns]
+    schema = _parquet_schema(dataframe, column_names)
+    order = None if sort_within_chunks else storage_order(dataframe)
+    writer = pq.ParquetWriter(
+        fileobj, schema,
+        compression='none' if compression in (None, 'none') else compression)
+    try:
+        for start in range(0, max(len(dataframe), 1), chunk_rows):
+            if order is None:
+                chunk = dataframe.iloc[start:start + chunk_rows]
+                chunk = chunk.take(storage_order(chunk))
+            else:
+                chunk = dataframe.take(order[start:start + chunk_rows])
+            chunk.columns = column_names
+            writer.write_table(pa.Table.from_pandas(
+                chunk, schema=schema, preserve_index=False))
+    finally:
+        writer.close()
+    return None
+
+
+def dataframe_to_parquet(dataframe, compression='snappy'):
+    """
+    Serialise a DataFrame to Parquet bytes ready for a BigQuery load.
+
+    Args:
+        dataframe: pandas DataFrame to serialise
+        compression: Parquet compression codec (snappy, gzip, zstd or none)
+
+    Returns:
+        bytes: The Parquet file contents
+    """
+    buffer = io.BytesIO()
+    write_dataframe(dataframe, buffer, 'parquet', compression)
+    return buffer.getvalue()
+
+
+class _CountingWriter:
+    """Wraps a writable file object, counting the bytes and time spent writing to it."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+
+    def write(self, data):
+        start = time.perf_counter()
+        written = self.fileobj.write(data)
+        self.write_seconds += time.perf_counter() - start
+        self.bytes_written += len(data)
+        return written
+
+    def writable(self):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
 
 class StorageManager:
     """Manages interactions with Google Cloud Storage."""
 
-    def __init__(self, client, bucket_name):
+    def __init__(self, client, bucket_name, limiter=None):
         """
         Initialize the Storage Manager.
 
         Args:
             client: Google Cloud Storage client
             bucket_name: Name of the GCS bucket to use
+            limiter: AdaptiveLimiter every request goes through
+                (default: one allowing settings.GCS_MAX_CONCURRENCY requests at once)
         """
         self.client = client
         self.bucket_name = bucket_name
+        # Adaptive limit on requests in flight, shared by every thread using the manager
+        self.limiter = limiter or AdaptiveLimiter('gcs', settings.GCS_MAX_CONCURRENCY)
+        # Size and timings of each upload, keyed by file path
+        self.upload_stats = {}
+        # Bucket handles, so the bucket is only looked up once
+        self.bucket_cache = MetadataCache()
+        # gs:// URI to load each sharded file from, keyed by file path
+        self.source_uris = {}
+        self._connection_pool_size = DEFAULT_CONNECTION_POOL_SIZE
         logger.info(f"StorageManager initialized with bucket: {bucket_name}")
 
-    def upload_dataframe(self, dataframe, file_path):
+    def get_bucket(self):
+        """
+        Get the bucket, looking it up only on first use.
+
+        Returns:
+            google.cloud.storage.Bucket: The bucket
+        """
+        bucket = self.bucket_cache.get(self.bucket_name)
+        if bucket is None:
+            bucket = self.limiter.call(self.client.get_bucket, self.bucket_name)
+            self.bucket_cache.put(self.bucket_name, bucket)
+        return bucket
+
+    def upload_dataframe(self, dataframe, file_path, file_format=None, compression=None,
+                         stream=None, chunk_rows=None, metadata=None):
         """
-        Upload a pandas DataFrame to GCS as a CSV file.
+        Upload a pandas DataFrame to GCS as a CSV or Parquet file.
+
+        Large frames are streamed: they are serialised chunk by chunk into a
+        resumable upload, so peak extra memory is bounded by the chunk size
+        instead of growing with the frame.
+
+        Compressed CSV files are stored with a matching Content-Encoding.
+
+        The size of the file (and, for CSV, of the text before compression)
+        and the time spent serialising and uploading it are kept in
+        upload_stats[file_path]. For streamed uploads the upload time is the
+        time spent writing to the upload stream.
 
         Args:
             dataframe: pandas DataFrame to upload
             file_path: Path within the bucket to store the file
+            file_format: 'csv' or 'parquet' (default: settings.UPLOAD_FORMAT)
+            compression: Parquet compression codec (default: settings.PARQUET_COMPRESSION)
+                or CSV compression (default: settings.CSV_COMPRESSION)
+            stream: Whether to stream the upload (default: only when the frame
+                has more rows than one chunk)
+            chunk_rows: Rows serialised per chunk when streaming
+                (default: settings.UPLOAD_CHUNK_ROWS)
+            metadata: Optional dict of custom metadata stored with the blob
+                (e.g. {'content_hash': ...})
 
         Returns:
             bool: Success status
         """
         try:
-            # Convert DataFrame to CSV string
-            csv_data = dataframe.to_csv(index=False)
+            file_format = file_format or settings.UPLOAD_FORMAT
+            if file_format not in CONTENT_TYPES:
+                raise ValueError(f"Unsupported upload format: {file_format}")
+            content_type = CONTENT_TYPES[file_format]
+            if file_format == 'csv':
+                compression = compression or settings.CSV_COMPRESSION
+                content_encoding = CSV_CONTENT_ENCODINGS.get(compression)
+            else:
+                compression = compression or settings.PARQUET_COMPRESSION
+                content_encoding = None
+            chunk_rows = chunk_rows or settings.UPLOAD_CHUNK_ROWS
+            if stream is None:
+                stream = len(dataframe) > chunk_rows
 
             # Get the GCS bucket
-            bucket = self.client.get_bucket(self.bucket_name)
-
-            # Upload the CSV data to the bucket
+            bucket = self.get_bucket()
             blob = bucket.blob(file_path)
-            blob.upload_from_string(csv_data, content_type='text/csv')
+            if metadata:
+                blob.metadata = metadata
+            blob.content_encoding = content_encoding
+
+            start = time.perf_counter()
+            if stream:
+                def stream_chunks():
+                    # Write chunks into a resumable upload session
+                    with blob.open('wb', content_type=content_type,
+                                   chunk_size=settings.UPLOAD_CHUNK_BYTES,
+                                   ignore_flush=True) as blob_writer:
+                        writer = _CountingWriter(blob_writer)
+                        raw_bytes = write_dataframe(dataframe, writer, file_format,
+                                                    compression, chunk_rows, sort_within_chunks=True)
+                        serialise_seconds = time.perf_counter() - start - writer.write_seconds
+                    return raw_bytes, serialise_seconds, writer.bytes_written
+
+                # A retried upload starts a new session from the first chunk
+                raw_bytes, serialise_seconds, nbytes = self.limiter.call(stream_chunks)
+            else:
+                # Serialise in memory and upload in a single request
+                buffer = io.BytesIO()
+                raw_bytes = write_dataframe(dataframe, buffer, file_format, compression)
+                serialise_seconds = time.perf_counter() - start
+                data = buffer.getvalue()
+                nbytes = len(data)
+                self.limiter.call(blob.upload_from_string, data, content_type=content_type)
+
+            self.upload_stats[file_path] = {
+                'format': file_format,
+                'rows': len(dataframe),
+                'bytes': nbytes,
+                'raw_bytes': raw_bytes if raw_bytes is not None else nbytes,
+                'content_encoding': content_encoding,
+                'streamed': stream,
+                'serialise_seconds': serialise_seconds,
+                'upload_seconds': time.perf_counter() - start - serialise_seconds,
+            }
 
             logger.info(
-                f"DataFrame uploaded as CSV to '{file_path}' in '{self.bucket_name}' bucket successfully.")
+                f"DataFrame uploaded as {file_format.upper()} to '{file_path}' in '{self.bucket_name}' bucket successfully.")
             return True
+        except NotFound as e:
+            # The bucket may have gone; look it up again next time
+            self.bucket_cache.invalidate(self.bucket_name)
+            logger.error(f"Error uploading to GCS: {str(e)}")
+            return False
         except Exception as e:
             logger.error(f"Error uploading to GCS: {str(e)}")
             return False
 
-    def check_blob_exists(self, file_path):
+    def source_uri(self, file_path):
+        """
+        Get the gs:// URI to load a file from.
+
+        Files uploaded with upload_dataframe_sharded by this manager are loaded
+        through their shard wildcard; any other path is used as it is.
+
+        Args:
+            file_path: Path of the file within the bucket
+
+        Returns:
+            str: The gs:// URI
+        """
+        return self.source_uris.get(file_path) or f"gs://{self.bucket_name}/{file_path}"
+
+    def sharded_uri(self, file_path):
+        """
+        Record that a file is stored as shards and get its wildcard URI.
+
+        Args:
+            file_path: Path within the bucket that the shards are stored under
+
+        Returns:
+            str: gs:// URI matching every shard
+        """
+        uri = f"gs://{self.bucket_name}/{shard_wildcard(file_path)}"
+        self.source_uris[file_path] = uri
+        return uri
+
+    def _size_connection_pool(self, size):
+        """Let the client's HTTP session keep a connection open for every upload thread."""
+        http = getattr(self.client, '_http', None)
+        if size <= self._connection_pool_size or not hasattr(http, 'mount'):
+            return
+        from requests.adapters import HTTPAdapter
+
+        http.mount('https://', HTTPAdapter(pool_connections=size, pool_maxsize=size))
+        self._connection_pool_size = size
+
+    def upload_dataframe_sharded(self, dataframe, file_path, shard_rows=None, workers=None,
+                                 file_format=None, compression=None, metadata=None):
+        """
+        Upload a large DataFrame as row-range shards in parallel.
+
+        Shard i holds rows [i * shard_rows, (i + 1) * shard_rows) and is stored
+        at "<file_path>/part-%05d". Shards are uploaded by a thread pool
+        sharing the client's connection pool, so the upload is not limited to
+        one connection. Once every shard is up, shards left over from an
+        earlier upload with more shards, and an unsharded file at file_path,
+        are deleted so the wildcard matches exactly this frame. If any shard
+        fails, every shard under the path is deleted, so neither this path's
+        wildcard nor a wider one loads part of a frame.
+
+        upload_stats[file_path] holds the totals of the shards; their times add
+        up the work of every thread, and wall_seconds is the elapsed time.
+
+        Args:
+            dataframe: pandas DataFrame to upload
+            file_path: Path within the bucket that the shards are stored under
+            shard_rows: Rows per shard (default: settings.UPLOAD_SHARD_ROWS)
+            workers: Shards uploaded at once (default: settings.UPLOAD_SHARD_WORKERS)
+            file_format: 'csv' or 'parquet' (default: settings.UPLOAD_FORMAT)
+            compression: Compression codec, as for upload_dataframe
+            metadata: Optional dict of custom metadata stored with every shard
+
+        Returns:
+            str: gs:// wildcard URI matching every shard, or None if an upload failed
+        """
+        shard_rows = shard_rows or settings.UPLOAD_SHARD_ROWS
+        workers = workers or settings.UPLOAD_SHARD_WORKERS
+        starts = range(0, max(len(dataframe), 1), shard_rows)
+        paths = [shard_path(file_path, index) for index in range(shard_count(len(dataframe), shard_rows))]
+        workers = min(workers, len(paths))
+
+        def upload(start, path):
+            return self.upload_dataframe(
+                dataframe.iloc[start:start + shard_rows], path, file_format, compression,
+                metadata=metadata)
+
+        start_time = time.perf_counter()
+        self._size_connection_pool(workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(upload, starts, paths))
+        wall_seconds = time.perf_counter() - start_time
+        if not all(results):
+            logger.error(
+                f"Failed to upload {results.count(False)} of {len(paths)} shards of '{file_path}'")
+            self.delete_shards(file_path)
+            for path in paths:
+                self.upload_stats.pop(path, None)
+            return None
+
+        self.delete_shards(file_path, keep=len(paths))
+        self.delete_blob(file_path)
+
+        shard_stats = [self.upload_stats.pop(path) for path in paths]
+        self.upload_stats[file_path] = {
+            'format': shard_stats[0]['format'],
+            'rows': len(dataframe),
+            'bytes': sum(stats['bytes'] for stats in shard_stats),
+            'raw_bytes': sum(stats['raw_bytes'] for stats in shard_stats),
+            'content_encoding': shard_stats[0]['content_encoding'],
+            'streamed': any(stats['streamed'] for stats in shard_stats),
+            'shards': len(paths),
+            'serialise_seconds': sum(stats['serialise_seconds'] for stats in shard_stats),
+            'upload_seconds': sum(stats['upload_seconds'] for stats in shard_stats),
+            'wall_seconds': wall_seconds,
+        }
+        uri = self.sharded_uri(file_path)
+        logger.info(
+            f"DataFrame uploaded as {len(paths)} shards to '{uri}' with {workers} workers "
+            f"in {wall_seconds:.2f}s.")
+        return uri
+
+    def delete_shards(self, file_path, keep=0):
+        """
+        Delete the shards of a sharded upload from index `keep` on.
+
+        Args:
+            file_path: Path within the bucket that the shards are stored under
+            keep: Number of leading shards to keep
+
+        Returns:
+            int: Number of shards deleted
+        """
+        try:
+            bucket = self.get_bucket()
+            blobs = self.limiter.call(
+                lambda: list(bucket.list_blobs(prefix=f"{file_path}/part-")))
+            keep_paths = {shard_path(file_path, index) for index in range(keep)}
+            stale = [blob for blob in blobs if blob.name not in keep_paths]
+            for blob in stale:
+                self.limiter.call(blob.delete)
+            if stale:
+                logger.info(f"Deleted {len(stale)} stale shards of '{file_path}'")
+            if not keep:
+                self.source_uris.pop(file_path, None)
+            return len(stale)
+        except Exception as e:
+            logger.error(f"Error deleting shards of '{file_path}': {str(e)}")
+            return 0
+
+    def delete_blob(self, file_path):
+        """
+        Delete a blob if it exists.
+
+        Args:
+            file_path: Path to the blob
+
+        Returns:
+            bool: True if a blob was deleted
+        """
+        try:
+            self.limiter.call(self.get_bucket().blob(file_path).delete)
+            return True
+        except NotFound:
+            return False
+        except Exception as e:
+            logger.error(f"Error deleting '{file_path}': {str(e)}")
+            return False
+
+    def upload_bytes(self, data, file_path, content_type=None):
+        """
+        Upload a small file's bytes in a single request.
+
+        Args:
+            data: Bytes to store
+            file_path: Path within the bucket to store the file
+            content_type: Content type of the file
+
+        Returns:
+            bool: Success status
+        """
+        try:
+            self.limiter.call(
+                self.get_bucket().blob(file_path).upload_from_string,
+                data, content_type=content_type or 'application/octet-stream')
+            return True
+        except Exception as e:
+            logger.error(f"Error uploading '{file_path}' to GCS: {str(e)}")
+            return False
+
+    def download_bytes(self, file_path):
+        """
+        Download a file's bytes.
+
+        Args:
+            file_path: Path of the file within the bucket
+
+        Returns:
+            bytes or None: The file contents, or None if it does not exist or
+                could not be read
+        """
+        try:
+            return self.limiter.call(self.get_bucket().blob(file_path).download_as_bytes)
+        except NotFound:
+            return None
+        except Exception as e:
+            logger.error(f"Error downloading '{file_path}' from GCS: {str(e)}")
+            return None
+
+    def check_shards_exist(self, file_path, shards, content_hash):
+        """
+        Check that a sharded upload with the given content is complete.
+
+        The shards under the path must be exactly shards 0 to shards - 1, and
+        every one of them must carry the content hash in its metadata, so an
+        upload that stopped part way (or left shards of another upload
+        behind) does not count.
+
+        Args:
+            file_path: Path within the bucket that the shards are stored under
+            shards: Number of shards the upload has (see shard_count)
+            content_hash: The 'content_hash' every shard's metadata must hold
+
+        Returns:
+            bool: True if every shard is there with the content hash
+        """
+        try:
+            bucket = self.get_bucket()
+            # One listing returns every shard with its metadata
+            blobs = self.limiter.call(
+                lambda: list(bucket.list_blobs(prefix=f"{file_path}/part-")))
+            expected = {shard_path(file_path, index) for index in range(shards)}
+            return ({blob.name for blob in blobs} == expected
+                    and all((blob.metadata or {}).get('content_hash') == content_hash
+                            for blob in blobs))
+        except Exception as e:
+            logger.error(f"Error checking the shards of '{file_path}': {str(e)}")
+            return False
+
+    def check_blob_exists(self, file_path, content_hash=None):
         """
         Check if a blob exists in the bucket.
 
         Args:
             file_path: Path to the blob
+            content_hash: If given, the blob only counts as existing when the
+                'content_hash' in its metadata matches
 
         Returns:
             bool: True if exists, False otherwise
         """
         try:
-            bucket = self.client.get_bucket(self.bucket_name)
+            bucket = self.get_bucket()
+            if content_hash is not None:
+                # One request returns the blob with its metadata
+                blob = self.limiter.call(bucket.get_blob, file_path)
+                return blob is not None and (blob.metadata or {}).get('content_hash') == content_hash
             blob = bucket.blob(file_path)
-            return blob.exists()
+            return self.limiter.call(blob.exists)
         except Exception as e:
             logger.error(f"Error checking if blob exists: {str(e)}")
             return False
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Compare CSV and Parquet upload formats for one full season of player stats.
+
+Reports the serialised size and serialisation time of each format. With
+--bucket, each file is also uploaded to GCS and loaded into a scratch BigQuery
+dataset so upload and load times can be compared too.
+
+Usage:
+    python benchmarks/format_benchmark.py
+    python benchmarks/format_benchmark.py --bucket afl-data --dataset afl_benchmark
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Add the project root to sys.path so the afl_pipeline package can be imported
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from afl_pipeline.data_processor import preprocess_player_stats  # noqa: E402
+from afl_pipeline.storage import dataframe_to_parquet  # noqa: E402
+from benchmarks.synthetic import make_player_stats, ROWS_PER_SEASON  # noqa: E402
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('benchmarks.format')
+
+FORMATS = [
+    ('csv', None),
+    ('parquet', 'none'),
+    ('parquet', 'snappy'),
+    ('parquet', 'gzip'),
+    ('parquet', 'zstd'),
+]
+
+
+def serialise(df, file_format, compression):
+    """Serialise a frame the way StorageManager.upload_dataframe does."""
+    if file_format == 'csv':
+        return df.to_csv(index=False).encode('utf-8')
+    return dataframe_to_parquet(df, compression)
+
+
+def upload_and_load(df, file_format, compression, bucket_name, dataset_id):
+    """Upload and load one file through the pipeline managers; return timings."""
+    from google.cloud import storage, bigquery
+    from afl_pipeline.storage import StorageManager
+    from afl_pipeline.bigquery import BigQueryManager, schema_from_dataframe
+
+    storage_manager = StorageManager(storage.Client(), bucket_name)
+    bigquery_manager = BigQueryManager(bigquery.Client())
+    name = f"format_benchmark_{file_format}_{compression or 'plain'}"
+
+    start = time.perf_counter()
+    storage_manager.upload_dataframe(
+        df, f"benchmarks/{name}", file_format=file_format, compression=compression)
+    upload_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bigquery_manager.upload_from_gcs(
+        f"gs://{bucket_name}/benchmarks/{name}", name, dataset_id=dataset_id,
+        source_format=file_format,
+        schema=schema_from_dataframe(df) if file_format == 'csv' else None)
+    load_time = time.perf_counter() - start
+    return upload_time, load_time
+
+
+def main():
+    """Run the format benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=ROWS_PER_SEASON,
+                        help='Rows in the synthetic season (default: one full season)')
+    parser.add_argument('--bucket', help='GCS bucket for the upload/load timings')
+    parser.add_argument('--dataset', default='afl_benchmark',
+                        help='Scratch BigQuery dataset for the load timings')
+    args = parser.parse_args()
+
+    df = preprocess_player_stats(make_player_stats(args.rows), 2023)
+
+    csv_size = None
+    for file_format, compression in FORMATS:
+        start = time.perf_counter()
+        data = serialise(df, file_format, compression)
+        serialise_time = time.perf_counter() - start
+        csv_size = csv_size or len(data)
+
+        line = (f"{file_format:8s} {compression or '-':7s} "
+                f"{len(data) / 1e6:8.2f} MB ({len(data) / csv_size:5.1%} of CSV) "
+                f"serialise {serialise_time * 1000:7.1f} ms")
+        if args.bucket:
+            upload_time, load_time = upload_and_load(
+                df, file_format, compression, args.bucket, args.dataset)
+            line += f"  upload {upload_time:6.2f}s  load {load_time:6.2f}s"
+        logger.info(line)
+
+
+if __name__ == "__main__":
+    main()
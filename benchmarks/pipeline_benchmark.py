@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""
+Benchmark the pipeline's hot paths and flag regressions against a saved baseline.
+
+Times preprocessing, match enrichment, CSV and Parquet serialisation,
+StorageManager uploads into an in-memory bucket and the combined table SQL
+building on synthetic player stats frames of increasing size. Results are written as JSON; when a baseline
+file exists, any stage that is slower than its baseline by more than the
+threshold is reported and the script exits with status 1.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py
+    python benchmarks/pipeline_benchmark.py --rows 10000 100000 1000000 10000000
+    python benchmarks/pipeline_benchmark.py --save-baseline
+    python benchmarks/pipeline_benchmark.py --threshold 15 --output results.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+
+# Add the project root to sys.path so the afl_pipeline package can be imported
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from afl_pipeline.bigquery import build_combined_table_query  # noqa: E402
+from afl_pipeline.data_processor import preprocess_player_stats  # noqa: E402
+from afl_pipeline.enrichment import enrich_player_matches  # noqa: E402
+from afl_pipeline.fake_cloud import FakeStorageClient  # noqa: E402
+from afl_pipeline.storage import StorageManager, write_dataframe  # noqa: E402
+from benchmarks.synthetic import make_player_stats, make_results  # noqa: E402
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('benchmarks.pipeline')
+
+DEFAULT_ROWS = [10000, 100000, 1000000]
+DEFAULT_BASELINE = os.path.join(PROJECT_ROOT, 'benchmarks', 'baseline.json')
+DEFAULT_THRESHOLD = 20.0
+
+# Years in the combined table benchmark (every VFL/AFL season)
+COMBINED_YEARS = list(range(1897, 2025))
+
+
+def time_stage(function, repeat):
+    """
+    Time a callable.
+
+    Args:
+        function: Callable to time (called with no arguments)
+        repeat: Number of timed runs
+
+    Returns:
+        dict: Best and median wall time in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times)}
+
+
+def benchmark_rows(rows, repeat):
+    """
+    Run every frame-size dependent stage on a synthetic frame.
+
+    Args:
+        rows: Rows in the synthetic frame
+        repeat: Number of timed runs per stage
+
+    Returns:
+        dict: Stage timings keyed by stage name
+    """
+    logger.info(f"Building synthetic frame with {rows} rows")
+    raw_df = make_player_stats(rows)
+    # Spread the rows over every season for the enrichment join
+    history_df = make_player_stats(rows, season=COMBINED_YEARS)
+    results_df = make_results(history_df)
+    processed_df = preprocess_player_stats(raw_df, 2023)
+    storage_manager = StorageManager(FakeStorageClient(), 'benchmark-bucket')
+
+    stages = {
+        'preprocess': lambda: preprocess_player_stats(raw_df, 2023),
+        'enrich': lambda: enrich_player_matches(history_df, results=results_df),
+        'serialise_csv': lambda: write_dataframe(processed_df, io.BytesIO(), 'csv'),
+        'serialise_parquet': lambda: write_dataframe(
+            processed_df, io.BytesIO(), 'parquet', 'snappy'),
+        'upload_csv': lambda: storage_manager.upload_dataframe(
+            processed_df, 'benchmark.csv', file_format='csv'),
+        'upload_parquet': lambda: storage_manager.upload_dataframe(
+            processed_df, 'benchmark.parquet', file_format='parquet'),
+    }
+
+    results = {}
+    for name, function in stages.items():
+        results[name] = time_stage(function, repeat)
+        logger.info(f"{name:18s} {rows:>9d} rows  {results[name]['best'] * 1000:9.1f} ms")
+    return results
+
+
+def benchmark_combined_query(repeat):
+    """Time building the combined table query over every season."""
+    source_tables = [f"project.afl_data.player_stats_{year}" for year in COMBINED_YEARS]
+
+    def build():
+        for _ in range(100):
+            build_combined_table_query(
+                'project.afl_data.player_stats_combined', source_tables,
+                partition_field='year', partition_range=(1897, 2101),
+                cluster_fields=['ID', 'Playing_for'])
+
+    result = time_stage(build, repeat)
+    logger.info(f"{'combined_query':18s} {len(COMBINED_YEARS):>9d} years {result['best'] * 1000:9.1f} ms")
+    return result
+
+
+def run_benchmarks(row_counts, repeat):
+    """
+    Run the whole suite.
+
+    Args:
+        row_counts: Synthetic frame sizes to benchmark
+        repeat: Number of timed runs per stage
+
+    Returns:
+        dict: Results with one entry per "stage@rows" key
+    """
+    benchmarks = {}
+    for rows in row_counts:
+        for stage, timing in benchmark_rows(rows, repeat).items():
+            benchmarks[f"{stage}@{rows}"] = timing
+    benchmarks[f"combined_query@{len(COMBINED_YEARS)}"] = benchmark_combined_query(repeat)
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'benchmarks': benchmarks,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    Compare results against a baseline.
+
+    Args:
+        results: Output of run_benchmarks
+        baseline: A previous output of run_benchmarks
+        threshold: Allowed slowdown in percent before a stage is flagged
+
+    Returns:
+        list: (benchmark, baseline seconds, current seconds, change %) for each regression
+    """
+    regressions = []
+    for name, timing in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if not previous or previous['best'] <= 0:
+            continue
+        change = (timing['best'] / previous['best'] - 1) * 100
+        if change > threshold:
+            regressions.append((name, previous['best'], timing['best'], change))
+    return regressions
+
+
+def main():
+    """Run the pipeline benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help='Synthetic frame sizes (up to 10000000)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per stage (best is compared)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown in percent before a stage is flagged')
+    parser.add_argument('--output', help='Write the results JSON here')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Save the results as the new baseline')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.rows, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        logger.warning(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = find_regressions(results, baseline, args.threshold)
+    for name, previous, current, change in regressions:
+        logger.error(f"Regression in {name}: {previous * 1000:.1f} ms -> "
+                     f"{current * 1000:.1f} ms (+{change:.0f}%)")
+    if regressions:
+        return 1
+    logger.info(f"No stage slower than its baseline by more than {args.threshold:.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
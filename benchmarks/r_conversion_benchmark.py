@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Benchmark the R data.frame to pandas conversion used by the fitzRoy fetch functions.
+
+Compares the original per-column ``rx2`` conversion (which goes element by element
+through Python objects) against ``r_dataframe_to_pandas`` on a synthetic R data.frame.
+
+Usage:
+    python benchmarks/r_conversion_benchmark.py --rows 1000000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+# Add the project root to sys.path so the Data_Pipeline package can be imported
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+import rpy2.robjects as robjects  # noqa: E402
+
+from Data_Pipeline.Functions.get_data_functions import r_dataframe_to_pandas  # noqa: E402
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('benchmarks.r_conversion')
+
+# R code that builds a data.frame shaped like afltables player stats
+SYNTHETIC_FRAME_R_CODE = """
+local({{
+    set.seed(42)
+    n <- {rows}L
+    teams <- c("Adelaide", "Brisbane Lions", "Carlton", "Collingwood", "Essendon",
+               "Fremantle", "Geelong", "Gold Coast", "GWS", "Hawthorn",
+               "Melbourne", "North Melbourne", "Port Adelaide", "Richmond",
+               "St Kilda", "Sydney", "West Coast", "Western Bulldogs")
+    attendance <- runif(n) * 100000
+    attendance[sample.int(n, n %/% 100)] <- NA
+    kicks <- sample.int(35L, n, replace = TRUE)
+    kicks[sample.int(n, n %/% 100)] <- NA
+    data.frame(
+        Season = rep(2023L, n),
+        Round = factor(sample(as.character(1:24), n, replace = TRUE)),
+        Date = as.Date("2023-03-16") + sample.int(180L, n, replace = TRUE),
+        Venue = factor(sample(c("M.C.G.", "Docklands", "Adelaide Oval", "Gabba"),
+                              n, replace = TRUE)),
+        Attendance = attendance,
+        ID = sample.int(12000L, n, replace = TRUE),
+        Playing.for = sample(teams, n, replace = TRUE),
+        Kicks = kicks,
+        Marks = sample.int(15L, n, replace = TRUE),
+        Handballs = sample.int(30L, n, replace = TRUE),
+        Brownlow.Votes = sample(c(TRUE, FALSE, NA), n, replace = TRUE),
+        stringsAsFactors = FALSE
+    )
+}})
+"""
+
+
+def convert_legacy(r_dataframe):
+    """Original conversion: pass raw R vectors straight into pd.DataFrame."""
+    columns = list(r_dataframe.colnames)
+    data = {col: r_dataframe.rx2(col) for col in columns}
+    return pd.DataFrame(data)
+
+
+def time_conversion(convert, r_dataframe, repeat):
+    """Return the best wall time over ``repeat`` runs and the last result."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = convert(r_dataframe)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    """Run the conversion benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='Number of rows in the synthetic R data.frame')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per conversion (best is reported)')
+    args = parser.parse_args()
+
+    logger.info(f"Building synthetic R data.frame with {args.rows} rows")
+    r_dataframe = robjects.r(SYNTHETIC_FRAME_R_CODE.format(rows=args.rows))
+
+    legacy_time, legacy_df = time_conversion(
+        convert_legacy, r_dataframe, args.repeat)
+    columnar_time, columnar_df = time_conversion(
+        r_dataframe_to_pandas, r_dataframe, args.repeat)
+
+    logger.info(f"Legacy conversion:   {legacy_time:8.3f}s "
+                f"({legacy_df.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
+    logger.info(f"Columnar conversion: {columnar_time:8.3f}s "
+                f"({columnar_df.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
+    logger.info(f"Speed-up: {legacy_time / columnar_time:.1f}x")
+    logger.info(f"Columnar dtypes:\n{columnar_df.dtypes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Synthetic data for the AFL pipeline benchmarks.
+
+Builds player statistics frames with the same columns as ``create_sample_data``
+but an arbitrary number of rows and realistic value distributions, and the
+fitzRoy results frame of their matches.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Rows in one full afltables season (~207 matches x 44 players)
+ROWS_PER_SEASON = 9108
+
+TEAMS = [
+    'Adelaide', 'Brisbane Lions', 'Carlton', 'Collingwood', 'Essendon',
+    'Fremantle', 'Geelong', 'Gold Coast', 'Greater Western Sydney', 'Hawthorn',
+    'Melbourne', 'North Melbourne', 'Port Adelaide', 'Richmond', 'St Kilda',
+    'Sydney', 'West Coast', 'Western Bulldogs',
+]
+VENUES = [
+    'M.C.G.', 'Docklands', 'Adelaide Oval', 'Gabba', 'S.C.G.', 'Kardinia Park',
+    'Perth Stadium', 'Carrara', 'Sydney Showground', 'York Park',
+]
+FIRST_NAMES = [
+    'John', 'Michael', 'David', 'James', 'Robert', 'William', 'Richard',
+    'Joseph', 'Thomas', 'Charles', 'Jack', 'Luke', 'Sam', 'Tom', 'Josh',
+]
+SURNAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Miller', 'Davis',
+    'Garcia', 'Rodriguez', 'Wilson', 'Martin', 'Taylor', 'Walker', 'White',
+]
+
+
+def make_player_stats(rows, season=2023, seed=0):
+    """
+    Build a synthetic raw player statistics frame.
+
+    Args:
+        rows: Number of rows
+        season: Season for the rows (a list spreads rows across seasons)
+        seed: Random seed
+
+    Returns:
+        pandas DataFrame: Frame with the create_sample_data columns (plus Date)
+    """
+    rng = np.random.default_rng(seed)
+    seasons = np.asarray(season if isinstance(season, (list, tuple)) else [season])
+    rounds = rng.integers(1, 24, rows)
+    playing_for = rng.integers(0, len(TEAMS), rows)
+    opponent = (playing_for + rng.integers(1, len(TEAMS), rows)) % len(TEAMS)
+    home = rng.random(rows) < 0.5
+    teams = np.asarray(TEAMS, dtype=object)
+
+    return pd.DataFrame({
+        'Season': np.sort(rng.choice(seasons, rows)),
+        'Round': rounds.astype(str).astype(object),
+        'Date': pd.Timestamp('2023-03-16') + pd.to_timedelta(rounds * 7, unit='D'),
+        'Local.start.time': rng.choice([1310, 1610, 1920, 1945], rows),
+        'Venue': rng.choice(np.asarray(VENUES, dtype=object), rows),
+        'Attendance': rng.integers(5000, 100000, rows).astype(float),
+        'First.name': rng.choice(np.asarray(FIRST_NAMES, dtype=object), rows),
+        'Surname': rng.choice(np.asarray(SURNAMES, dtype=object), rows),
+        'ID': rng.integers(1000, 13000, rows),
+        'Jumper.No.': rng.integers(1, 50, rows),
+        'Playing.for': teams[playing_for],
+        'Kicks': rng.integers(0, 35, rows),
+        'Marks': rng.integers(0, 15, rows),
+        'Handballs': rng.integers(0, 30, rows),
+        'Goals': rng.integers(0, 8, rows),
+        'Behinds': rng.integers(0, 6, rows),
+        'Hit.Outs': np.where(rng.random(rows) < 0.1, rng.integers(0, 50, rows), 0),
+        'Tackles': rng.integers(0, 12, rows),
+        'Home.team': np.where(home, teams[playing_for], teams[opponent]),
+        'Away.team': np.where(home, teams[opponent], teams[playing_for]),
+    })
+
+
+def make_results(player_stats, seed=0):
+    """
+    Build a fitzRoy (afltables) results frame for the matches in a player stats frame.
+
+    Args:
+        player_stats: Frame from make_player_stats
+        seed: Random seed
+
+    Returns:
+        pandas DataFrame: One row per match with afltables results column names
+    """
+    rng = np.random.default_rng(seed)
+    matches = player_stats[['Season', 'Round', 'Home.team', 'Away.team', 'Venue']].drop_duplicates(
+        subset=['Season', 'Round', 'Home.team', 'Away.team'])
+    return pd.DataFrame({
+        'Season': matches['Season'].to_numpy(),
+        'Round': ('R' + matches['Round'].astype(str)).to_numpy(),
+        'Home.Team': matches['Home.team'].to_numpy(),
+        'Away.Team': matches['Away.team'].to_numpy(),
+        'Home.Points': rng.integers(30, 150, len(matches)),
+        'Away.Points': rng.integers(30, 150, len(matches)),
+        'Venue': matches['Venue'].to_numpy(),
+    })
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from afl_pipeline.async_pipeline import AsyncAFLDataPipeline, RateLimiter, wait_for_job
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient, NetworkProfile
+
+
+class FakeClock:
+    """Clock that only moves when sleep() is awaited."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for the asyncio RateLimiter."""
+
+    def test_spreads_requests(self):
+        """Test requests beyond the burst wait for the next token."""
+        clock = FakeClock()
+        limiter = RateLimiter(4, burst=2, clock=clock, sleep=clock.sleep)
+
+        async def make_requests():
+            for _ in range(5):
+                await limiter.acquire()
+
+        asyncio.run(make_requests())
+
+        self.assertEqual(clock.sleeps, [0.25, 0.25, 0.25])
+        self.assertEqual(limiter.stats(), {'waits': 3, 'waited_seconds': 0.75})
+
+    def test_unlimited(self):
+        """Test a limiter without a rate never waits."""
+        clock = FakeClock()
+        limiter = RateLimiter(None, clock=clock, sleep=clock.sleep)
+
+        asyncio.run(limiter.acquire())
+
+        self.assertEqual(clock.sleeps, [])
+
+
+class TestWaitForJob(unittest.TestCase):
+    """Test cases for polling BigQuery jobs."""
+
+    def test_polls_with_backoff(self):
+        """Test the job is polled with growing intervals until it is done."""
+        clock = FakeClock()
+        job = MagicMock()
+        job.done.side_effect = [False, False, False, True]
+
+        polls = asyncio.run(wait_for_job(
+            job, poll_interval=1, max_interval=3, clock=clock, sleep=clock.sleep))
+
+        self.assertEqual(polls, 4)
+        self.assertEqual(clock.sleeps, [1, 2, 3])
+        job.result.assert_called_once()
+
+    def test_job_error_raised(self):
+        """Test a failed job's error is raised."""
+        clock = FakeClock()
+        job = MagicMock()
+        job.done.return_value = True
+        job.result.side_effect = ValueError("load failed")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(wait_for_job(job, clock=clock, sleep=clock.sleep))
+
+    def test_timeout(self):
+        """Test giving up on a job that does not finish in time."""
+        clock = FakeClock()
+        job = MagicMock()
+        job.done.return_value = False
+
+        with self.assertRaises(TimeoutError):
+            asyncio.run(wait_for_job(
+                job, poll_interval=1, max_interval=1, timeout=5, clock=clock, sleep=clock.sleep))
+        self.assertEqual(len(clock.sleeps), 5)
+        job.result.assert_not_called()
+
+
+class TestAsyncPipeline(unittest.TestCase):
+    """Test cases for AsyncAFLDataPipeline against the in-process fakes."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.storage_client = FakeStorageClient()
+        self.bigquery_client = FakeBigQueryClient(
+            self.storage_client, profile=NetworkProfile(job_latency=0.05))
+
+        # Keep the manifests out of the project directory, and poll quickly
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.patchers = [
+            patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                  os.path.join(self.state_dir.name, 'content_manifest.json')),
+            patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                  os.path.join(self.state_dir.name, 'run_manifest.json')),
+            patch('afl_pipeline.settings.JOB_POLL_INTERVAL_SECONDS', 0.01),
+            patch('afl_pipeline.settings.JOB_POLL_MAX_INTERVAL_SECONDS', 0.02),
+            patch('afl_pipeline.settings.GCS_REQUESTS_PER_SECOND', 200),
+            patch('afl_pipeline.settings.BIGQUERY_REQUESTS_PER_SECOND', 200),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.pipeline = AsyncAFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+
+    def tearDown(self):
+        self.bigquery_client.close()
+        for patcher in self.patchers:
+            patcher.stop()
+        self.state_dir.cleanup()
+
+    def test_run(self):
+        """Test processing many years concurrently and combining them."""
+        years = list(range(2000, 2012))
+
+        result = self.pipeline.run(years, use_sample_data=True)
+
+        self.assertEqual(result, years)
+        for year in years:
+            table = self.bigquery_client.get_table(f'afl_player_data.player_stats_{year}_bq')
+            self.assertEqual(table.num_rows, 10)
+        combined = self.bigquery_client.get_table('afl_data.combined_player_stats_bq')
+        self.assertEqual(combined.num_rows, 10 * len(years))
+        self.assertGreaterEqual(self.pipeline.metrics.info['job_polls'], len(years))
+        self.assertEqual(self.pipeline.metrics.stage_totals()['bigquery_load']['count'], len(years))
+
+        # A second run finds every year unchanged and submits no load jobs
+        self.assertEqual(self.pipeline.run(years, use_sample_data=True), years)
+        self.assertEqual(self.pipeline.skipped_years('load'), years)
+        self.assertEqual(self.pipeline.metrics.info['job_polls'], 0)
+
+    def test_failed_load(self):
+        """Test a failed load job fails only its own year."""
+        start_load_job = self.pipeline.bigquery.start_load_job
+
+        def fail_2001(gcs_uri, table_id, *args, **kwargs):
+            if '2001' in table_id:
+                raise RuntimeError("quota exceeded")
+            return start_load_job(gcs_uri, table_id, *args, **kwargs)
+
+        with patch.object(self.pipeline.bigquery, 'start_load_job', side_effect=fail_2001):
+            result = self.pipeline.run([2000, 2001, 2002], use_sample_data=True,
+                                       create_combined=False)
+
+        self.assertEqual(result, [2000, 2002])
+        self.assertEqual(self.pipeline.metrics.stage_totals()['bigquery_load']['errors'], 1)
+
+    def test_rate_limited_load_resubmitted(self):
+        """Test load jobs that fail with rateLimitExceeded are submitted again."""
+        self.bigquery_client.profile.job_error_rate = 0.5
+        years = list(range(2000, 2006))
+
+        with patch('afl_pipeline.settings.CLOUD_BACKOFF_BASE_SECONDS', 0.001):
+            result = self.pipeline.run(years, use_sample_data=True, create_combined=False)
+
+        self.assertEqual(result, years)
+        self.assertGreater(self.bigquery_client.profile.failed_jobs, 0)
+        for year in years:
+            table = self.bigquery_client.get_table(f'afl_player_data.player_stats_{year}_bq')
+            self.assertEqual(table.num_rows, 10)
+
+    def test_timed_out_load_cancelled(self):
+        """Test a load job still running at the timeout is cancelled and fails its year."""
+        job = MagicMock(job_id='load-2000')
+
+        with patch.object(self.pipeline.bigquery, 'start_load_job', return_value=job), \
+                patch('afl_pipeline.async_pipeline.wait_for_job', side_effect=TimeoutError):
+            result = self.pipeline.run([2000], use_sample_data=True, create_combined=False)
+
+        self.assertEqual(result, [])
+        job.cancel.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
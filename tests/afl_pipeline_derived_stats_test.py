@@ -0,0 +1,227 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+import pandas as pd
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from afl_pipeline.async_pipeline import AsyncAFLDataPipeline
+from afl_pipeline.derived_stats import DerivedStatsEngine, add_derived_stats, season_totals
+from afl_pipeline.data_processor import create_sample_data, preprocess_player_stats
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient
+from afl_pipeline.pipeline import AFLDataPipeline
+from benchmarks.synthetic import make_player_stats
+
+
+def season_rows():
+    """Four rounds of two players, with player 2 missing round 3."""
+    return pd.DataFrame({
+        'Season': [2021] * 7,
+        'Round': ['1', '1', '2', '2', '3', '4', '4'],
+        'ID': [1, 2, 1, 2, 1, 1, 2],
+        'First.name': ['Dustin', 'Patrick'] * 2 + ['Dustin', 'Dustin', 'Patrick'],
+        'Surname': ['Martin', 'Cripps'] * 2 + ['Martin', 'Martin', 'Cripps'],
+        'Playing.for': ['Richmond', 'Carlton'] * 2 + ['Richmond', 'Richmond', 'Carlton'],
+        'Kicks': [10, 20, 12, 22, 14, 16, 24],
+        'Handballs': [5, 10, 6, 12, 7, 8, 14],
+        'Goals': [2, 0, 1, 1, 3, 0, 2],
+        'Behinds': [1, 0, 0, 2, 1, 1, 0],
+    })
+
+
+class TestDerivedStats(unittest.TestCase):
+    """Test cases for the season aggregates and rolling form."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.engine = DerivedStatsEngine(state_dir=self.state_dir.name, window=2)
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def test_derived_columns(self):
+        """Test disposals and points are computed per game."""
+        df = add_derived_stats(season_rows())
+
+        self.assertEqual(df['Disposals'].tolist()[:2], [15, 30])
+        self.assertEqual(df['Points'].tolist()[:2], [13, 0])
+
+    def test_season_aggregates(self):
+        """Test totals, games and averages per player."""
+        stats = self.engine.rebuild_season(2021, season_rows())['season_stats']
+
+        player = stats.set_index('ID').loc[1]
+        self.assertEqual(player['Games'], 4)
+        self.assertEqual(player['Kicks'], 52)
+        self.assertEqual(player['Disposals'], 78)
+        self.assertAlmostEqual(player['Disposals.avg'], 19.5)
+        self.assertEqual(player['Surname'], 'Martin')
+        self.assertEqual(stats['Season'].unique().tolist(), [2021])
+
+    def test_rolling_form(self):
+        """Test form is the mean of each player's last games, in input order."""
+        form = self.engine.rebuild_season(2021, season_rows())['form']
+
+        self.assertEqual(form['ID'].tolist(), season_rows()['ID'].tolist())
+        self.assertEqual(form['Kicks.last2'].tolist(), [10, 20, 11, 21, 13, 15, 23])
+
+    def test_update_matches_rebuild(self):
+        """Test adding rounds to stored state gives the same tables as a rebuild."""
+        df = season_rows()
+        early, late = df[df['Round'].isin(['1', '2'])], df[df['Round'].isin(['3', '4'])]
+
+        self.engine.rebuild_season(2021, early)
+        updated = self.engine.update_season(2021, late)
+        with tempfile.TemporaryDirectory() as other_dir:
+            rebuilt = DerivedStatsEngine(state_dir=other_dir, window=2).rebuild_season(2021, df)
+
+        pd.testing.assert_frame_equal(updated['season_stats'], rebuilt['season_stats'])
+        pd.testing.assert_frame_equal(
+            updated['form'], rebuilt['form'].iloc[4:].reset_index(drop=True))
+
+    def test_unsaved_update_repeatable(self):
+        """Test an update that was not committed can be applied again."""
+        df = season_rows()
+        self.engine.rebuild_season(2021, df[df['Round'] == '1'])
+
+        self.engine.update_season(2021, df[df['Round'] == '2'], save=False)
+        stats = self.engine.update_season(2021, df[df['Round'] == '2'], save=False)['season_stats']
+        self.engine.commit(2021)
+
+        self.assertEqual(stats.set_index('ID').loc[1, 'Games'], 2)
+        stats = self.engine.update_season(2021, df[df['Round'] == '3'])['season_stats']
+        self.assertEqual(stats.set_index('ID').loc[1, 'Games'], 3)
+
+    def test_update_without_state_fails(self):
+        """Test new rounds are not taken for the whole season when there is no state."""
+        df = season_rows()
+
+        with self.assertRaises(ValueError):
+            self.engine.update_season(2021, df[df['Round'] == '4'])
+        self.assertFalse(self.engine.has_state(2021))
+
+    def test_large_season_vectorised(self):
+        """Test a large season is aggregated without a row-wise apply."""
+        df = make_player_stats(200000)
+
+        with patch.object(pd.DataFrame, 'apply', side_effect=AssertionError("row-wise apply")), \
+                patch.object(pd.Series, 'apply', side_effect=AssertionError("row-wise apply")):
+            tables = self.engine.rebuild_season(2024, df)
+
+        self.assertEqual(len(tables['form']), len(df))
+        self.assertEqual(len(tables['season_stats']), df['ID'].nunique())
+        self.assertEqual(int(tables['season_stats']['Games'].sum()), len(df))
+        self.assertEqual(len(season_totals(add_derived_stats(df))), df['ID'].nunique())
+
+
+class TestPipelineDerivedStats(unittest.TestCase):
+    """Test cases for publishing the derived tables from the pipeline."""
+
+    def test_publish(self):
+        """Test full and incremental runs load the season stats and form tables."""
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('afl_pipeline.settings.DERIVED_STATS_ENABLED', True), \
+                patch('afl_pipeline.settings.DERIVED_STATE_DIR', os.path.join(tmp_dir, 'derived')), \
+                patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                      os.path.join(tmp_dir, 'content_manifest.json')), \
+                patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                      os.path.join(tmp_dir, 'run_manifest.json')):
+            bigquery_client = FakeBigQueryClient(FakeStorageClient())
+            pipeline = AFLDataPipeline(
+                gcs_bucket_name='test-bucket',
+                storage_client=bigquery_client.storage_client,
+                bigquery_client=bigquery_client)
+
+            self.assertTrue(pipeline.process_year(2021, use_sample_data=True))
+            round_2 = preprocess_player_stats(create_sample_data(2021, round_number=2), 2021)
+            self.assertTrue(pipeline.publish_derived_stats(2021, round_2, rounds=(2, 2)))
+
+            stats = bigquery_client.get_table('afl_derived.player_season_stats_2021_bq')
+            form = bigquery_client.get_table('afl_derived.player_form_2021_bq')
+            bigquery_client.close()
+
+        self.assertEqual(stats.num_rows, 10)
+        self.assertEqual(form.num_rows, 20)
+        self.assertEqual(pipeline.metrics.stage_totals()['derived_stats']['count'], 2)
+
+    def test_incremental_without_state_rebuilds_season(self):
+        """Test enabling derived stats mid-season rebuilds them from the whole season."""
+        def season_so_far(year, round_number=None):
+            if round_number is not None:
+                return create_sample_data(year, round_number)
+            return pd.concat([create_sample_data(year, 1), create_sample_data(year, 2)],
+                             ignore_index=True)
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('afl_pipeline.settings.DERIVED_STATE_DIR', os.path.join(tmp_dir, 'derived')), \
+                patch('afl_pipeline.settings.ROUND_STATE_PATH', os.path.join(tmp_dir, 'rounds.json')), \
+                patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                      os.path.join(tmp_dir, 'content_manifest.json')), \
+                patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                      os.path.join(tmp_dir, 'run_manifest.json')):
+            bigquery_client = FakeBigQueryClient(FakeStorageClient())
+            pipeline = AFLDataPipeline(
+                gcs_bucket_name='test-bucket',
+                storage_client=bigquery_client.storage_client,
+                bigquery_client=bigquery_client)
+            self.assertTrue(pipeline.process_year_incremental(2021, use_sample_data=True))
+
+            with patch('afl_pipeline.settings.DERIVED_STATS_ENABLED', True), \
+                    patch('afl_pipeline.pipeline.create_sample_data', side_effect=season_so_far):
+                pipeline = AFLDataPipeline(
+                    gcs_bucket_name='test-bucket',
+                    storage_client=bigquery_client.storage_client,
+                    bigquery_client=bigquery_client)
+                self.assertTrue(pipeline.process_year_incremental(2021, use_sample_data=True))
+                # Without a way to get the whole season, publishing new rounds fails
+                round_3 = preprocess_player_stats(create_sample_data(2021, round_number=3), 2021)
+                with tempfile.TemporaryDirectory() as other_dir:
+                    pipeline.derived_stats.state_dir = other_dir
+                    self.assertFalse(pipeline.publish_derived_stats(2021, round_3, rounds=(3, 3)))
+
+            stats = bigquery_client.get_table('afl_derived.player_season_stats_2021_bq')
+            form = bigquery_client.get_table('afl_derived.player_form_2021_bq')
+            bigquery_client.close()
+
+        self.assertEqual(stats.dataframe['Games'].tolist(), [2] * 10)
+        self.assertEqual(form.num_rows, 20)
+
+    def test_concurrent_and_async_runs_publish(self):
+        """Test concurrent and asyncio runs publish every year's derived tables too."""
+        runs = {
+            'concurrent': lambda pipeline: pipeline.run_pipeline(
+                [2020, 2021], use_sample_data=True, create_combined=False, concurrent=True),
+            'async': lambda pipeline: AsyncAFLDataPipeline.run(
+                pipeline, [2020, 2021], use_sample_data=True, create_combined=False),
+        }
+        for name, run in runs.items():
+            with self.subTest(run=name), tempfile.TemporaryDirectory() as tmp_dir, \
+                    patch('afl_pipeline.settings.DERIVED_STATS_ENABLED', True), \
+                    patch('afl_pipeline.settings.DERIVED_STATE_DIR', os.path.join(tmp_dir, 'derived')), \
+                    patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                          os.path.join(tmp_dir, 'content_manifest.json')), \
+                    patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                          os.path.join(tmp_dir, 'run_manifest.json')):
+                bigquery_client = FakeBigQueryClient(FakeStorageClient())
+                pipeline = AsyncAFLDataPipeline(
+                    gcs_bucket_name='test-bucket',
+                    storage_client=bigquery_client.storage_client,
+                    bigquery_client=bigquery_client)
+
+                successful_years = run(pipeline)
+                tables = {year: (bigquery_client.get_table(f'afl_derived.player_season_stats_{year}_bq'),
+                                 bigquery_client.get_table(f'afl_derived.player_form_{year}_bq'))
+                          for year in (2020, 2021)}
+                bigquery_client.close()
+
+                self.assertEqual(successful_years, [2020, 2021])
+                for stats, form in tables.values():
+                    self.assertEqual((stats.num_rows, form.num_rows), (10, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
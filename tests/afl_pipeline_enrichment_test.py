@@ -0,0 +1,155 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import pandas as pd
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from afl_pipeline.enrichment import enrich_player_matches, team_key
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient
+from afl_pipeline.fetch_cache import FetchCache
+from afl_pipeline.pipeline import AFLDataPipeline
+from benchmarks.synthetic import make_player_stats, make_results
+
+
+def player_rows():
+    """Player stats for two 2021 matches and one match with no result."""
+    return pd.DataFrame({
+        'Season': [2021, 2021, 2021, 2021, 2021],
+        'Round': ['1', '1', '2', '2', '3'],
+        'Venue': ['M.C.G.', 'M.C.G.', None, None, 'Gabba'],
+        'Playing.for': ['Richmond', 'Carlton', 'Brisbane Lions', 'Geelong', 'Sydney'],
+        'Home.team': ['Richmond', 'Richmond', 'Brisbane Lions', 'Brisbane Lions', 'Sydney'],
+        'Away.team': ['Carlton', 'Carlton', 'Geelong', 'Geelong', 'Collingwood'],
+        'ID': [1, 2, 3, 4, 5],
+    })
+
+
+def results_rows():
+    """fitzRoy results for the first two matches, with other sources' labels."""
+    return pd.DataFrame({
+        'Season': [2021, 2021],
+        'Round': ['R1', 'R2'],
+        'Home.Team': ['Richmond', 'Brisbane'],
+        'Away.Team': ['Carlton', 'Geelong Cats'],
+        'Home.Points': [95, 70],
+        'Away.Points': [80, 70],
+        'Venue': ['M.C.G.', 'Gabba'],
+    })
+
+
+class TestEnrichment(unittest.TestCase):
+    """Test cases for joining player stats to fixture and results."""
+
+    def test_team_key(self):
+        """Test team names from different sources share a key."""
+        keys = team_key(pd.Series(['GWS', ' Greater Western Sydney', 'Brisbane', None]))
+        self.assertEqual(keys.tolist(), [
+            'greater western sydney', 'greater western sydney', 'brisbane lions', None])
+
+    def test_margin_result_venue(self):
+        """Test margins and results are from each player's own team's view."""
+        enriched = enrich_player_matches(player_rows(), results=results_rows())
+
+        self.assertEqual(enriched['Margin'].tolist()[:4], [15, -15, 0, 0])
+        self.assertEqual(enriched['Result'].tolist()[:4], ['W', 'L', 'D', 'D'])
+        self.assertEqual(enriched['Opponent'].tolist(),
+                         ['Carlton', 'Richmond', 'Geelong', 'Brisbane Lions', 'Collingwood'])
+        self.assertEqual(enriched['Home.score'].tolist()[:2], [95, 95])
+        self.assertEqual(enriched['Venue'].tolist(), ['M.C.G.', 'M.C.G.', 'Gabba', 'Gabba', 'Gabba'])
+
+        # The third match has no result
+        self.assertTrue(pd.isna(enriched['Margin'].iloc[4]))
+        self.assertTrue(pd.isna(enriched['Result'].iloc[4]))
+        self.assertEqual(len(enriched), 5)
+
+    def test_fixture_venue(self):
+        """Test missing venues are filled from the fixture first."""
+        fixture = results_rows().drop(columns=['Home.Points', 'Away.Points'])
+        fixture['Venue'] = ['M.C.G.', 'Brisbane Cricket Ground']
+
+        enriched = enrich_player_matches(player_rows(), fixture=fixture, results=results_rows())
+
+        self.assertEqual(enriched['Venue'].iloc[2], 'Brisbane Cricket Ground')
+        self.assertEqual(enriched['Venue'].iloc[0], 'M.C.G.')
+
+    def test_existing_scores_kept_without_results(self):
+        """Test afltables scores in the player stats are used when there are no results."""
+        df = player_rows().assign(**{'Home.score': [95, 95, 70, 70, 60], 'Away.score': [80, 80, 70, 70, 90]})
+
+        enriched = enrich_player_matches(df)
+
+        self.assertEqual(enriched['Margin'].tolist(), [15, -15, 0, 0, -30])
+
+    def test_team_in_neither_side_left_empty(self):
+        """Test a row playing for neither team of its match is not counted as away."""
+        df = player_rows()
+        df.loc[1, 'Playing.for'] = 'Essendon'
+
+        with self.assertLogs('afl_pipeline.enrichment', level='WARNING') as logs:
+            enriched = enrich_player_matches(df, results=results_rows())
+
+        self.assertTrue(pd.isna(enriched['Opponent'].iloc[1]))
+        self.assertTrue(pd.isna(enriched['Margin'].iloc[1]))
+        self.assertTrue(pd.isna(enriched['Result'].iloc[1]))
+        # The match's scores are still filled in
+        self.assertEqual(enriched['Home.score'].iloc[1], 95)
+        self.assertEqual(enriched['Margin'].tolist()[:1], [15])
+        self.assertIn('1 player rows play for neither team', logs.output[0])
+
+    def test_many_seasons_vectorised(self):
+        """Test a hundred seasons are joined quickly without a row-wise apply."""
+        seasons = list(range(1900, 2025))
+        df = make_player_stats(250000, season=seasons)
+        results = make_results(df)
+
+        with patch.object(pd.DataFrame, 'apply', side_effect=AssertionError("row-wise apply")), \
+                patch.object(pd.Series, 'apply', side_effect=AssertionError("row-wise apply")):
+            start = time.perf_counter()
+            enriched = enrich_player_matches(df, results=results)
+            seconds = time.perf_counter() - start
+
+        self.assertEqual(len(enriched), len(df))
+        self.assertEqual(int(enriched['Margin'].notna().sum()), len(df))
+        self.assertLess(seconds, 5)
+
+
+class TestPipelineEnrichment(unittest.TestCase):
+    """Test cases for fetching and enriching seasons in the pipeline."""
+
+    def test_fetch_bundle_cached(self):
+        """Test the bundle is fetched with one R call and then read from the cache."""
+        bundle = {
+            'player_stats': player_rows(),
+            'fixture': results_rows().drop(columns=['Home.Points', 'Away.Points']),
+            'results': results_rows(),
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('afl_pipeline.settings.ENRICH_PLAYER_STATS', True), \
+                patch('afl_pipeline.pipeline.func_initialise') as mock_init, \
+                patch('afl_pipeline.pipeline.fetch_season_bundle', return_value=bundle) as mock_fetch:
+            bigquery_client = FakeBigQueryClient(FakeStorageClient())
+            pipeline = AFLDataPipeline(
+                gcs_bucket_name='test-bucket',
+                storage_client=bigquery_client.storage_client,
+                bigquery_client=bigquery_client)
+            pipeline.fetch_cache = FetchCache(os.path.join(tmp_dir, 'cache'), current_season=2025)
+
+            first = pipeline._fetch_year(2021)
+            second = pipeline._fetch_year(2021)
+            bigquery_client.close()
+
+        mock_init.assert_called_once()
+        mock_fetch.assert_called_once()
+        self.assertEqual(mock_fetch.call_args[1]['season'], 2021)
+        self.assertEqual(first['Margin'].tolist()[:2], [15, -15])
+        pd.testing.assert_series_equal(first['Margin'], second['Margin'])
+        self.assertIn('enrich', pipeline.metrics.stage_totals())
+
+
+if __name__ == '__main__':
+    unittest.main()
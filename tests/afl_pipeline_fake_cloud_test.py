@@ -0,0 +1,422 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from google.api_core.exceptions import NotFound, TooManyRequests
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from afl_pipeline import settings
+from afl_pipeline.bigquery import BigQueryManager
+from afl_pipeline.data_processor import create_sample_data, preprocess_player_stats
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient, NetworkProfile
+from afl_pipeline.limiter import AdaptiveLimiter
+from afl_pipeline.pipeline import AFLDataPipeline
+from afl_pipeline.storage import StorageManager
+from benchmarks.synthetic import make_player_stats
+
+
+class FakeClock:
+    """Clock that only moves when sleep() is called."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestFakeCloud(unittest.TestCase):
+    """Test cases for the in-process GCS and BigQuery fakes."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.storage_client = FakeStorageClient()
+        self.bigquery_client = FakeBigQueryClient(self.storage_client)
+        self.storage_manager = StorageManager(self.storage_client, 'test-bucket')
+        self.bigquery_manager = BigQueryManager(self.bigquery_client)
+        self.df = preprocess_player_stats(create_sample_data(2021), 2021)
+
+        # Keep the content and run manifests out of the project directory
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.state_dir.name, 'content_manifest.json')
+        self.manifest_patcher = patch(
+            'afl_pipeline.settings.CONTENT_MANIFEST_PATH', self.manifest_path)
+        self.manifest_patcher.start()
+        self.run_manifest_patcher = patch(
+            'afl_pipeline.settings.RUN_MANIFEST_PATH',
+            os.path.join(self.state_dir.name, 'run_manifest.json'))
+        self.run_manifest_patcher.start()
+
+    def tearDown(self):
+        self.bigquery_client.close()
+        self.manifest_patcher.stop()
+        self.run_manifest_patcher.stop()
+        self.state_dir.cleanup()
+
+    def test_upload_and_load(self):
+        """Test that uploaded files can be loaded into tables."""
+        for file_format in ['csv', 'parquet']:
+            path = f'player_stats/player_stats_2021.{file_format}'
+            self.assertTrue(self.storage_manager.upload_dataframe(
+                self.df, path, file_format=file_format, stream=True, chunk_rows=3))
+            self.assertTrue(self.storage_manager.check_blob_exists(path))
+
+            self.assertTrue(self.bigquery_manager.upload_from_gcs(
+                f'gs://test-bucket/{path}', f'player_stats_{file_format}',
+                dataset_id='afl_player_data', source_format=file_format))
+            table = self.bigquery_client.get_table(
+                f'afl_player_data.player_stats_{file_format}')
+            self.assertEqual(table.num_rows, len(self.df))
+            self.assertIn('Local_start_time', table.dataframe.columns)
+
+    def test_sharded_upload(self):
+        """Test sharded uploads load through their wildcard and replace stale shards."""
+        df = preprocess_player_stats(make_player_stats(2500), 2023)
+        bucket = self.storage_client.bucket('test-bucket')
+        bucket.blob('player_stats/player_stats_2023').upload_from_string(b'old')
+
+        uri = self.storage_manager.upload_dataframe_sharded(
+            df, 'player_stats/player_stats_2023', shard_rows=1000, workers=3)
+
+        self.assertEqual(uri, 'gs://test-bucket/player_stats/player_stats_2023/part-*')
+        self.assertEqual(sorted(bucket.objects), [
+            f'player_stats/player_stats_2023/part-0000{index}' for index in range(3)])
+        stats = self.storage_manager.upload_stats['player_stats/player_stats_2023']
+        self.assertEqual((stats['rows'], stats['shards']), (2500, 3))
+        self.assertTrue(self.bigquery_manager.upload_from_gcs(uri, 'player_stats_2023_bq'))
+        table = self.bigquery_client.get_table('afl_player_data.player_stats_2023_bq')
+        self.assertEqual(table.num_rows, 2500)
+        self.assertEqual(sorted(table.dataframe['ID']), sorted(df['ID']))
+
+        # Fewer shards the next time: the extra one is deleted
+        self.storage_manager.upload_dataframe_sharded(
+            df.iloc[:1500], 'player_stats/player_stats_2023', shard_rows=1000)
+        self.assertEqual(len(bucket.objects), 2)
+
+    def test_sharded_upload_parallel(self):
+        """Test shards are uploaded at the same time rather than one after another."""
+        self.storage_client.profile = NetworkProfile(latency=0.1)
+        df = preprocess_player_stats(make_player_stats(800), 2023)
+
+        seconds = {}
+        for workers in [1, 8]:
+            start = time.perf_counter()
+            self.storage_manager.upload_dataframe_sharded(
+                df, f'sharded_{workers}', shard_rows=100, workers=workers)
+            seconds[workers] = time.perf_counter() - start
+
+        self.assertEqual(len(self.storage_client.bucket('test-bucket').objects), 16)
+        self.assertLess(seconds[8], seconds[1] / 2)
+
+    def test_load_missing_uri_fails(self):
+        """Test that loading a missing file fails the job."""
+        self.assertFalse(self.bigquery_manager.upload_from_gcs(
+            'gs://test-bucket/missing.parquet', 'missing', dataset_id='afl_player_data'))
+        with self.assertRaises(NotFound):
+            self.bigquery_client.get_table('afl_player_data.missing')
+
+    def test_partitioned_combined_table(self):
+        """Test creating, then partially replacing, a partitioned combined table."""
+        years = [2020, 2021]
+        for year in years:
+            df = preprocess_player_stats(create_sample_data(year), year)
+            self.storage_manager.upload_dataframe(df, f'player_stats_{year}')
+            self.bigquery_manager.upload_from_gcs(
+                f'gs://test-bucket/player_stats_{year}', f'player_stats_{year}_bq',
+                dataset_id='afl_player_data')
+
+        self.assertTrue(self.bigquery_manager.create_combined_table(years, partitioned=True))
+        table = self.bigquery_client.get_table('afl_data.combined_player_stats_bq')
+        self.assertEqual(table.num_rows, 20)
+        self.assertEqual(table.range_partitioning.field, 'year')
+        self.assertEqual(table.clustering_fields, settings.COMBINED_CLUSTER_FIELDS)
+
+        # A rerun for one year replaces only that partition
+        self.assertTrue(self.bigquery_manager.create_combined_table([2021], partitioned=True))
+        jobs = [job.job_type for job in self.bigquery_client.jobs]
+        self.assertEqual(jobs[-1], 'copy')
+        self.assertEqual(table.num_rows, 20)
+        self.assertEqual(sorted(table.dataframe['year'].unique()), years)
+
+    def test_bulk_load_replaces_partitions(self):
+        """Test a bulk load of one season keeps the other seasons of the combined table."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+        years = [2019, 2020, 2021]
+        self.assertEqual(pipeline.run_pipeline(years, use_sample_data=True, bulk_load=True), years)
+
+        def fewer_rows(year, round_number=None):
+            return create_sample_data(year, round_number).iloc[:6]
+
+        with patch('afl_pipeline.pipeline.create_sample_data', side_effect=fewer_rows):
+            self.assertEqual(pipeline.run_pipeline([2021], use_sample_data=True, bulk_load=True),
+                             [2021])
+
+        table = self.bigquery_client.get_table('afl_data.combined_player_stats_bq')
+        self.assertEqual(table.dataframe.groupby('year').size().to_dict(),
+                         {2019: 10, 2020: 10, 2021: 6})
+        self.assertEqual(table.range_partitioning.field, 'year')
+        # The second run loaded one partition
+        self.assertEqual(self.bigquery_client.jobs[-1].output_rows, 6)
+
+    def test_combined_table_catches_up_with_skipped_loads(self):
+        """Test that a year loaded without combining is combined by the next run."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+        pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+
+        def fewer_rows(year, round_number=None):
+            df = create_sample_data(year, round_number)
+            return df.iloc[:6] if year == 2021 else df
+
+        with patch('afl_pipeline.pipeline.create_sample_data', side_effect=fewer_rows):
+            pipeline.run_pipeline([2021], use_sample_data=True, create_combined=False)
+            # The load of 2021 is skipped now, but the combined table lacks its new data
+            pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+
+        self.assertEqual(pipeline.metrics.info['skipped_years'], [2020, 2021])
+        table = self.bigquery_client.get_table('afl_data.combined_player_stats_bq')
+        self.assertEqual(table.dataframe.groupby('year').size().to_dict(), {2020: 10, 2021: 6})
+        # The first run created the table; the last one copied only the 2021 partition
+        self.assertEqual([job.job_type for job in self.bigquery_client.jobs
+                          if job.job_type in ('query', 'copy')], ['query', 'copy'])
+
+    def test_bandwidth_and_latency(self):
+        """Test that transfers share the bandwidth and pay the latency."""
+        clock = FakeClock()
+        profile = NetworkProfile(latency=0.1, bandwidth=1000, sleep=clock.sleep, clock=clock.time)
+        bucket = FakeStorageClient(profile=profile).bucket('test-bucket')
+
+        bucket.blob('a').upload_from_string(b'x' * 500)
+        bucket.blob('b').upload_from_string(b'x' * 1000)
+
+        self.assertEqual(clock.sleeps, [0.6, 1.1])
+        self.assertEqual(profile.requests, 2)
+        self.assertEqual(profile.bytes_transferred, 1500)
+
+    def test_rate_limit(self):
+        """Test that requests beyond the rate limit fail with TooManyRequests."""
+        clock = FakeClock()
+        profile = NetworkProfile(requests_per_second=2, sleep=clock.sleep, clock=clock.time)
+        storage_client = FakeStorageClient(profile=profile)
+        limiter = AdaptiveLimiter('gcs', 4, sleep=clock.sleep, rng=random.Random(0))
+        storage_manager = StorageManager(storage_client, 'test-bucket', limiter=limiter)
+
+        # get_bucket and exists use up the two requests in this second
+        self.assertFalse(storage_manager.check_blob_exists('a'))
+        with self.assertRaises(TooManyRequests):
+            profile.request('get_bucket')
+        self.assertEqual(profile.throttled, 1)
+
+        # Managers back off until the window has moved on with the clock
+        self.assertTrue(storage_manager.upload_dataframe(self.df, 'a'))
+        self.assertGreaterEqual(clock.time(), 1.0)
+        self.assertGreater(limiter.stats()['retries'], 0)
+        self.assertEqual(limiter.stats()['limit'], 2)
+
+        # and surface the error as a failure once they run out of tries
+        storage_manager = StorageManager(
+            storage_client, 'test-bucket', limiter=AdaptiveLimiter('gcs', 4, max_attempts=1))
+        profile.request('get_bucket')
+        self.assertFalse(storage_manager.upload_dataframe(self.df, 'b'))
+
+    def test_pipeline_end_to_end(self):
+        """Test running the whole pipeline against the fakes."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+
+        successful_years = pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+
+        self.assertEqual(successful_years, [2020, 2021])
+        self.assertEqual(len(self.storage_client.bucket('test-bucket').objects), 2)
+        combined = self.bigquery_client.get_table(
+            f'{settings.COMBINED_STATS_DATASET_ID}.{settings.COMBINED_STATS_TABLE_ID}')
+        self.assertEqual(combined.num_rows, 20)
+
+        # Bucket and dataset lookups are not repeated for every year
+        operations = self.storage_client.profile.operations
+        self.assertEqual(operations['get_bucket'], 1)
+        self.assertEqual(operations['get_dataset'], 2)
+
+    def test_pipeline_gzip_csv(self):
+        """Test gzip CSV uploads load into BigQuery and their sizes are reported."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+
+        with patch('afl_pipeline.settings.UPLOAD_FORMAT', 'csv'), \
+                patch('afl_pipeline.settings.CSV_COMPRESSION', 'gzip'):
+            successful_years = pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+
+        self.assertEqual(successful_years, [2020, 2021])
+        self.assertEqual(self.bigquery_client.get_table(
+            'afl_player_data.player_stats_2021_bq').num_rows, 10)
+        stored = self.storage_client.bucket('test-bucket').objects['player_stats/player_stats_2021']
+        self.assertEqual(stored['content_encoding'], 'gzip')
+        size = pipeline.metrics.info['upload_sizes']['player_stats/player_stats_2021']
+        self.assertEqual(size['bytes'], len(stored['data']))
+        self.assertGreater(size['raw_bytes'], size['bytes'])
+
+    def test_pipeline_rejects_zstd_load(self):
+        """Test a run refuses zstd CSV uploads, which BigQuery cannot load."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+
+        with patch('afl_pipeline.settings.UPLOAD_FORMAT', 'csv'), \
+                patch('afl_pipeline.settings.CSV_COMPRESSION', 'zstd'):
+            with self.assertRaises(ValueError):
+                pipeline.run_pipeline([2021], use_sample_data=True)
+            self.assertFalse(pipeline.process_year(2021, skip_gcs=True))
+
+        self.assertEqual(self.bigquery_client.jobs, [])
+
+    def test_pipeline_sharded_uploads(self):
+        """Test the pipeline shards large years and skips them when unchanged."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+
+        with patch('afl_pipeline.settings.SHARDED_UPLOADS', True), \
+                patch('afl_pipeline.settings.UPLOAD_SHARD_ROWS', 4):
+            self.assertEqual(pipeline.run_pipeline([2021], use_sample_data=True), [2021])
+            uploads = self.storage_client.profile.operations['upload']
+            self.assertEqual(pipeline.run_pipeline([2021], use_sample_data=True), [2021])
+
+        self.assertEqual(sorted(self.storage_client.bucket('test-bucket').objects), [
+            f'player_stats/player_stats_2021/part-0000{index}' for index in range(3)])
+        self.assertEqual(self.bigquery_client.get_table(
+            'afl_player_data.player_stats_2021_bq').num_rows, 10)
+        self.assertEqual(self.storage_client.profile.operations['upload'], uploads)
+        self.assertEqual(pipeline.metrics.info['skipped_years'], [2021])
+
+    def test_pipeline_sharded_upload_retried_after_failure(self):
+        """Test a sharded upload that failed part way is neither loaded nor skipped later."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+        upload_dataframe = StorageManager.upload_dataframe
+        failures = []
+
+        def fail_last_shard(manager, dataframe, file_path, *args, **kwargs):
+            if file_path.endswith('part-00002') and not failures:
+                failures.append(file_path)
+                return False
+            return upload_dataframe(manager, dataframe, file_path, *args, **kwargs)
+
+        with patch('afl_pipeline.settings.SHARDED_UPLOADS', True), \
+                patch('afl_pipeline.settings.UPLOAD_SHARD_ROWS', 4), \
+                patch.object(StorageManager, 'upload_dataframe', autospec=True,
+                             side_effect=fail_last_shard):
+            self.assertEqual(pipeline.run_pipeline([2021], use_sample_data=True), [])
+            # The shards that did upload are deleted with the failed one
+            self.assertEqual(self.storage_client.bucket('test-bucket').objects, {})
+
+            self.assertEqual(pipeline.run_pipeline([2021], use_sample_data=True), [2021])
+
+        self.assertEqual(pipeline.metrics.info['skipped_uploads'], [])
+        self.assertEqual(sorted(self.storage_client.bucket('test-bucket').objects), [
+            f'player_stats/player_stats_2021/part-0000{index}' for index in range(3)])
+        self.assertEqual(self.bigquery_client.get_table(
+            'afl_player_data.player_stats_2021_bq').num_rows, 10)
+
+    def test_pipeline_batch_load(self):
+        """Test that a batch load waits about as long as the slowest job."""
+        self.bigquery_client.profile = NetworkProfile(job_latency=0.2)
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+        years = [2017, 2018, 2019, 2020, 2021]
+
+        successful_years = pipeline.run_pipeline(
+            years, use_sample_data=True, create_combined=False, batch_load=True)
+
+        self.assertEqual(successful_years, years)
+        for year in years:
+            self.assertEqual(self.bigquery_client.get_table(
+                f'afl_player_data.player_stats_{year}_bq').num_rows, 10)
+        stages = pipeline.metrics.stage_totals()
+        self.assertEqual(stages['bigquery_load']['count'], len(years))
+        self.assertEqual(stages['bigquery_load']['rows'], 10 * len(years))
+        self.assertLess(stages['batch_load']['seconds'], 0.2 * len(years) / 2)
+
+    def test_pipeline_batch_load_ignored_with_bulk_load(self):
+        """Test that a batch load combined with a bulk load is turned off with a warning."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+
+        with self.assertLogs('afl_pipeline.pipeline', level='WARNING') as logs:
+            successful_years = pipeline.run_pipeline(
+                [2020, 2021], use_sample_data=True, bulk_load=True, batch_load=True)
+
+        self.assertEqual(successful_years, [2020, 2021])
+        self.assertTrue(any('ignoring batch_load' in line for line in logs.output))
+        self.assertNotIn('batch_load', pipeline.metrics.stage_totals())
+
+    def test_pipeline_skips_unchanged_years(self):
+        """Test that a rerun with unchanged data skips every upload and load."""
+        pipeline = AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+        pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+        operations = self.storage_client.profile.operations
+        uploads = operations['upload']
+        jobs = len(self.bigquery_client.jobs)
+
+        successful_years = pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+
+        self.assertEqual(successful_years, [2020, 2021])
+        self.assertEqual(operations['upload'], uploads)
+        self.assertEqual(len(self.bigquery_client.jobs), jobs)
+        self.assertEqual(pipeline.metrics.info['skipped_years'], [2020, 2021])
+        self.assertNotIn('upload', pipeline.metrics.stage_totals())
+
+        # Without the local manifest the blob metadata skips the uploads, but
+        # the tables are loaded again since their contents are not known
+        os.remove(self.manifest_path)
+        pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+        self.assertEqual(operations['upload'], uploads)
+        self.assertEqual(pipeline.metrics.info['skipped_years'], [])
+        jobs = len(self.bigquery_client.jobs)
+        pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+        self.assertEqual(len(self.bigquery_client.jobs), jobs)
+
+        # Changed data is uploaded and loaded again
+        blob = self.storage_client.bucket('test-bucket').get_blob('player_stats/player_stats_2021')
+        with patch('afl_pipeline.pipeline.create_sample_data',
+                   side_effect=lambda year, round_number=None: create_sample_data(year).head(5)):
+            pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+        self.assertEqual(operations['upload'], uploads + 2)
+        self.assertEqual(pipeline.metrics.info['skipped_years'], [])
+        self.assertNotEqual(
+            self.storage_client.bucket('test-bucket').get_blob(
+                'player_stats/player_stats_2021').metadata['content_hash'],
+            blob.metadata['content_hash'])
+
+
+if __name__ == '__main__':
+    unittest.main()
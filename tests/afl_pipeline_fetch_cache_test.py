@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from unittest.mock import MagicMock
+
+from afl_pipeline.fetch_cache import FetchCache
+
+
+class FakeClock:
+    """Manually advanced clock for TTL tests."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestFetchCache(unittest.TestCase):
+    """Test cases for FetchCache class."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.cache_dir = tempfile.mkdtemp()
+        self.clock = FakeClock()
+        self.cache = FetchCache(self.cache_dir, ttl_seconds=60, max_bytes=10 ** 9,
+                                current_season=2025, clock=self.clock)
+        self.df = pd.DataFrame({
+            'Season': [2020, 2020],
+            'Venue': pd.Categorical(['M.C.G.', 'Gabba']),
+            'Kicks': [12, 15],
+        })
+
+    def tearDown(self):
+        """Tear down test fixtures."""
+        shutil.rmtree(self.cache_dir)
+
+    def test_miss_then_hit(self):
+        """Test a put entry is returned on the next get."""
+        self.assertIsNone(self.cache.get('player_stats', season=2020))
+        self.assertTrue(self.cache.put('player_stats', self.df, season=2020))
+
+        cached = self.cache.get('player_stats', season=2020)
+
+        pd.testing.assert_frame_equal(cached, self.df)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertIsNone(self.cache.get('player_stats', season=2021))
+        self.assertIsNone(self.cache.get('results', season=2020))
+
+    def test_entries_persist_across_instances(self):
+        """Test the cache index is reloaded from disk."""
+        self.cache.put('player_stats', self.df, season=2020)
+        reopened = FetchCache(self.cache_dir, current_season=2025)
+        self.assertIsNotNone(reopened.get('player_stats', season=2020))
+
+    def test_past_seasons_never_expire(self):
+        """Test finished seasons ignore the TTL."""
+        self.cache.put('player_stats', self.df, season=[2019, 2020])
+        self.clock.now += 10 ** 8
+        self.assertIsNotNone(self.cache.get('player_stats', season=[2019, 2020]))
+
+    def test_current_season_expires(self):
+        """Test current-season entries expire after the TTL."""
+        self.cache.put('player_stats', self.df, season=2025)
+        self.clock.now += 30
+        self.assertIsNotNone(self.cache.get('player_stats', season=2025))
+        self.clock.now += 31
+        self.assertIsNone(self.cache.get('player_stats', season=2025))
+        self.assertEqual(os.listdir(self.cache_dir), ['index.json'])
+
+    def test_current_season_rounds_not_cached(self):
+        """Test single rounds and empty results of the current season are always fetched again."""
+        empty = self.df.iloc[:0]
+        self.assertFalse(self.cache.put('player_stats', self.df, season=2025, round_number=3))
+        self.assertFalse(self.cache.put('player_stats', empty, season=2025, round_number=4))
+        self.assertFalse(self.cache.put('player_stats', empty, season=2025))
+        self.assertTrue(self.cache.put('player_stats', self.df, season=2020, round_number=3))
+
+        fetch = MagicMock(side_effect=[self.df.iloc[:1], self.df])
+        for rows in (1, 2):
+            df = self.cache.get_or_fetch('player_stats', fetch, season=2025, round_number=3)
+            self.assertEqual(len(df), rows)
+
+        self.assertFalse(self.cache.contains('player_stats', season=2025, round_number=3))
+        self.assertIsNone(self.cache.get('player_stats', season=2025))
+        self.assertIsNotNone(self.cache.get('player_stats', season=2020, round_number=3))
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted when over the size cap."""
+        self.cache.put('player_stats', self.df, season=2018)
+        entry_size = self.cache.size()
+        self.cache.max_bytes = entry_size * 2
+
+        self.clock.now += 1
+        self.cache.put('player_stats', self.df, season=2019)
+        self.clock.now += 1
+        self.cache.get('player_stats', season=2018)
+        self.clock.now += 1
+        self.cache.put('player_stats', self.df, season=2020)
+
+        self.assertIsNotNone(self.cache.get('player_stats', season=2018))
+        self.assertIsNone(self.cache.get('player_stats', season=2019))
+        self.assertIsNotNone(self.cache.get('player_stats', season=2020))
+        self.assertLessEqual(self.cache.size(), self.cache.max_bytes)
+
+    def test_get_or_fetch_skips_initialisation_on_hit(self):
+        """Test the fetch and its setup only run on a miss."""
+        fetch = MagicMock(return_value=self.df)
+        initialise = MagicMock()
+
+        for _ in range(2):
+            df = self.cache.get_or_fetch('player_stats', fetch, before_fetch=initialise,
+                                         season=2020, source='afltables')
+            self.assertEqual(len(df), 2)
+
+        fetch.assert_called_once_with(season=2020, source='afltables')
+        initialise.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
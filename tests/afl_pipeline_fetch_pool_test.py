@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+
+from afl_pipeline.fetch_pool import RFetchPool, FetchError
+
+# Marker file used by _crash_once_fetch; set before the pool forks its workers
+CRASH_MARKER = None
+
+
+def _noop_initializer():
+    pass
+
+
+def _fake_fetch(season=None, round_number=None, source=None, comp=None):
+    return pd.DataFrame({
+        'Season': [season] * 3,
+        'Venue': pd.Categorical(['M.C.G.', 'Gabba', 'M.C.G.']),
+        'pid': [os.getpid()] * 3,
+    })
+
+
+def _crash_once_fetch(season=None, round_number=None, source=None, comp=None):
+    if season == 2013 and not os.path.exists(CRASH_MARKER):
+        open(CRASH_MARKER, 'w').close()
+        os._exit(1)
+    return _fake_fetch(season)
+
+
+def _failing_fetch(season=None, round_number=None, source=None, comp=None):
+    raise ValueError("no data for season")
+
+
+class TestRFetchPool(unittest.TestCase):
+    """Test cases for RFetchPool class."""
+
+    def make_pool(self, fetch_function, workers=2):
+        return RFetchPool(workers=workers, start_method='fork',
+                          initializer=_noop_initializer,
+                          fetch_function=fetch_function)
+
+    def test_fetch_seasons_in_parallel(self):
+        """Test fetching several seasons across worker processes."""
+        with self.make_pool(_fake_fetch) as pool:
+            frames = pool.fetch_seasons([2019, 2020, 2021, 2022])
+
+        self.assertEqual(list(frames), [2019, 2020, 2021, 2022])
+        for season, df in frames.items():
+            self.assertEqual(len(df), 3)
+            self.assertTrue((df['Season'] == season).all())
+            self.assertEqual(df['Venue'].dtype, 'category')
+            self.assertNotEqual(df['pid'].iloc[0], os.getpid())
+
+    def test_iter_seasons_fetches_ahead_in_order(self):
+        """Test seasons are yielded in order with only a few fetched ahead."""
+        with self.make_pool(_fake_fetch) as pool:
+            requested = []
+            fetch = pool.fetch
+
+            def counting_fetch(season, *args):
+                requested.append(season)
+                return fetch(season, *args)
+
+            pool.fetch = counting_fetch
+            seasons = pool.iter_seasons(range(2000, 2010), lookahead=2)
+            first_season, first_df = next(seasons)
+            # The season taken and at most two fetched ahead of it
+            self.assertLessEqual(len(requested), 3)
+            rest = list(seasons)
+
+        self.assertEqual(first_season, 2000)
+        self.assertTrue((first_df['Season'] == 2000).all())
+        self.assertEqual([season for season, _ in rest], list(range(2001, 2010)))
+
+    def test_crashed_worker_is_restarted(self):
+        """Test a crashing worker is replaced and its request retried."""
+        global CRASH_MARKER
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            CRASH_MARKER = os.path.join(tmp_dir, 'crashed')
+            with self.make_pool(_crash_once_fetch) as pool:
+                frames = pool.fetch_seasons([2012, 2013, 2014])
+
+            self.assertTrue(os.path.exists(CRASH_MARKER))
+            self.assertEqual(pool.restarts, 1)
+            self.assertTrue(all(df is not None for df in frames.values()))
+
+    def test_fetch_error_is_reported(self):
+        """Test an exception inside the fetch is returned as a FetchError."""
+        with self.make_pool(_failing_fetch, workers=1) as pool:
+            with self.assertRaises(FetchError):
+                pool.fetch(season=2021)
+            self.assertEqual(pool.fetch_seasons([2021]), {2021: None})
+            self.assertEqual(pool.restarts, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
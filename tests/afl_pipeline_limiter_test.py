@@ -0,0 +1,227 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from google.api_core.exceptions import Forbidden, InternalServerError, NotFound, TooManyRequests
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient, NetworkProfile
+from afl_pipeline.limiter import AdaptiveLimiter, is_throttled
+from afl_pipeline.pipeline import AFLDataPipeline
+
+
+class FlakyCall:
+    """Callable that raises the given errors in turn before succeeding."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+class QuotaService:
+    """Service that throttles any request made while `quota` others are in flight."""
+
+    def __init__(self, quota, duration=0.002):
+        self.quota = quota
+        self.duration = duration
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def request(self):
+        with self._lock:
+            if self.in_flight >= self.quota:
+                self.throttled += 1
+                raise TooManyRequests("Quota exceeded")
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        time.sleep(self.duration)
+        with self._lock:
+            self.in_flight -= 1
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    """Test cases for the AdaptiveLimiter."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.sleeps = []
+        self.limiter = AdaptiveLimiter(
+            'test', 8, backoff_base=1.0, backoff_max=3.0, sleep=self.sleeps.append,
+            rng=random.Random(0))
+
+    def test_retries_with_backoff(self):
+        """Test throttled calls are retried after exponential backoff with full jitter."""
+        call = FlakyCall(*(TooManyRequests("slow down") for _ in range(3)))
+
+        self.assertEqual(self.limiter.call(call), 'ok')
+
+        self.assertEqual(call.calls, 4)
+        self.assertEqual(len(self.sleeps), 3)
+        for delay, cap in zip(self.sleeps, [1.0, 2.0, 3.0]):
+            self.assertTrue(0 <= delay <= cap)
+        stats = self.limiter.stats()
+        self.assertEqual((stats['calls'], stats['retries'], stats['throttled']), (1, 3, 3))
+        self.assertAlmostEqual(stats['backoff_seconds'], sum(self.sleeps))
+
+    def test_gives_up(self):
+        """Test errors are raised once the tries run out, and other errors at once."""
+        limiter = AdaptiveLimiter('test', 8, max_attempts=2, sleep=self.sleeps.append)
+        with self.assertRaises(TooManyRequests):
+            limiter.call(FlakyCall(*(TooManyRequests("slow down") for _ in range(2))))
+        not_found = FlakyCall(NotFound("gone"))
+        with self.assertRaises(NotFound):
+            limiter.call(not_found)
+
+        self.assertEqual(not_found.calls, 1)
+        self.assertEqual(limiter.stats()['failures'], 1)
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+    def test_error_classes(self):
+        """Test rate-limit 403s throttle, server errors are only retried."""
+        self.assertTrue(is_throttled(Forbidden("quota", errors=[{'reason': 'rateLimitExceeded'}])))
+        self.assertFalse(is_throttled(Forbidden("Access denied")))
+
+        self.limiter.call(FlakyCall(InternalServerError("oops")))
+
+        self.assertEqual(self.limiter.stats()['retries'], 1)
+        self.assertEqual(self.limiter.stats()['limit'], 8)
+
+    def test_additive_increase_multiplicative_decrease(self):
+        """Test the limit halves once per round of throttled calls and grows back on success."""
+        generation = self.limiter._acquire()
+        other = self.limiter._acquire()
+        self.limiter._release(generation, 'throttled')
+        # Sent at the old limit, so it does not cut the limit again
+        self.limiter._release(other, 'throttled')
+        self.assertEqual(self.limiter.stats()['limit'], 4)
+        self.assertEqual(self.limiter.stats()['decreases'], 1)
+
+        # About one slot per round of `limit` successful calls
+        for _ in range(5):
+            self.limiter.call(lambda: None)
+        self.assertEqual(self.limiter.stats()['limit'], 5)
+        for _ in range(100):
+            self.limiter.call(lambda: None)
+        self.assertEqual(self.limiter.stats()['limit'], 8)
+        self.assertEqual(self.limiter.stats()['lowest_limit'], 4)
+
+    def test_nested_calls(self):
+        """Test a call made from inside another runs in the outer call's slot."""
+        limiter = AdaptiveLimiter('test', 1)
+
+        self.assertEqual(limiter.call(lambda: limiter.call(lambda: 'inner')), 'inner')
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+    def test_settles_below_quota(self):
+        """Test concurrent callers settle near the service's quota with few throttled calls."""
+        service = QuotaService(quota=4)
+        limiter = AdaptiveLimiter(
+            'test', 16, max_attempts=20, backoff_base=0.001, backoff_max=0.01)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda _: limiter.call(service.request), range(400)))
+
+        stats = limiter.stats()
+        self.assertEqual(stats['calls'], 400)
+        self.assertEqual(stats['failures'], 0)
+        self.assertLessEqual(stats['lowest_limit'], 4)
+        self.assertLessEqual(stats['limit'], 6)
+        self.assertLess(stats['throttled'], 400 * 0.15)
+
+        # Without the limiter most requests beyond the quota would fail
+        unlimited = QuotaService(quota=4)
+
+        def unlimited_request(_):
+            try:
+                unlimited.request()
+            except TooManyRequests:
+                pass
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(unlimited_request, range(400)))
+        self.assertGreater(unlimited.throttled, stats['throttled'])
+
+
+class TestPipelineLimits(unittest.TestCase):
+    """Test cases for running the pipeline through the limiters."""
+
+    def test_pipeline_retries_throttled_requests(self):
+        """Test a run against throttling fakes succeeds and exports its limiter metrics."""
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('afl_pipeline.settings.CLOUD_BACKOFF_BASE_SECONDS', 0.001), \
+                patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                      os.path.join(tmp_dir, 'content_manifest.json')), \
+                patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                      os.path.join(tmp_dir, 'run_manifest.json')):
+            storage_client = FakeStorageClient(profile=NetworkProfile(error_rate=0.2, seed=1))
+            bigquery_client = FakeBigQueryClient(storage_client)
+            pipeline = AFLDataPipeline(
+                gcs_bucket_name='test-bucket',
+                storage_client=storage_client,
+                bigquery_client=bigquery_client)
+
+            years = [2019, 2020, 2021]
+            successful_years = pipeline.run_pipeline(years, use_sample_data=True)
+            bigquery_client.close()
+
+        self.assertEqual(successful_years, years)
+        self.assertGreater(storage_client.profile.throttled, 0)
+        limits = pipeline.metrics.info['concurrency_limits']
+        self.assertEqual(
+            limits['gcs']['throttled'] + limits['bigquery']['throttled'],
+            storage_client.profile.throttled)
+        self.assertIn('afl_pipeline_cloud_retries_total{service="gcs"}',
+                      pipeline.metrics.to_prometheus())
+
+    def test_pipeline_resubmits_rate_limited_jobs(self):
+        """Test jobs that fail with rateLimitExceeded are submitted again."""
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('afl_pipeline.settings.CLOUD_BACKOFF_BASE_SECONDS', 0.001), \
+                patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                      os.path.join(tmp_dir, 'content_manifest.json')), \
+                patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                      os.path.join(tmp_dir, 'run_manifest.json')):
+            storage_client = FakeStorageClient(profile=NetworkProfile(job_error_rate=0.5, seed=3))
+            bigquery_client = FakeBigQueryClient(storage_client)
+            pipeline = AFLDataPipeline(
+                gcs_bucket_name='test-bucket',
+                storage_client=storage_client,
+                bigquery_client=bigquery_client)
+
+            # Single loads and the combined table query, then a batch of loads
+            # and partition copies
+            years = [2019, 2020, 2021]
+            successful_years = pipeline.run_pipeline(years, use_sample_data=True)
+            self.assertEqual(
+                pipeline.run_pipeline([2017, 2018], use_sample_data=True, batch_load=True),
+                [2017, 2018])
+            failed = {job.job_type for job in bigquery_client.jobs if job.error_result}
+            combined = bigquery_client.get_table('afl_data.combined_player_stats_bq')
+            bigquery_client.close()
+
+        self.assertEqual(successful_years, years)
+        self.assertGreater(storage_client.profile.failed_jobs, 0)
+        self.assertEqual(failed, {'load', 'query', 'copy'})
+        self.assertEqual(combined.num_rows, 50)
+        limits = pipeline.metrics.info['concurrency_limits']
+        self.assertGreater(limits['bigquery']['throttled'], 0)
+        self.assertEqual(limits['bigquery']['failures'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
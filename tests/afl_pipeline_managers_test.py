@@ -1,9 +1,96 @@
+import gzip
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import tracemalloc
 import unittest
+import numpy as np
 import pandas as pd
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
+from google.api_core.exceptions import Conflict, Forbidden, ServiceUnavailable
+from google.cloud import bigquery
 
 from afl_pipeline.storage import StorageManager
-from afl_pipeline.bigquery import BigQueryManager
+from afl_pipeline.bigquery import BigQueryManager, schema_from_dataframe, build_combined_table_query
+
+
+class FakeBlobWriter(io.RawIOBase):
+    """Writable stream standing in for a GCS resumable upload."""
+
+    def __init__(self, keep_data=True):
+        self.keep_data = keep_data
+        self.data = io.BytesIO()
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.keep_data:
+            self.data.write(data)
+        return len(data)
+
+
+class FakeBlob:
+    """Blob whose open() returns a FakeBlobWriter."""
+
+    def __init__(self, keep_data=True):
+        self.keep_data = keep_data
+        self.writer = None
+        self.open_kwargs = None
+
+    def open(self, mode, **kwargs):
+        self.open_kwargs = kwargs
+        self.writer = FakeBlobWriter(self.keep_data)
+        return self.writer
+
+
+# Streams a frame of argv[1] rows to Parquet in chunks of argv[2] rows in a fresh
+# process and prints the peak of Arrow's memory pool (which tracemalloc cannot
+# see) and the frame's size
+ARROW_PEAK_SCRIPT = """
+import io
+import sys
+import pyarrow as pa
+from afl_pipeline.storage import write_dataframe
+from benchmarks.synthetic import make_player_stats
+
+class Discard(io.RawIOBase):
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return len(data)
+
+df = make_player_stats(int(sys.argv[1]))
+write_dataframe(df, Discard(), 'parquet', 'snappy', int(sys.argv[2]), sort_within_chunks=True)
+print(pa.default_memory_pool().max_memory(), df.memory_usage(deep=True).sum())
+"""
+
+
+def arrow_peak(rows, chunk_rows):
+    """Peak Arrow memory of streaming a synthetic frame to Parquet, and the frame's size."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, '-c', ARROW_PEAK_SCRIPT, str(rows), str(chunk_rows)],
+        cwd=root, env=dict(os.environ, PYTHONPATH=root), capture_output=True, text=True,
+        check=True).stdout
+    peak, frame_bytes = output.split()
+    return int(peak), int(frame_bytes)
+
+
+def make_stats_frame(rows):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'Season': np.full(rows, 2020),
+        'Round': rng.integers(1, 24, rows).astype(str).astype(object),
+        'ID': rng.integers(1000, 13000, rows),
+        'Venue': rng.choice(np.array(['M.C.G.', 'Gabba', 'S.C.G.'], dtype=object), rows),
+        'Kicks': rng.integers(0, 35, rows),
+    })
 
 
 class TestStorageManager(unittest.TestCase):
@@ -44,6 +131,152 @@ class TestStorageManager(unittest.TestCase):
         mock_bucket.blob.assert_called_once_with('test/path.csv')
         mock_blob.upload_from_string.assert_called_once()
 
+    def test_upload_dataframe_parquet(self):
+        """Test uploading a dataframe as sorted Parquet with BigQuery-safe names."""
+        df = pd.DataFrame({
+            'Season': [2021, 2021, 2021],
+            'Round': ['10', '2', '2'],
+            'ID': [3, 2, 1],
+            'Playing.for': ['Carlton', 'Richmond', 'Geelong'],
+        })
+        mock_bucket = MagicMock()
+        mock_blob = MagicMock()
+        self.mock_client.get_bucket.return_value = mock_bucket
+        mock_bucket.blob.return_value = mock_blob
+
+        result = self.storage_manager.upload_dataframe(
+            df, 'test/path', file_format='parquet', compression='zstd')
+
+        self.assertTrue(result)
+        data = mock_blob.upload_from_string.call_args[0][0]
+        self.assertEqual(
+            mock_blob.upload_from_string.call_args[1]['content_type'],
+            'application/vnd.apache.parquet')
+        uploaded = pd.read_parquet(io.BytesIO(data))
+        self.assertEqual(list(uploaded.columns), [
+                         'Season', 'Round', 'ID', 'Playing_for'])
+        self.assertEqual(list(uploaded['ID']), [1, 2, 3])
+        stats = self.storage_manager.upload_stats['test/path']
+        self.assertEqual(stats['bytes'], len(data))
+        self.assertEqual(stats['rows'], 3)
+        self.assertFalse(stats['streamed'])
+
+    def stream_to_fake_blob(self, df, file_format, chunk_rows, keep_data=True, compression=None):
+        """Upload a frame in streaming mode to a FakeBlob and return the blob."""
+        mock_bucket = MagicMock()
+        fake_blob = FakeBlob(keep_data)
+        self.mock_client.get_bucket.return_value = mock_bucket
+        mock_bucket.blob.return_value = fake_blob
+        result = self.storage_manager.upload_dataframe(
+            df, 'test/path', file_format=file_format, compression=compression,
+            stream=True, chunk_rows=chunk_rows)
+        self.assertTrue(result)
+        return fake_blob
+
+    def test_upload_dataframe_streaming_csv(self):
+        """Test a streamed CSV upload matches the in-memory CSV."""
+        df = make_stats_frame(25)
+        fake_blob = self.stream_to_fake_blob(df, 'csv', chunk_rows=10)
+
+        self.assertEqual(fake_blob.writer.data.getvalue().decode('utf-8'),
+                         df.to_csv(index=False))
+        self.assertEqual(fake_blob.open_kwargs['content_type'], 'text/csv')
+        stats = self.storage_manager.upload_stats['test/path']
+        self.assertEqual(stats['bytes'], fake_blob.writer.bytes_written)
+        self.assertTrue(stats['streamed'])
+
+    def test_upload_dataframe_streaming_gzip_csv(self):
+        """Test a streamed gzip CSV upload decompresses to the CSV and sets its encoding."""
+        df = make_stats_frame(5000)
+        fake_blob = self.stream_to_fake_blob(df, 'csv', chunk_rows=1000, compression='gzip')
+
+        data = fake_blob.writer.data.getvalue()
+        self.assertEqual(gzip.decompress(data).decode('utf-8'), df.to_csv(index=False))
+        self.assertEqual(fake_blob.content_encoding, 'gzip')
+        stats = self.storage_manager.upload_stats['test/path']
+        self.assertEqual(stats['bytes'], len(data))
+        self.assertEqual(stats['raw_bytes'], len(df.to_csv(index=False)))
+        self.assertEqual(stats['content_encoding'], 'gzip')
+        self.assertLess(stats['bytes'], stats['raw_bytes'] / 2)
+
+    @unittest.skipUnless(importlib.util.find_spec('zstandard'), "zstandard is not installed")
+    def test_upload_dataframe_streaming_zstd_csv(self):
+        """Test a streamed zstd CSV upload decompresses to the CSV."""
+        import zstandard
+
+        df = make_stats_frame(5000)
+        fake_blob = self.stream_to_fake_blob(df, 'csv', chunk_rows=1000, compression='zstd')
+
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            io.BytesIO(fake_blob.writer.data.getvalue()))
+        self.assertEqual(reader.read().decode('utf-8'), df.to_csv(index=False))
+        self.assertEqual(fake_blob.content_encoding, 'zstd')
+
+    def test_upload_dataframe_zstd_without_zstandard(self):
+        """Test a zstd upload fails cleanly when zstandard is not installed."""
+        mock_bucket = MagicMock()
+        self.mock_client.get_bucket.return_value = mock_bucket
+        mock_bucket.blob.return_value = FakeBlob()
+
+        with patch.dict('sys.modules', {'zstandard': None}):
+            result = self.storage_manager.upload_dataframe(
+                make_stats_frame(10), 'test/path', file_format='csv', compression='zstd')
+
+        self.assertFalse(result)
+        self.assertNotIn('test/path', self.storage_manager.upload_stats)
+
+    def test_upload_dataframe_streaming_parquet(self):
+        """Test a streamed Parquet upload writes every row."""
+        df = make_stats_frame(25)
+        fake_blob = self.stream_to_fake_blob(df, 'parquet', chunk_rows=10)
+
+        uploaded = pd.read_parquet(io.BytesIO(fake_blob.writer.data.getvalue()))
+        self.assertEqual(len(uploaded), 25)
+        self.assertEqual(sorted(uploaded['ID']), sorted(df['ID']))
+
+    def test_upload_dataframe_streaming_memory_bound(self):
+        """Test streaming peak memory depends on the chunk size, not the frame size."""
+        chunk_rows = 2000
+        peaks = []
+        for rows in [50000, 200000]:
+            df = make_stats_frame(rows)
+            tracemalloc.start()
+            self.stream_to_fake_blob(df, 'csv', chunk_rows, keep_data=False)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        # Quadrupling the frame must not grow the peak
+        self.assertLess(peaks[1], peaks[0] * 1.5 + 256 * 1024)
+        # And it stays a small fraction of the frame itself
+        self.assertLess(peaks[1], df.memory_usage(deep=True).sum() / 10)
+
+    def test_upload_dataframe_streaming_parquet_memory_bound(self):
+        """Test streaming Parquet keeps Arrow's peak memory to about one chunk."""
+        chunk_rows = 2000
+        (few_peak, _), (many_peak, frame_bytes) = [
+            arrow_peak(rows, chunk_rows) for rows in [50000, 200000]]
+
+        self.assertLess(many_peak, few_peak * 1.5 + 256 * 1024)
+        self.assertLess(many_peak, frame_bytes / 10)
+        # Writing the frame as one chunk holds all of it in Arrow buffers
+        whole_peak, _ = arrow_peak(200000, 200000)
+        self.assertGreater(whole_peak, many_peak * 10)
+
+    def test_upload_dataframe_sharded_connection_pool(self):
+        """Test the HTTP connection pool is grown to the number of shard workers."""
+        self.mock_client.get_bucket.return_value.list_blobs.return_value = []
+
+        uri = self.storage_manager.upload_dataframe_sharded(
+            make_stats_frame(120), 'test/path', shard_rows=10, workers=12)
+        self.storage_manager.upload_dataframe_sharded(
+            make_stats_frame(120), 'test/path', shard_rows=10, workers=12)
+
+        self.assertEqual(uri, f'gs://{self.bucket_name}/test/path/part-*')
+        self.assertEqual(self.storage_manager.source_uri('test/path'), uri)
+        self.mock_client._http.mount.assert_called_once()
+        adapter = self.mock_client._http.mount.call_args[0][1]
+        self.assertEqual(adapter._pool_maxsize, 12)
+
     def test_upload_dataframe_exception(self):
         """Test uploading a dataframe with an exception."""
         df = pd.DataFrame({'col1': [1, 2, 3]})
@@ -94,6 +327,38 @@ class TestStorageManager(unittest.TestCase):
         mock_bucket.blob.assert_called_once_with('test/path.csv')
         mock_blob.exists.assert_called_once()
 
+    def test_check_blob_exists_content_hash(self):
+        """Test matching a blob's content hash metadata."""
+        mock_bucket = MagicMock()
+        self.mock_client.get_bucket.return_value = mock_bucket
+        mock_bucket.get_blob.return_value.metadata = {'content_hash': 'abc'}
+
+        self.assertTrue(self.storage_manager.check_blob_exists('a', content_hash='abc'))
+        self.assertFalse(self.storage_manager.check_blob_exists('a', content_hash='def'))
+        mock_bucket.get_blob.return_value = None
+        self.assertFalse(self.storage_manager.check_blob_exists('a', content_hash='abc'))
+        mock_bucket.blob.assert_not_called()
+
+    def test_bucket_looked_up_once(self):
+        """Test that the bucket is looked up once and re-fetched after NotFound."""
+        from google.cloud.exceptions import NotFound
+        mock_bucket = MagicMock()
+        self.mock_client.get_bucket.return_value = mock_bucket
+        df = pd.DataFrame({'col1': [1, 2, 3]})
+
+        self.assertTrue(self.storage_manager.upload_dataframe(df, 'a.csv'))
+        self.assertTrue(self.storage_manager.upload_dataframe(df, 'b.csv'))
+        self.assertTrue(self.storage_manager.check_blob_exists('a.csv'))
+        self.mock_client.get_bucket.assert_called_once_with(self.bucket_name)
+        self.assertEqual(self.storage_manager.bucket_cache.stats()['hits'], 2)
+
+        # A NotFound drops the cached bucket
+        mock_bucket.blob.return_value.upload_from_string.side_effect = NotFound("gone")
+        self.assertFalse(self.storage_manager.upload_dataframe(df, 'c.csv'))
+        mock_bucket.blob.return_value.upload_from_string.side_effect = None
+        self.assertTrue(self.storage_manager.upload_dataframe(df, 'c.csv'))
+        self.assertEqual(self.mock_client.get_bucket.call_count, 2)
+
 
 class TestBigQueryManager(unittest.TestCase):
     """Test cases for BigQueryManager class."""
@@ -145,6 +410,31 @@ class TestBigQueryManager(unittest.TestCase):
             f"test-project.{dataset_id}")
         self.mock_client.create_dataset.assert_called_once_with(mock_dataset)
 
+    def test_dataset_existence_cached(self):
+        """Test that dataset existence is cached with a TTL and dropped on NotFound."""
+        from google.cloud.exceptions import NotFound
+        now = [0.0]
+        self.bigquery_manager.dataset_cache.clock = lambda: now[0]
+        self.bigquery_manager.dataset_cache.ttl_seconds = 60
+
+        for table_id in ['a', 'b']:
+            self.assertTrue(self.bigquery_manager.upload_from_gcs(
+                'gs://test-bucket/path', table_id, 'test_dataset'))
+        self.mock_client.get_dataset.assert_called_once_with('test_dataset')
+
+        # Expired entries are checked again
+        now[0] = 61.0
+        self.bigquery_manager.upload_from_gcs('gs://test-bucket/path', 'c', 'test_dataset')
+        self.assertEqual(self.mock_client.get_dataset.call_count, 2)
+
+        # A load failing with NotFound drops the entry
+        self.mock_client.load_table_from_uri.return_value.result.side_effect = NotFound("gone")
+        self.assertFalse(self.bigquery_manager.upload_from_gcs(
+            'gs://test-bucket/path', 'd', 'test_dataset'))
+        self.bigquery_manager.ensure_dataset_exists('test_dataset')
+        self.assertEqual(self.mock_client.get_dataset.call_count, 3)
+        self.assertEqual(self.bigquery_manager.dataset_cache.stats()['hits'], 2)
+
     @patch('google.cloud.bigquery.LoadJobConfig')
     def test_upload_from_gcs(self, mock_job_config_class):
         """Test uploading from GCS to BigQuery."""
@@ -169,10 +459,153 @@ class TestBigQueryManager(unittest.TestCase):
             self.mock_client.load_table_from_uri.assert_called_once_with(
                 gcs_uri,
                 f"test-project.{dataset_id}.{table_id}",
+                job_id=ANY,
                 job_config=mock_job_config
             )
             mock_job.result.assert_called_once()
 
+    def test_start_load_job_keeps_job_id_across_retries(self):
+        """Test a submission retried after a lost response fetches the job it started."""
+        mock_job = MagicMock()
+        job_ids = []
+
+        def submit(gcs_uri, table_ref, job_id, job_config):
+            job_ids.append(job_id)
+            if len(job_ids) == 1:
+                # The job was created, but the response was lost
+                raise ServiceUnavailable("backend error")
+            raise Conflict(f"Already Exists: Job test-project:{job_id}")
+
+        self.mock_client.load_table_from_uri.side_effect = submit
+        self.mock_client.get_job.return_value = mock_job
+        self.bigquery_manager.limiter.sleep = lambda seconds: None
+
+        with patch.object(self.bigquery_manager, 'ensure_dataset_exists', return_value=True):
+            result = self.bigquery_manager.upload_from_gcs(
+                'gs://test-bucket/a', 'a', 'test_dataset', write_disposition='WRITE_APPEND')
+
+        self.assertTrue(result)
+        self.assertEqual(len(job_ids), 2)
+        self.assertEqual(job_ids[0], job_ids[1])
+        self.mock_client.get_job.assert_called_once_with(job_ids[0])
+        mock_job.result.assert_called_once()
+
+    def test_upload_from_gcs_resubmits_rate_limited_replace(self):
+        """Test a table replace whose job hit a rate limit is submitted again."""
+        rate_limited = Forbidden("Exceeded rate limits", errors=[{'reason': 'rateLimitExceeded'}])
+        failed_job, good_job = MagicMock(), MagicMock()
+        failed_job.result.side_effect = rate_limited
+        self.bigquery_manager.limiter.sleep = lambda seconds: None
+
+        with patch.object(self.bigquery_manager, 'ensure_dataset_exists', return_value=True):
+            self.mock_client.load_table_from_uri.side_effect = [failed_job, good_job]
+            self.assertTrue(self.bigquery_manager.upload_from_gcs(
+                'gs://test-bucket/a', 'a', 'test_dataset'))
+            job_ids = [call.kwargs['job_id']
+                       for call in self.mock_client.load_table_from_uri.call_args_list]
+
+            # An append is not submitted again
+            self.mock_client.load_table_from_uri.side_effect = [failed_job, good_job]
+            self.assertFalse(self.bigquery_manager.upload_from_gcs(
+                'gs://test-bucket/a', 'a', 'test_dataset', write_disposition='WRITE_APPEND'))
+
+        self.assertEqual(len(job_ids), 2)
+        self.assertNotEqual(job_ids[0], job_ids[1])
+        good_job.result.assert_called_once()
+        self.assertEqual(self.mock_client.load_table_from_uri.call_count, 3)
+        self.assertEqual(self.bigquery_manager.limiter.stats()['throttled'], 1)
+
+    def test_build_load_job_config_parquet(self):
+        """Test Parquet loads use the Parquet source format without autodetect."""
+        job_config = self.bigquery_manager.build_load_job_config('parquet')
+        self.assertEqual(job_config.source_format,
+                         bigquery.SourceFormat.PARQUET)
+        self.assertFalse(job_config.autodetect)
+        self.assertEqual(job_config.write_disposition,
+                         bigquery.WriteDisposition.WRITE_TRUNCATE)
+
+    def test_build_load_job_config_csv_schema(self):
+        """Test CSV loads use an explicit schema when one is given."""
+        df = pd.DataFrame({
+            'Season': [2021],
+            'Attendance': [88084.0],
+            'Playing.for': ['Richmond'],
+        })
+        schema = schema_from_dataframe(df)
+        self.assertEqual([(field.name, field.field_type) for field in schema], [
+            ('Season', 'INTEGER'), ('Attendance', 'FLOAT'), ('Playing_for', 'STRING')])
+
+        job_config = self.bigquery_manager.build_load_job_config(
+            'csv', schema=schema)
+        self.assertEqual(job_config.source_format, bigquery.SourceFormat.CSV)
+        self.assertFalse(job_config.autodetect)
+        self.assertEqual(job_config.schema, schema)
+
+    def test_bulk_load_from_gcs(self):
+        """Test several files are loaded into one table by a single job."""
+        mock_job = MagicMock()
+        self.mock_client.load_table_from_uri.return_value = mock_job
+        gcs_uris = ['gs://test-bucket/a', 'gs://test-bucket/b']
+
+        with patch.object(self.bigquery_manager, 'ensure_dataset_exists', return_value=True):
+            result = self.bigquery_manager.bulk_load_from_gcs(
+                gcs_uris, 'combined', dataset_id='test_dataset')
+
+        self.assertTrue(result)
+        self.mock_client.load_table_from_uri.assert_called_once()
+        args, kwargs = self.mock_client.load_table_from_uri.call_args
+        self.assertEqual(args[:2], (gcs_uris, 'test-project.test_dataset.combined'))
+        self.assertEqual(kwargs['job_config'].write_disposition,
+                         bigquery.WriteDisposition.WRITE_TRUNCATE)
+        self.assertFalse(self.bigquery_manager.bulk_load_from_gcs([], 'combined'))
+
+    def test_load_many(self):
+        """Test every load job is submitted before any is waited on."""
+        events = []
+        jobs = {}
+        for table_id in ['a', 'b']:
+            job = MagicMock(job_id=f'job_{table_id}', output_rows=10, input_file_bytes=100,
+                            output_bytes=200, slot_millis=1500, started=1.0, ended=3.5)
+            job.result.side_effect = lambda timeout, table_id=table_id: events.append(('wait', table_id))
+            jobs[f'test-project.test_dataset.{table_id}'] = job
+        jobs['test-project.test_dataset.b'].result.side_effect = ValueError("bad file")
+
+        def submit(gcs_uri, table_ref, job_id, job_config):
+            if table_ref.endswith('.c'):
+                raise ValueError("quota exceeded")
+            events.append(('submit', table_ref))
+            return jobs[table_ref]
+
+        self.mock_client.load_table_from_uri.side_effect = submit
+        with patch.object(self.bigquery_manager, 'ensure_dataset_exists', return_value=True):
+            results = self.bigquery_manager.load_many(
+                [('gs://test-bucket/a', 'a'), ('gs://test-bucket/b', 'b'), ('gs://test-bucket/c', 'c')],
+                dataset_id='test_dataset')
+
+        self.assertEqual([event[0] for event in events], ['submit', 'submit', 'wait'])
+        self.assertEqual(list(results), ['a', 'b', 'c'])
+        self.assertEqual(results['a']['status'], 'ok')
+        self.assertEqual(results['a']['rows'], 10)
+        self.assertEqual(results['a']['slot_millis'], 1500)
+        self.assertEqual(results['a']['seconds'], 2.5)
+        self.assertEqual(results['b']['status'], 'error')
+        self.assertEqual(results['b']['error'], 'bad file')
+        self.assertEqual(results['c'], {'status': 'error', 'error': 'quota exceeded'})
+
+    def test_load_many_timeout(self):
+        """Test jobs still running at the batch timeout are cancelled."""
+        mock_job = MagicMock(started=None, ended=None)
+        mock_job.result.side_effect = TimeoutError()
+        self.mock_client.load_table_from_uri.return_value = mock_job
+
+        with patch.object(self.bigquery_manager, 'ensure_dataset_exists', return_value=True):
+            results = self.bigquery_manager.load_many(
+                [('gs://test-bucket/a', 'a')], dataset_id='test_dataset', timeout=5)
+
+        self.assertEqual(results['a']['status'], 'timeout')
+        self.assertLessEqual(mock_job.result.call_args[1]['timeout'], 5)
+        mock_job.cancel.assert_called_once()
+
     def test_create_combined_table(self):
         """Test creating a combined table from multiple sources."""
         # Set up mocks
@@ -191,6 +624,70 @@ class TestBigQueryManager(unittest.TestCase):
             self.mock_client.query.assert_called_once()
             mock_query_job.result.assert_called_once()
 
+    def test_create_combined_table_partitioned_new(self):
+        """Test a partitioned combined table is created with DDL when it doesn't exist."""
+        from google.cloud.exceptions import NotFound
+        self.mock_client.get_table.side_effect = NotFound("Not found")
+
+        with patch.object(self.bigquery_manager, 'ensure_dataset_exists', return_value=True):
+            result = self.bigquery_manager.create_combined_table(
+                [2020, 2021], partitioned=True)
+
+        self.assertTrue(result)
+        query = self.mock_client.query.call_args[0][0]
+        self.assertIn(
+            "PARTITION BY RANGE_BUCKET(year, GENERATE_ARRAY(1897, 2101, 1))", query)
+        self.assertIn("CLUSTER BY ID, Playing_for", query)
+        self.mock_client.copy_table.assert_not_called()
+        self.mock_client.delete_table.assert_not_called()
+
+    def test_create_combined_table_partitioned_replaces_partitions(self):
+        """Test only the given years' partitions are replaced in an existing table."""
+        existing_table = MagicMock()
+        existing_table.range_partitioning.field = 'year'
+        self.mock_client.get_table.return_value = existing_table
+        copy_job = MagicMock()
+        self.mock_client.copy_table.return_value = copy_job
+
+        with patch.object(self.bigquery_manager, 'ensure_dataset_exists', return_value=True):
+            result = self.bigquery_manager.create_combined_table(
+                [2020, 2021], partitioned=True)
+
+        self.assertTrue(result)
+        self.mock_client.query.assert_not_called()
+        destinations = [call[0][1]
+                        for call in self.mock_client.copy_table.call_args_list]
+        self.assertEqual(destinations, [
+            'test-project.afl_data.combined_player_stats_bq$2020',
+            'test-project.afl_data.combined_player_stats_bq$2021'])
+        job_config = self.mock_client.copy_table.call_args[1]['job_config']
+        self.assertEqual(job_config.write_disposition,
+                         bigquery.WriteDisposition.WRITE_TRUNCATE)
+        self.assertEqual(copy_job.result.call_count, 2)
+
+    def test_create_combined_table_partitioned_migrates_unpartitioned(self):
+        """Test an unpartitioned combined table is dropped and recreated partitioned."""
+        existing_table = MagicMock()
+        existing_table.range_partitioning = None
+        self.mock_client.get_table.return_value = existing_table
+
+        with patch.object(self.bigquery_manager, 'ensure_dataset_exists', return_value=True):
+            result = self.bigquery_manager.create_combined_table(
+                [2020], partitioned=True)
+
+        self.assertTrue(result)
+        self.mock_client.delete_table.assert_called_once_with(
+            'test-project.afl_data.combined_player_stats_bq', not_found_ok=True)
+        self.mock_client.query.assert_called_once()
+
+    def test_build_combined_table_query_unpartitioned(self):
+        """Test the plain combined query unions every source table."""
+        query = build_combined_table_query('p.d.combined', ['p.d.a', 'p.d.b'])
+        self.assertIn("CREATE OR REPLACE TABLE `p.d.combined`", query)
+        self.assertIn("SELECT * FROM `p.d.a`", query)
+        self.assertIn("UNION ALL SELECT * FROM `p.d.b`", query)
+        self.assertNotIn("PARTITION BY", query)
+
     def test_create_combined_table_no_years(self):
         """Test creating a combined table with no years provided."""
         # Call the method with empty years list
@@ -0,0 +1,134 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient
+from afl_pipeline.metrics import RunMetrics
+from afl_pipeline.pipeline import AFLDataPipeline
+
+
+class FakeClock:
+    """Clock that advances by a fixed step each time it is read."""
+
+    def __init__(self, step=1.0):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+class TestRunMetrics(unittest.TestCase):
+    """Test cases for RunMetrics."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.metrics = RunMetrics(clock=FakeClock())
+        with self.metrics.span('run'):
+            with self.metrics.span('fetch', year=2021) as span:
+                span.rows = 100
+            with self.metrics.span('fetch', year=2022) as span:
+                span.rows = 300
+            self.metrics.record('upload', 0.5, rows=400, nbytes=2000000, year=2021)
+
+    def test_span_failure(self):
+        """Test that an exception marks the span failed and is re-raised."""
+        with self.assertRaises(ValueError):
+            with self.metrics.span('preprocess', year=2021):
+                raise ValueError("bad data")
+        span = self.metrics.spans[-1]
+        self.assertEqual(span.status, 'error')
+        self.assertEqual(span.error, 'bad data')
+        self.assertEqual(self.metrics.stage_totals()['preprocess']['errors'], 1)
+
+    def test_stage_totals(self):
+        """Test adding up the spans of each stage."""
+        totals = self.metrics.stage_totals()
+
+        self.assertEqual(list(totals), ['fetch', 'upload'])
+        self.assertEqual(totals['fetch']['count'], 2)
+        self.assertEqual(totals['fetch']['seconds'], 2.0)
+        self.assertEqual(totals['fetch']['rows_per_second'], 200)
+        self.assertEqual(totals['upload']['bytes'], 2000000)
+        self.assertEqual(self.metrics.run_duration(), 5.0)
+
+    def test_json_report(self):
+        """Test writing the JSON run report."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'reports', 'run.json')
+            self.metrics.write_json(path)
+            with open(path) as f:
+                report = json.load(f)
+
+        self.assertEqual(report['duration_seconds'], 5.0)
+        self.assertEqual(report['stages']['fetch']['rows'], 400)
+        self.assertEqual(len(report['spans']), 4)
+        self.assertEqual(report['spans'][0]['labels'], {'year': 2021})
+
+    def test_prometheus(self):
+        """Test rendering the Prometheus textfile."""
+        text = self.metrics.to_prometheus()
+
+        self.assertIn('# TYPE afl_pipeline_stage_duration_seconds gauge', text)
+        self.assertIn('afl_pipeline_stage_duration_seconds{stage="fetch"} 2', text)
+        self.assertIn('afl_pipeline_stage_rows_total{stage="upload"} 400', text)
+        self.assertIn('afl_pipeline_run_duration_seconds 5', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_summary_table(self):
+        """Test the summary table shows each stage's share of the run."""
+        table = self.metrics.summary_table().splitlines()
+
+        self.assertTrue(table[0].startswith('stage'))
+        self.assertTrue(table[1].startswith('fetch'))
+        self.assertIn('40.0%', table[1])
+        self.assertTrue(table[-1].startswith('run'))
+
+
+class TestPipelineMetrics(unittest.TestCase):
+    """Test cases for the spans recorded by AFLDataPipeline."""
+
+    def test_run_records_every_stage(self):
+        """Test that a run records spans for each stage and exports them."""
+        storage_client = FakeStorageClient()
+        bigquery_client = FakeBigQueryClient(storage_client)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report_path = os.path.join(tmp_dir, 'run.json')
+            prometheus_path = os.path.join(tmp_dir, 'afl_pipeline.prom')
+            with patch('afl_pipeline.settings.RUN_REPORT_PATH', report_path), \
+                    patch('afl_pipeline.settings.PROMETHEUS_TEXTFILE_PATH', prometheus_path), \
+                    patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                          os.path.join(tmp_dir, 'content_manifest.json')), \
+                    patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                          os.path.join(tmp_dir, 'run_manifest.json')):
+                pipeline = AFLDataPipeline(
+                    gcs_bucket_name='test-bucket',
+                    storage_client=storage_client,
+                    bigquery_client=bigquery_client)
+                pipeline.run_pipeline([2020, 2021], use_sample_data=True)
+
+            with open(report_path) as f:
+                report = json.load(f)
+            self.assertTrue(os.path.exists(prometheus_path))
+        bigquery_client.close()
+
+        stages = report['stages']
+        for stage in ['fetch', 'preprocess', 'serialise', 'upload', 'bigquery_load', 'combined_table']:
+            self.assertIn(stage, stages)
+        self.assertEqual(stages['fetch']['count'], 2)
+        self.assertEqual(stages['preprocess']['rows'], 20)
+        self.assertGreater(stages['upload']['bytes'], 0)
+        self.assertEqual(report['info']['successful_years'], [2020, 2021])
+        self.assertIsNotNone(report['duration_seconds'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from afl_pipeline.data_processor import content_hash
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient
+from afl_pipeline.pipeline import AFLDataPipeline
+from afl_pipeline.state import RunManifest
+from afl_pipeline.storage import StorageManager
+
+
+class TestRunManifest(unittest.TestCase):
+    """Test cases for the RunManifest checkpoints."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.state_dir.name, 'run_manifest.json')
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def test_resume_unfinished_run(self):
+        """Test an unfinished run is continued and a finished one is not."""
+        manifest = RunManifest(self.path)
+        self.assertFalse(manifest.start([2020, 2021], 'first'))
+        manifest.record(2020, 'loaded', 'abc', table='player_stats_2020_bq')
+        self.assertFalse(manifest.finish([2020]))
+
+        manifest = RunManifest(self.path)
+        self.assertTrue(manifest.start([2020, 2021], 'second', resume=True))
+        self.assertEqual(manifest.state['run_id'], 'first')
+        self.assertEqual(manifest.done(2020, 'loaded')['content_hash'], 'abc')
+        self.assertIsNone(manifest.done(2021, 'loaded'))
+        manifest.record(2021, 'loaded')
+        self.assertTrue(manifest.finish([2021]))
+
+        # Nothing is reported outside a run, and a finished run is not resumed
+        self.assertIsNone(manifest.done(2020, 'loaded'))
+        self.assertFalse(RunManifest(self.path).start([2020], 'third', resume=True))
+
+    def test_new_run_without_resume(self):
+        """Test starting without resume forgets the unfinished run."""
+        manifest = RunManifest(self.path)
+        manifest.start([2020], 'first')
+        manifest.record(2020, 'uploaded')
+
+        manifest = RunManifest(self.path)
+        manifest.start([2020], 'second')
+
+        self.assertIsNone(manifest.done(2020, 'uploaded'))
+        self.assertEqual(manifest.state['run_id'], 'second')
+
+    def test_stored_in_bucket(self):
+        """Test the manifest can be kept in the bucket."""
+        storage = StorageManager(FakeStorageClient(), 'test-bucket')
+        manifest = RunManifest(self.path, storage=storage, gcs_path='state/run_manifest.json')
+        manifest.start([2020], 'first')
+        with patch.object(storage, 'upload_bytes', wraps=storage.upload_bytes) as upload_bytes:
+            # Stages a run cannot resume from are written with the next one it can
+            manifest.record(2020, 'fetched', rows=10)
+            manifest.record(2020, 'preprocessed', rows=10)
+            self.assertEqual(upload_bytes.call_count, 0)
+            manifest.record(2020, 'uploaded', gcs_path='player_stats/player_stats_2020')
+            self.assertEqual(upload_bytes.call_count, 1)
+
+        resumed = RunManifest(self.path, storage=storage, gcs_path='state/run_manifest.json')
+
+        self.assertTrue(resumed.start([2020], 'second', resume=True))
+        self.assertEqual(resumed.done(2020, 'fetched')['rows'], 10)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestPipelineResume(unittest.TestCase):
+    """Test cases for resuming interrupted pipeline runs against the fakes."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.storage_client = FakeStorageClient()
+        self.bigquery_client = FakeBigQueryClient(self.storage_client)
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.patchers = [
+            patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                  os.path.join(self.state_dir.name, 'content_manifest.json')),
+            patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                  os.path.join(self.state_dir.name, 'run_manifest.json')),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.years = list(range(2000, 2010))
+
+    def tearDown(self):
+        self.bigquery_client.close()
+        for patcher in self.patchers:
+            patcher.stop()
+        self.state_dir.cleanup()
+
+    def make_pipeline(self):
+        return AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+
+    def interrupt(self, pipeline, method, year):
+        """Make a pipeline method kill the run when it reaches the given year."""
+        original = getattr(pipeline, method)
+
+        def interrupted(*args, **kwargs):
+            if args[0] == year:
+                raise KeyboardInterrupt
+            return original(*args, **kwargs)
+
+        return patch.object(pipeline, method, side_effect=interrupted)
+
+    def test_resume_after_interruption(self):
+        """Test a resumed run only processes the years the interrupted run did not finish."""
+        pipeline = self.make_pipeline()
+        with self.interrupt(pipeline, '_prepare_year', 2008), self.assertRaises(KeyboardInterrupt):
+            pipeline.run_pipeline(self.years, use_sample_data=True)
+
+        pipeline = self.make_pipeline()
+        with patch.object(pipeline, '_prepare_year', wraps=pipeline._prepare_year) as prepare:
+            successful_years = pipeline.run_pipeline(self.years, use_sample_data=True, resume=True)
+
+        self.assertEqual(successful_years, self.years)
+        self.assertEqual([call.args[0] for call in prepare.call_args_list], [2008, 2009])
+        self.assertEqual(pipeline.metrics.info['resumed_years'], list(range(2000, 2008)))
+        combined = self.bigquery_client.get_table('afl_data.combined_player_stats_bq')
+        self.assertEqual(combined.num_rows, 10 * len(self.years))
+
+        # The run finished, so there is nothing left to resume
+        pipeline.run_pipeline([2000], use_sample_data=True, resume=True)
+        self.assertEqual(pipeline.metrics.info['resumed_years'], [])
+
+    def test_checkpoints_hash_only_uploads(self):
+        """Test frames are hashed once per upload, not again to checkpoint their stages."""
+        pipeline = self.make_pipeline()
+        with patch('afl_pipeline.pipeline.content_hash', wraps=content_hash) as hashed:
+            pipeline.run_pipeline([2020, 2021], use_sample_data=True, create_combined=False)
+
+        self.assertEqual(hashed.call_count, 2)
+        stages = pipeline.run_manifest.state['stages']['2020']
+        self.assertIsNone(stages['fetched']['content_hash'])
+        self.assertEqual(stages['uploaded']['content_hash'], stages['loaded']['content_hash'])
+
+    def test_resume_at_load(self):
+        """Test a year uploaded before the interruption is loaded without fetching it again."""
+        pipeline = self.make_pipeline()
+        with self.interrupt(pipeline, '_load_year', 2005), self.assertRaises(KeyboardInterrupt):
+            pipeline.run_pipeline(self.years, use_sample_data=True, create_combined=False)
+
+        pipeline = self.make_pipeline()
+        with patch.object(pipeline, '_prepare_year', wraps=pipeline._prepare_year) as prepare:
+            successful_years = pipeline.run_pipeline(
+                self.years, use_sample_data=True, create_combined=False, resume=True)
+
+        self.assertEqual(successful_years, self.years)
+        self.assertEqual([call.args[0] for call in prepare.call_args_list], list(range(2006, 2010)))
+        self.assertEqual(self.bigquery_client.get_table(
+            'afl_player_data.player_stats_2005_bq').num_rows, 10)
+        self.assertIn(2005, pipeline.skipped_years('upload'))
+
+
+if __name__ == '__main__':
+    unittest.main()
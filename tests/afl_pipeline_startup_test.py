@@ -0,0 +1,145 @@
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to sys.path to import the modules
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+# Modules, with their submodules, that must only be loaded when they are first used
+HEAVY_MODULES = [
+    'google.cloud.storage',
+    'google.cloud.bigquery',
+    'google.auth',
+    'rpy2',
+    'Data_Pipeline.Functions.get_data_functions',
+]
+
+
+class FakeRVector:
+    """Stand-in for an rpy2 vector: values in a buffer and the R class attribute."""
+
+    def __init__(self, values, rclass):
+        self.values = values
+        self.rclass = rclass
+
+    def memoryview(self):
+        return memoryview(self.values)
+
+
+def fake_rpy2_modules(rpy2):
+    """Map the rpy2 modules get_data_functions imports to parts of a mock."""
+    return {
+        'rpy2': rpy2,
+        'rpy2.robjects': rpy2.robjects,
+        'rpy2.robjects.packages': rpy2.robjects.packages,
+        'rpy2.robjects.vectors': rpy2.robjects.vectors,
+        'rpy2.rinterface': rpy2.rinterface,
+    }
+
+
+def import_get_data_functions():
+    """Import get_data_functions afresh against whatever rpy2 is in sys.modules."""
+    sys.modules.pop('Data_Pipeline.Functions.get_data_functions', None)
+    return importlib.import_module('Data_Pipeline.Functions.get_data_functions')
+
+
+def run_fresh(code):
+    """Run code in a new interpreter and return the JSON it prints."""
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=PROJECT_ROOT,
+        capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestStartup(unittest.TestCase):
+    """Test cases for the import cost of the package."""
+
+    def test_import_loads_no_heavy_modules(self):
+        """Test importing the pipeline loads neither the cloud client libraries nor rpy2."""
+        report = run_fresh(
+            "import json, sys\n"
+            "import afl_pipeline\n"
+            "from afl_pipeline.pipeline import AFLDataPipeline\n"
+            f"heavy = tuple({HEAVY_MODULES!r})\n"
+            "print(json.dumps(sorted(m for m in sys.modules "
+            "if m in heavy or m.startswith(tuple(h + '.' for h in heavy)))))\n")
+
+        self.assertEqual(report, [])
+
+    def test_package_attributes_are_lazy(self):
+        """Test the package exports resolve on first access."""
+        report = run_fresh(
+            "import json, sys\n"
+            "import afl_pipeline\n"
+            "before = 'afl_pipeline.pipeline' in sys.modules\n"
+            "name = afl_pipeline.AFLDataPipeline.__name__\n"
+            "print(json.dumps({'before': before, 'name': name, "
+            "'after': 'afl_pipeline.pipeline' in sys.modules}))\n")
+
+        self.assertEqual(report, {'before': False, 'name': 'AFLDataPipeline', 'after': True})
+
+    def test_sample_run_does_not_load_r(self):
+        """Test a sample-data run against fake clients never imports rpy2."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, 'content_manifest.json')
+            report = run_fresh(
+                "import json, sys\n"
+                "from afl_pipeline import settings\n"
+                f"settings.CONTENT_MANIFEST_PATH = {manifest_path!r}\n"
+                f"settings.RUN_MANIFEST_PATH = {os.path.join(tmp_dir, 'run_manifest.json')!r}\n"
+                "from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient\n"
+                "from afl_pipeline.pipeline import AFLDataPipeline\n"
+                "storage_client = FakeStorageClient()\n"
+                "bigquery_client = FakeBigQueryClient(storage_client)\n"
+                "pipeline = AFLDataPipeline(gcs_bucket_name='test-bucket', "
+                "storage_client=storage_client, bigquery_client=bigquery_client)\n"
+                "years = pipeline.run_pipeline([2021], use_sample_data=True)\n"
+                "bigquery_client.close()\n"
+                "print(json.dumps({'years': years, 'r_loaded': 'rpy2' in sys.modules}))\n")
+
+        self.assertEqual(report, {'years': [2021], 'r_loaded': False})
+
+    def test_func_initialise_runs_once(self):
+        """Test the R packages are loaded only once per process."""
+        rpy2 = MagicMock()
+        with patch.dict(sys.modules, fake_rpy2_modules(rpy2)):
+            get_data_functions = import_get_data_functions()
+
+            get_data_functions.func_initialise()
+            get_data_functions.func_initialise()
+
+        packages = [call.args[0] for call in rpy2.robjects.packages.importr.call_args_list]
+        self.assertEqual(packages, ['fitzRoy', 'dplyr'])
+
+    def test_r_dates_converted_whatever_their_storage(self):
+        """Test R Dates and POSIXct times become datetimes whether stored as doubles or integers."""
+        rpy2 = MagicMock()
+        for name in ('FactorVector', 'BoolVector', 'IntVector', 'FloatVector', 'StrVector'):
+            setattr(rpy2.robjects.vectors, name, type(name, (FakeRVector,), {}))
+        vectors = rpy2.robjects.vectors
+        with patch.dict(sys.modules, fake_rpy2_modules(rpy2)):
+            convert = import_get_data_functions()._r_column_to_pandas
+            na_integer = np.iinfo(np.int32).min
+
+            integer_dates = convert(vectors.IntVector(np.array([19723, na_integer], dtype=np.int32), ['Date']))
+            double_dates = convert(vectors.FloatVector(np.array([19723.0, np.nan]), ['Date']))
+            integer_times = convert(vectors.IntVector(np.array([0, 3600], dtype=np.int32), ['POSIXct', 'POSIXt']))
+            days = convert(vectors.IntVector(np.array([19723], dtype=np.int32), ['integer']))
+
+        for dates in (integer_dates, double_dates):
+            self.assertEqual(dates[0], pd.Timestamp('2024-01-01'))
+            self.assertTrue(pd.isna(dates[1]))
+        self.assertEqual(integer_times[1], pd.Timestamp('1970-01-01 01:00', tz='UTC'))
+        self.assertEqual(days.tolist(), [19723])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+import pandas as pd
+
+# Add the parent directory to sys.path to import the modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from afl_pipeline.data_processor import create_sample_data
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient
+from afl_pipeline.pipeline import AFLDataPipeline
+from benchmarks.synthetic import ROWS_PER_SEASON, make_player_stats
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Streams synthetic seasons in a fresh interpreter and prints its peak RSS in
+# bytes, which unlike tracemalloc also counts Arrow and compressor buffers
+RSS_PEAK_SCRIPT = """
+import os
+import resource
+import sys
+import tempfile
+from unittest.mock import patch
+from afl_pipeline import settings
+from afl_pipeline.fake_cloud import FakeBigQueryClient, FakeStorageClient
+from afl_pipeline.pipeline import AFLDataPipeline
+from benchmarks.synthetic import ROWS_PER_SEASON, make_player_stats
+
+seasons, settings.UPLOAD_FORMAT = int(sys.argv[1]), sys.argv[2]
+state_dir = tempfile.mkdtemp()
+settings.CONTENT_MANIFEST_PATH = os.path.join(state_dir, 'content_manifest.json')
+settings.RUN_MANIFEST_PATH = os.path.join(state_dir, 'run_manifest.json')
+storage_client = FakeStorageClient()
+bigquery_client = FakeBigQueryClient(storage_client)
+pipeline = AFLDataPipeline(gcs_bucket_name='test-bucket', storage_client=storage_client,
+                           bigquery_client=bigquery_client)
+objects = storage_client.bucket('test-bucket').objects
+
+def fetch(year, use_sample_data=False, round_number=None):
+    return make_player_stats(ROWS_PER_SEASON, season=year, seed=year)
+
+with patch.object(pipeline, '_fetch_year', side_effect=fetch):
+    for chunk in pipeline.stream_pipeline(list(range(2000, 2000 + seasons)),
+                                          load_to_bigquery=False):
+        assert chunk['success'], chunk
+        objects.clear()
+bigquery_client.close()
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+"""
+
+
+def rss_peak(seasons, file_format):
+    """Peak RSS of a process streaming full-size synthetic seasons to GCS."""
+    output = subprocess.run(
+        [sys.executable, '-c', RSS_PEAK_SCRIPT, str(seasons), file_format],
+        cwd=PROJECT_ROOT, env=dict(os.environ, PYTHONPATH=PROJECT_ROOT),
+        capture_output=True, text=True, check=True).stdout
+    return int(output.split()[-1])
+
+
+def fetch_three_rounds(year, use_sample_data=False, round_number=None):
+    """Stand-in for _fetch_year for seasons of three rounds."""
+    if not 1 <= round_number <= 3:
+        return create_sample_data(year).iloc[:0]
+    return create_sample_data(year, round_number)
+
+
+def opening_round_season(year):
+    """A season of an Opening Round (round 0) and rounds 1 and 2, ten rows each."""
+    frames = [create_sample_data(year, round_number) for round_number in (1, 1, 2)]
+    frames[0] = frames[0].assign(Round='0')
+    return pd.concat(frames, ignore_index=True)
+
+
+class TestStreaming(unittest.TestCase):
+    """Test cases for streaming seasons and rounds through the pipeline."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.patchers = [
+            patch('afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+                  os.path.join(self.state_dir.name, 'content_manifest.json')),
+            patch('afl_pipeline.settings.RUN_MANIFEST_PATH',
+                  os.path.join(self.state_dir.name, 'run_manifest.json')),
+            patch('afl_pipeline.settings.ROUND_STATE_PATH',
+                  os.path.join(self.state_dir.name, 'rounds.json')),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.bigquery_client = FakeBigQueryClient(FakeStorageClient())
+        self.storage_client = self.bigquery_client.storage_client
+
+    def tearDown(self):
+        self.bigquery_client.close()
+        for patcher in self.patchers:
+            patcher.stop()
+        self.state_dir.cleanup()
+
+    def make_pipeline(self):
+        return AFLDataPipeline(
+            gcs_bucket_name='test-bucket',
+            storage_client=self.storage_client,
+            bigquery_client=self.bigquery_client)
+
+    def test_stream_by_round(self):
+        """Test each round is uploaded on its own and the season table rebuilt from them."""
+        pipeline = self.make_pipeline()
+        with patch.object(pipeline, '_fetch_year', side_effect=fetch_three_rounds):
+            chunks = list(pipeline.stream_pipeline([2020, 2021], by_round=True))
+            # Streaming again replaces the tables instead of adding the rounds twice
+            successful_years = pipeline.run_pipeline(
+                [2020, 2021], by_round=True, create_combined=False)
+
+        self.assertEqual([(chunk['year'], chunk['rounds']) for chunk in chunks],
+                         [(year, (r, r)) for year in (2020, 2021) for r in (1, 2, 3)])
+        self.assertTrue(all(chunk['success'] and chunk['rows'] == 10 for chunk in chunks))
+        self.assertEqual(successful_years, [2020, 2021])
+        for year in (2020, 2021):
+            table = self.bigquery_client.get_table(f'afl_player_data.player_stats_{year}_bq')
+            self.assertEqual(table.num_rows, 30)
+            self.assertEqual(pipeline.round_tracker.last_round(year), 3)
+        self.assertIn('player_stats/rounds/player_stats_2021_rounds_3_3',
+                      self.storage_client.bucket('test-bucket').objects)
+
+    def test_stream_by_round_keeps_opening_round(self):
+        """Test the round-0 Opening Round is loaded whether or not the source fetches by round."""
+        def whole_season(year, use_sample_data=False, round_number=None):
+            return opening_round_season(year)
+
+        def by_round(year, use_sample_data=False, round_number=None):
+            df = opening_round_season(year)
+            return df[df['Round'].str.extract(r'(\d+)', expand=False).astype(int) == round_number]
+
+        for fetch in (whole_season, by_round):
+            with self.subTest(fetch=fetch.__name__):
+                pipeline = self.make_pipeline()
+                with patch.object(pipeline, '_fetch_year', side_effect=fetch):
+                    successful_years = pipeline.run_pipeline(
+                        [2024], by_round=True, create_combined=False)
+
+                self.assertEqual(successful_years, [2024])
+                table = self.bigquery_client.get_table('afl_player_data.player_stats_2024_bq')
+                self.assertEqual(table.num_rows, 30)
+                self.assertEqual(pipeline.round_tracker.last_round(2024), 2)
+
+    def test_failed_season_is_skipped(self):
+        """Test a season that cannot be fetched fails without stopping the others."""
+        pipeline = self.make_pipeline()
+
+        def fetch(year, use_sample_data=False, round_number=None):
+            if year == 2020:
+                raise ValueError("no data")
+            return create_sample_data(year, round_number)
+
+        with patch.object(pipeline, '_fetch_year', side_effect=fetch):
+            chunks = list(pipeline.stream_pipeline([2019, 2020, 2021]))
+
+        self.assertEqual([(chunk['year'], chunk['success']) for chunk in chunks],
+                         [(2019, True), (2020, False), (2021, True)])
+
+    def peak_memory(self, seasons):
+        """Peak traced memory of streaming full-size synthetic seasons to GCS."""
+        pipeline = self.make_pipeline()
+        objects = self.storage_client.bucket('test-bucket').objects
+
+        def fetch(year, use_sample_data=False, round_number=None):
+            return make_player_stats(ROWS_PER_SEASON, season=year, seed=year)
+
+        with patch.object(pipeline, '_fetch_year', side_effect=fetch):
+            years = list(range(2000, 2000 + seasons))
+            tracemalloc.start()
+            try:
+                for chunk in pipeline.stream_pipeline(years, load_to_bigquery=False):
+                    self.assertTrue(chunk['success'])
+                    # The fake bucket keeps every file in memory; a real one does not
+                    objects.clear()
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    def test_peak_memory_flat(self):
+        """Test peak memory is set by one season, not by the number of seasons."""
+        # Warm up, so imports and caches are not counted
+        self.peak_memory(1)
+        few = self.peak_memory(2)
+        many = self.peak_memory(8)
+
+        # Six more seasons add less than one season's frame to the peak
+        season_bytes = make_player_stats(ROWS_PER_SEASON).memory_usage(deep=True).sum()
+        self.assertLess(many - few, season_bytes)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), "ru_maxrss is in KiB only on Linux")
+    def test_peak_rss_flat(self):
+        """Test peak RSS, Arrow buffers included, is set by one season for CSV and Parquet."""
+        season_bytes = make_player_stats(ROWS_PER_SEASON).memory_usage(deep=True).sum()
+        for file_format in ('parquet', 'csv'):
+            with self.subTest(file_format=file_format):
+                few = rss_peak(2, file_format)
+                many = rss_peak(8, file_format)
+
+                # Six more seasons add less than one season's frame to the peak
+                self.assertLess(many - few, season_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
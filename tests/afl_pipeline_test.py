@@ -1,11 +1,15 @@
 import os
+import tempfile
+import threading
 import unittest
 import pandas as pd
 import sys
 from unittest.mock import patch, MagicMock
 
 from afl_pipeline.pipeline import AFLDataPipeline
-from afl_pipeline.data_processor import preprocess_player_stats, create_sample_data
+from afl_pipeline.data_processor import (
+    preprocess_player_stats, create_sample_data, round_order, frame_memory, content_hash)
+from afl_pipeline.state import RoundTracker
 
 
 class TestAFLPipeline(unittest.TestCase):
@@ -34,8 +38,22 @@ class TestAFLPipeline(unittest.TestCase):
         self.environ_patcher = patch.dict('os.environ', {})
         self.mock_environ = self.environ_patcher.start()
 
+        # Keep the content and run manifests out of the project directory
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.manifest_patcher = patch(
+            'afl_pipeline.settings.CONTENT_MANIFEST_PATH',
+            os.path.join(self.state_dir.name, 'content_manifest.json'))
+        self.manifest_patcher.start()
+        self.run_manifest_patcher = patch(
+            'afl_pipeline.settings.RUN_MANIFEST_PATH',
+            os.path.join(self.state_dir.name, 'run_manifest.json'))
+        self.run_manifest_patcher.start()
+
     def tearDown(self):
         """Tear down test fixtures."""
+        self.manifest_patcher.stop()
+        self.run_manifest_patcher.stop()
+        self.state_dir.cleanup()
         self.file_exists_patcher.stop()
         self.storage_client_patcher.stop()
         self.bigquery_client_patcher.stop()
@@ -103,6 +121,249 @@ class TestAFLPipeline(unittest.TestCase):
         self.assertEqual(mock_process_year.call_count, 3)
         mock_create_combined.assert_called_once()
 
+    @patch('afl_pipeline.pipeline.func_initialise')
+    @patch('afl_pipeline.pipeline.AFLDataPipeline.process_year', return_value=True)
+    @patch('afl_pipeline.pipeline.AFLDataPipeline.iter_fetched_years')
+    def test_run_pipeline_parallel_fetch(self, mock_fetch_parallel, mock_process_year, mock_init):
+        """Test running the pipeline with a pool of R fetch workers."""
+        df_2019 = create_sample_data(2019)
+        mock_fetch_parallel.return_value = iter([(2019, df_2019), (2020, None)])
+
+        pipeline = AFLDataPipeline(self.service_account_path, self.bucket_name)
+        result = pipeline.run_pipeline(
+            [2019, 2020], create_combined=False, fetch_workers=2)
+
+        self.assertEqual(result, [2019])
+        mock_fetch_parallel.assert_called_once_with([2019, 2020], 2)
+        mock_process_year.assert_called_once_with(
+            2019, False, False, dataframe=df_2019, load_to_bigquery=True)
+        mock_init.assert_not_called()
+
+    @patch('afl_pipeline.pipeline.func_initialise')
+    @patch('afl_pipeline.storage.StorageManager.upload_dataframe', return_value=True)
+    @patch('afl_pipeline.bigquery.BigQueryManager.upload_from_gcs', return_value=True)
+    def test_process_year_cache_hit_skips_r(self, mock_bq_upload, mock_gcs_upload, mock_init):
+        """Test a cached year is processed without initialising R."""
+        pipeline = AFLDataPipeline(self.service_account_path, self.bucket_name)
+        pipeline.fetch_cache = MagicMock()
+        pipeline.fetch_cache.get_or_fetch.side_effect = \
+            lambda dataset, fetch, before_fetch=None, **params: create_sample_data(2015)
+
+        result = pipeline.process_year(2015)
+
+        self.assertTrue(result)
+        pipeline.fetch_cache.get_or_fetch.assert_called_once()
+        mock_init.assert_not_called()
+
+    @patch('afl_pipeline.pipeline.RFetchPool')
+    def test_iter_fetched_years_refetches_evicted_year(self, mock_pool):
+        """Test a year evicted from the cache after the up-front check is fetched, not dropped."""
+        df_2019 = create_sample_data(2019)
+        pipeline = AFLDataPipeline(self.service_account_path, self.bucket_name)
+        pipeline.fetch_cache = MagicMock()
+        pipeline.fetch_cache.contains.return_value = True
+        pipeline.fetch_cache.get.side_effect = [df_2019, None]
+
+        with patch.object(pipeline, 'fetch_dataset',
+                          return_value=create_sample_data(2020)) as mock_fetch:
+            fetched = dict(pipeline.iter_fetched_years([2019, 2020], 2))
+
+        self.assertIs(fetched[2019], df_2019)
+        self.assertEqual(fetched[2020]['Season'].unique().tolist(), [2020])
+        mock_fetch.assert_called_once_with('player_stats', season=2020, source='afltables')
+        mock_pool.assert_not_called()
+
+    @patch('afl_pipeline.storage.StorageManager.upload_dataframe', return_value=True)
+    @patch('afl_pipeline.bigquery.BigQueryManager.upload_from_gcs', return_value=True)
+    def test_process_year_incremental(self, mock_bq_upload, mock_gcs_upload):
+        """Test incremental runs load the full season once, then append new rounds."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pipeline = AFLDataPipeline(
+                self.service_account_path, self.bucket_name)
+            pipeline.round_tracker = RoundTracker(
+                os.path.join(tmp_dir, 'rounds.json'))
+
+            # First run: nothing recorded, so the whole season is loaded
+            self.assertTrue(pipeline.process_year(
+                2025, use_sample_data=True, incremental=True))
+            self.assertEqual(mock_gcs_upload.call_args[0][1],
+                             'player_stats/player_stats_2025')
+            self.assertIsNone(
+                mock_bq_upload.call_args[1]['write_disposition'])
+            self.assertEqual(pipeline.round_tracker.last_round(2025), 1)
+
+            # Second run: only round 2 is fetched and appended
+            self.assertTrue(pipeline.process_year(
+                2025, use_sample_data=True, incremental=True))
+            uploaded_df, gcs_path = mock_gcs_upload.call_args[0]
+            self.assertEqual(
+                gcs_path, 'player_stats/rounds/player_stats_2025_rounds_2_2')
+            self.assertTrue((uploaded_df['Round'] == 'Round 2').all())
+            self.assertEqual(
+                mock_bq_upload.call_args[1]['write_disposition'], 'WRITE_APPEND')
+            self.assertEqual(pipeline.round_tracker.last_round(2025), 2)
+
+    @staticmethod
+    def games(*matches):
+        """Player rows of (round, home team, away team) games, two players a side."""
+        rows = []
+        for round_number, home, away in matches:
+            for team in (home, home, away, away):
+                rows.append({'Season': 2025, 'Round': str(round_number), 'Home.team': home,
+                             'Away.team': away, 'Playing.for': team, 'ID': len(rows), 'Kicks': 10})
+        return pd.DataFrame(rows)
+
+    @patch('afl_pipeline.storage.StorageManager.upload_dataframe', return_value=True)
+    @patch('afl_pipeline.bigquery.BigQueryManager.upload_from_gcs', return_value=True)
+    def test_process_year_incremental_mid_round(self, mock_bq_upload, mock_gcs_upload):
+        """Test games played after a run in the middle of a round are ingested later."""
+        round_1 = [(1, 'Richmond', 'Carlton'), (1, 'Geelong', 'Sydney')]
+        thursday = (2, 'Carlton', 'Geelong')
+        saturday = (2, 'Sydney', 'Richmond')
+        played = list(round_1) + [thursday]
+
+        def fetch(year, use_sample_data=False, round_number=None):
+            matches = [match for match in played
+                       if round_number is None or match[0] == round_number]
+            return self.games(*matches).iloc[:len(matches) * 4]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pipeline = AFLDataPipeline(self.service_account_path, self.bucket_name)
+            pipeline.round_tracker = RoundTracker(os.path.join(tmp_dir, 'rounds.json'))
+            with patch.object(pipeline, '_fetch_year', side_effect=fetch):
+                # Thursday: round 2 has started
+                self.assertTrue(pipeline.process_year_incremental(2025))
+                self.assertEqual(pipeline.round_tracker.last_round(2025), 2)
+
+                # Saturday: only the new game of round 2 is appended
+                played.append(saturday)
+                self.assertTrue(pipeline.process_year_incremental(2025))
+                uploaded_df, gcs_path = mock_gcs_upload.call_args[0]
+                self.assertEqual(gcs_path, 'player_stats/rounds/player_stats_2025_rounds_2_2')
+                self.assertEqual(set(uploaded_df['Home.team']), {'Sydney'})
+                self.assertEqual(len(uploaded_df), 4)
+                self.assertEqual(pipeline.round_tracker.ingested_matches(2025),
+                                 {'2|Carlton|Geelong', '2|Sydney|Richmond'})
+
+                # Nothing new: round 2 is fetched again, then round 3 is empty
+                uploads = mock_gcs_upload.call_count
+                self.assertTrue(pipeline.process_year_incremental(2025))
+                self.assertEqual(mock_gcs_upload.call_count, uploads)
+
+    @patch('afl_pipeline.storage.StorageManager.upload_dataframe', return_value=True)
+    @patch('afl_pipeline.bigquery.BigQueryManager.upload_from_gcs', return_value=True)
+    def test_process_year_incremental_whole_season_source(self, mock_bq_upload, mock_gcs_upload):
+        """Test a source that ignores round_number is fetched once per run."""
+        season = self.games((1, 'Richmond', 'Carlton'), (2, 'Carlton', 'Geelong'),
+                            (3, 'Sydney', 'Richmond'))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pipeline = AFLDataPipeline(self.service_account_path, self.bucket_name)
+            pipeline.round_tracker = RoundTracker(os.path.join(tmp_dir, 'rounds.json'))
+            pipeline.round_tracker.record(2025, 1, {'1|Richmond|Carlton'})
+            with patch.object(pipeline, '_fetch_year', return_value=season) as fetch:
+                self.assertTrue(pipeline.process_year_incremental(2025))
+
+            fetch.assert_called_once()
+            uploaded_df, gcs_path = mock_gcs_upload.call_args[0]
+            self.assertEqual(gcs_path, 'player_stats/rounds/player_stats_2025_rounds_2_3')
+            self.assertEqual(len(uploaded_df), 8)
+            self.assertEqual(pipeline.round_tracker.last_round(2025), 3)
+
+    def test_round_tracker_reads_round_numbers(self):
+        """Test state files holding only the last round of each season still load."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'rounds.json')
+            with open(path, 'w') as f:
+                f.write('{"2025": 4}')
+            tracker = RoundTracker(path)
+
+            self.assertEqual(tracker.last_round(2025), 4)
+            self.assertEqual(tracker.ingested_matches(2025), set())
+
+    def test_round_order(self):
+        """Test round labels map to sortable round numbers."""
+        rounds = pd.Series(['1', 'Round 12', 'QF', 'GF', 'unknown'])
+        numbers = round_order(rounds)
+        self.assertEqual(list(numbers[:4]), [1, 12, 101, 104])
+        self.assertTrue(pd.isna(numbers[4]))
+
+    @patch('afl_pipeline.bigquery.BigQueryManager.create_combined_table')
+    @patch('afl_pipeline.bigquery.BigQueryManager.upload_from_gcs')
+    @patch('afl_pipeline.storage.StorageManager.upload_dataframe')
+    def test_run_pipeline_concurrent(self, mock_gcs_upload, mock_bq_upload, mock_create_combined):
+        """Test concurrent runs overlap stages and keep the return contract."""
+        fetching_2020 = threading.Event()
+
+        def fake_sample_data(year, round_number=None):
+            if year == 2020:
+                fetching_2020.set()
+            return create_sample_data(year, round_number)
+
+        def fake_upload(df, gcs_path, **kwargs):
+            return not gcs_path.endswith('2021')
+
+        def fake_load(gcs_uri, table_id, **kwargs):
+            # 2019 is only loaded once 2020 has started fetching
+            if '2019' in table_id:
+                return fetching_2020.wait(5)
+            return True
+
+        mock_gcs_upload.side_effect = fake_upload
+        mock_bq_upload.side_effect = fake_load
+
+        pipeline = AFLDataPipeline(self.service_account_path, self.bucket_name)
+        with patch('afl_pipeline.pipeline.create_sample_data', side_effect=fake_sample_data):
+            result = pipeline.run_pipeline(
+                [2019, 2020, 2021, 2022], use_sample_data=True, concurrent=True)
+
+        self.assertEqual(result, [2019, 2020, 2022])
+        self.assertEqual(mock_gcs_upload.call_count, 4)
+        self.assertEqual(mock_bq_upload.call_count, 3)
+        self.assertEqual(
+            mock_create_combined.call_args[0][0], [2019, 2020, 2022])
+
+    @patch('afl_pipeline.bigquery.BigQueryManager.create_combined_table')
+    @patch('afl_pipeline.bigquery.BigQueryManager.bulk_load_from_gcs', return_value=True)
+    @patch('afl_pipeline.bigquery.BigQueryManager.upload_from_gcs')
+    @patch('afl_pipeline.storage.StorageManager.upload_dataframe', return_value=True)
+    def test_run_pipeline_bulk_load(self, mock_gcs_upload, mock_bq_upload, mock_bulk_load,
+                                    mock_create_combined):
+        """Test bulk loading every year into the combined table with one job."""
+        pipeline = AFLDataPipeline(self.service_account_path, self.bucket_name)
+        result = pipeline.run_pipeline(
+            [2019, 2020], use_sample_data=True, bulk_load=True)
+
+        self.assertEqual(result, [2019, 2020])
+        self.assertEqual(mock_gcs_upload.call_count, 2)
+        mock_bq_upload.assert_not_called()
+        mock_create_combined.assert_not_called()
+        mock_bulk_load.assert_called_once_with(
+            ['gs://test-bucket/player_stats/player_stats_2019',
+             'gs://test-bucket/player_stats/player_stats_2020'],
+            'combined_player_stats_bq',
+            dataset_id='afl_data',
+            partitioned=True,
+            partitions=[2019, 2020],
+            replace_partitions=[2019, 2020]
+        )
+
+    @patch('afl_pipeline.bigquery.BigQueryManager.create_combined_table')
+    @patch('afl_pipeline.bigquery.BigQueryManager.bulk_load_from_gcs', return_value=True)
+    @patch('afl_pipeline.bigquery.BigQueryManager.upload_from_gcs', return_value=True)
+    @patch('afl_pipeline.storage.StorageManager.upload_dataframe', return_value=True)
+    def test_run_pipeline_bulk_load_without_combined(self, mock_gcs_upload, mock_bq_upload,
+                                                     mock_bulk_load, mock_create_combined):
+        """Test bulk_load does not load the combined table when create_combined is off."""
+        pipeline = AFLDataPipeline(self.service_account_path, self.bucket_name)
+        result = pipeline.run_pipeline(
+            [2019, 2020], use_sample_data=True, bulk_load=True, create_combined=False)
+
+        self.assertEqual(result, [2019, 2020])
+        self.assertEqual(mock_bq_upload.call_count, 2)
+        mock_bulk_load.assert_not_called()
+        mock_create_combined.assert_not_called()
+
     def test_create_sample_data(self):
         """Test creating sample data."""
         year = 2021
@@ -134,8 +395,66 @@ class TestAFLPipeline(unittest.TestCase):
         self.assertFalse('Date' in processed_df.columns)
         self.assertTrue((processed_df['year'] == year).all())
         # Check type conversions
-        self.assertEqual(processed_df['Season'].dtype, 'float')
-        self.assertEqual(processed_df['Round'].dtype, 'object')  # str
+        self.assertTrue(pd.api.types.is_integer_dtype(processed_df['Season'].dtype))
+        self.assertTrue(pd.api.types.is_integer_dtype(processed_df['Attendance'].dtype))
+        self.assertIsInstance(processed_df['Round'].dtype, pd.CategoricalDtype)
+        self.assertEqual(list(processed_df['Round'].astype(str)), ['1', '2'])
+        self.assertEqual(list(processed_df['Jumper.No.'].astype(str)), ['7', '9'])
+        self.assertTrue(pd.api.types.is_string_dtype(processed_df['player'].dtype))
+        # The input frame is left unchanged
+        self.assertTrue('Date' in test_data.columns)
+        self.assertFalse('year' in test_data.columns)
+        self.assertEqual(test_data['Season'].dtype, 'object')
+
+    def test_preprocess_player_stats_reduces_memory(self):
+        """Test that preprocessing a full season shrinks it at least threefold."""
+        raw_df = create_sample_data(2023)
+        raw_df = pd.concat([raw_df] * 1000, ignore_index=True).astype(
+            {'Season': str, 'Attendance': float, 'Jumper.No.': str, 'ID': str})
+
+        processed_df = preprocess_player_stats(raw_df, 2023)
+
+        self.assertGreaterEqual(
+            frame_memory(raw_df) / frame_memory(processed_df), 3)
+        self.assertEqual(len(processed_df), len(raw_df))
+        self.assertEqual(processed_df['Kicks'].dtype, 'Int8')
+
+    def test_preprocess_player_stats_integer_columns_stay_integers(self):
+        """Test that fractional values of an integer column become nulls, not floats."""
+        raw_df = create_sample_data(2023)
+        raw_df['Attendance'] = [1.5] + [40000.0] * (len(raw_df) - 1)
+
+        with self.assertLogs('afl_pipeline.data_processor', level='WARNING'):
+            processed_df = preprocess_player_stats(raw_df, 2023)
+
+        self.assertTrue(pd.api.types.is_integer_dtype(processed_df['Attendance'].dtype))
+        self.assertTrue(pd.isna(processed_df['Attendance'].iloc[0]))
+        self.assertEqual(processed_df['Attendance'].iloc[1:].tolist(), [40000] * (len(raw_df) - 1))
+
+    def test_preprocess_player_stats_unlisted_columns_fixed_type(self):
+        """Test that unlisted columns get the same type whatever a season holds."""
+        numbers = create_sample_data(2022).assign(Notes=list(range(10)))
+        text = create_sample_data(2023).assign(Notes=[f'note {i}' for i in range(10)])
+
+        numbers_df = preprocess_player_stats(numbers, 2022)
+        text_df = preprocess_player_stats(text, 2023)
+
+        self.assertTrue(pd.api.types.is_string_dtype(numbers_df['Notes'].dtype))
+        self.assertTrue(pd.api.types.is_string_dtype(text_df['Notes'].dtype))
+        self.assertEqual(numbers_df['Notes'].iloc[3], '3')
+        # Listed stat columns stay integers
+        self.assertEqual(numbers_df['Kicks'].dtype, 'Int8')
+
+    def test_content_hash(self):
+        """Test that the content hash only changes when the data does."""
+        df = preprocess_player_stats(create_sample_data(2021), 2021)
+        same_df = preprocess_player_stats(create_sample_data(2021), 2021)
+        changed_df = same_df.copy()
+        changed_df.loc[0, 'Kicks'] = 99
+
+        self.assertEqual(content_hash(df), content_hash(same_df))
+        self.assertNotEqual(content_hash(df), content_hash(changed_df))
+        self.assertNotEqual(content_hash(df, 'csv'), content_hash(df, 'parquet'))
 
     # Skip this test for now as it involves complex patching of imports
     @unittest.skip("Skipping test_process_year_success due to import complexity")